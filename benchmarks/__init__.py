@@ -0,0 +1,4 @@
+"""
+性能基准测试
+Benchmarks
+"""
@@ -0,0 +1,83 @@
+"""
+批量回声消除基准测试
+Batched Echo Cancellation Benchmark
+
+比较 N 个会话逐个处理与共享状态库一次批量处理的每周期 CPU 耗时，
+并换算为单核在 20ms 周期内可承载的会话数。
+
+    python -m benchmarks.aec_batch --sessions 1 8 32 128 256
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from src.audio.fdaf_canceller import FdafStateBank, FrequencyDomainEchoCanceller, process_batch
+
+FRAME_SIZE = 960
+CHANNELS = 2
+TICK_MS = 20.0
+
+
+def make_signals(sessions, frames, rng):
+    """为每个会话生成远端参考与带回声的麦克风帧"""
+    far = rng.standard_normal((sessions, frames, FRAME_SIZE)) * 3000
+    echo_path = rng.standard_normal(256) * np.exp(-np.arange(256) / 40)
+    echo_path /= np.linalg.norm(echo_path) * 2
+    mic = np.empty((sessions, frames, FRAME_SIZE * CHANNELS), dtype=np.int16)
+    for s in range(sessions):
+        echo = np.convolve(np.concatenate([np.zeros(FRAME_SIZE), far[s].reshape(-1)]), echo_path)
+        echo = echo[: frames * FRAME_SIZE].reshape(frames, FRAME_SIZE)
+        mic[s] = np.repeat(np.clip(echo, -32767, 32767).astype(np.int16), CHANNELS, axis=-1)
+    return far.astype(np.int16), mic
+
+
+def run_sequential(far, mic):
+    sessions, frames, _ = far.shape
+    cancellers = [FrequencyDomainEchoCanceller() for _ in range(sessions)]
+    start = time.process_time()
+    for n in range(frames):
+        for s, canceller in enumerate(cancellers):
+            canceller.process_audio(mic[s, n])
+            canceller.add_reference_audio(far[s, n])
+    return (time.process_time() - start) / frames
+
+
+def run_batched(far, mic):
+    sessions, frames, _ = far.shape
+    bank = FdafStateBank(capacity=sessions)
+    cancellers = [FrequencyDomainEchoCanceller(bank=bank) for _ in range(sessions)]
+    start = time.process_time()
+    for n in range(frames):
+        process_batch(cancellers, list(mic[:, n]))
+        for s, canceller in enumerate(cancellers):
+            canceller.add_reference_audio(far[s, n])
+    return (time.process_time() - start) / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量回声消除基准测试")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8, 32, 128, 256])
+    parser.add_argument("--frames", type=int, default=100, help="每个会话处理的帧数")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(
+        f"{'N':>6}{'seq ms/tick':>14}{'batch ms/tick':>16}{'speedup':>10}"
+        f"{'seq sessions/core':>20}{'batch sessions/core':>22}"
+    )
+    for sessions in args.sessions:
+        far, mic = make_signals(sessions, args.frames, rng)
+        sequential = run_sequential(far, mic) * 1000
+        batched = run_batched(far, mic) * 1000
+        seq_capacity = TICK_MS / (sequential / sessions)
+        batch_capacity = TICK_MS / (batched / sessions)
+        print(
+            f"{sessions:>6}{sequential:>14.3f}{batched:>16.3f}{sequential / batched:>10.2f}"
+            f"{seq_capacity:>20.0f}{batch_capacity:>22.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+回声消除引擎基准测试
+Echo Cancellation Engine Benchmark
+
+用合成的回声信号比较各引擎每帧的 CPU 耗时与 ERLE (回声回波损耗增强)。
+前 85% 的时间只有远端信号 (单讲)，最后 15% 叠加近端语音 (双讲)，
+用 "近端保真度" 衡量引擎是否把用户自己的声音也一起消掉了。
+
+    python -m benchmarks.aec_engines --seconds 20
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from src.audio.echo_manager import ECHO_CANCELLER_ENGINES, EchoCancellationManager
+
+SAMPLE_RATE = 48000
+FRAME_SIZE = 960  # 20ms
+CHANNELS = 2  # aiortc 解码出的麦克风音频为交织双声道
+
+
+def synthetic_far_end(frames, rng):
+    """生成类似语音的远端信号：带色噪声 + 音节包络"""
+    total = frames * FRAME_SIZE
+    noise = rng.standard_normal(total)
+    # 一阶低通，让频谱更接近语音
+    colored = np.empty_like(noise)
+    acc = 0.0
+    for i in range(0, total, FRAME_SIZE):
+        block = noise[i : i + FRAME_SIZE]
+        out = np.empty_like(block)
+        for j, value in enumerate(block):
+            acc = 0.9 * acc + value
+            out[j] = acc
+        colored[i : i + FRAME_SIZE] = out
+    t = np.arange(total) / SAMPLE_RATE
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t) ** 2
+    signal = colored * envelope
+    return signal / np.sqrt(np.mean(signal**2)) * 3000
+
+
+def synthetic_echo_path(rng, delay_ms=25, tail_ms=40):
+    """生成带延迟的指数衰减房间冲激响应"""
+    delay = int(SAMPLE_RATE * delay_ms / 1000)
+    tail = int(SAMPLE_RATE * tail_ms / 1000)
+    decay = np.exp(-np.arange(tail) / (tail / 6))
+    response = rng.standard_normal(tail) * decay
+    response = response / np.linalg.norm(response) * 0.5
+    return np.concatenate([np.zeros(delay), response])
+
+
+def run_engine(engine, far, mic, frames):
+    """按 AudioFaceSwapper.recv 的调用顺序运行一个引擎"""
+    manager = EchoCancellationManager(enable_echo_cancellation=True, enable_debug=False, engine=engine)
+    # 关闭过度抑制混合，直接衡量引擎本身
+    manager.set_parameters(min_energy_ratio=0.0)
+    if hasattr(manager.echo_canceller, "start_time"):
+        # 跳过预热增益，避免把预热衰减算作回声消除
+        manager.echo_canceller.start_time -= manager.echo_canceller.warmup_duration
+
+    outputs = np.zeros_like(mic)
+    cpu_times = []
+    for n in range(frames):
+        mic_frame = mic[n]
+        ref_frame = far[n * FRAME_SIZE : (n + 1) * FRAME_SIZE].astype(np.int16)
+
+        start = time.process_time()
+        outputs[n] = manager.process_microphone_audio(mic_frame)
+        manager.update_reference_audio(ref_frame)
+        cpu_times.append(time.process_time() - start)
+
+    return outputs, np.array(cpu_times), manager.get_statistics()
+
+
+def erle_db(mic, output):
+    """计算 ERLE (近端静默时 = 麦克风能量 / 输出能量)"""
+    mic_energy = np.sum(mic.astype(np.float64) ** 2)
+    out_energy = np.sum(output.astype(np.float64) ** 2)
+    return 10 * np.log10(mic_energy / max(out_energy, 1e-9))
+
+
+def near_end_fidelity_db(near, output):
+    """双讲时近端语音与输出差值的信噪比，越高说明用户语音保留得越完整"""
+    near = near.astype(np.float64)
+    diff = output.astype(np.float64) - near
+    return 10 * np.log10(np.sum(near**2) / max(np.sum(diff**2), 1e-9))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回声消除引擎基准测试")
+    parser.add_argument("--seconds", type=float, default=10.0, help="合成音频时长（秒）")
+    parser.add_argument("--engines", nargs="+", default=list(ECHO_CANCELLER_ENGINES), help="要测试的引擎")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    frames = int(args.seconds * 1000 / 20)
+
+    far = synthetic_far_end(frames, rng)
+    echo = np.convolve(far, synthetic_echo_path(rng))[: len(far)]
+    near = rng.standard_normal(len(far)) * 30
+
+    # 最后 15% 的时间叠加近端语音
+    double_talk = int(frames * 0.85)
+    near[double_talk * FRAME_SIZE :] += synthetic_far_end(frames - double_talk, rng) / 3
+    mic_mono = np.clip(echo + near, -32767, 32767).astype(np.int16)
+    mic = np.repeat(mic_mono, CHANNELS).reshape(frames, FRAME_SIZE * CHANNELS)
+    near_frames = near.reshape(frames, FRAME_SIZE)
+
+    # ERLE 取收敛后 (后半段) 的单讲区间
+    single_talk = slice(frames // 2, double_talk)
+
+    print(f"合成音频: {args.seconds:.1f}s, {frames} 帧, 帧长 {FRAME_SIZE} x {CHANNELS} 声道")
+    print(
+        f"{'engine':<8}{'cpu/frame(ms)':>16}{'p99(ms)':>10}{'realtime x':>12}" f"{'ERLE(dB)':>10}{'near-end(dB)':>14}"
+    )
+    for engine in args.engines:
+        outputs, cpu_times, _ = run_engine(engine, far, mic, frames)
+        mean_ms = cpu_times.mean() * 1000
+        p99_ms = np.percentile(cpu_times, 99) * 1000
+        realtime = 20.0 / mean_ms if mean_ms > 0 else float("inf")
+        erle = erle_db(mic[single_talk], outputs[single_talk])
+        # 双讲区间只取第一个声道与近端语音比较
+        output_mono = outputs[double_talk:].reshape(-1, CHANNELS)[:, 0]
+        fidelity = near_end_fidelity_db(near_frames[double_talk:].reshape(-1), output_mono)
+        print(f"{engine:<8}{mean_ms:>16.3f}{p99_ms:>10.3f}{realtime:>12.1f}{erle:>10.2f}{fidelity:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
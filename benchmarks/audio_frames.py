@@ -0,0 +1,82 @@
+"""
+输出音频帧分配基准测试
+Outbound Audio Frame Allocation Benchmark
+
+模拟 N 个会话在若干个 20ms 周期内输出静音帧与 TTS 帧，比较每帧新建 AudioFrame
+与 AudioFramePool 复用的每帧耗时，以及 GC 追踪的存活对象数变化（检查是否有帧对象泄漏）。
+
+    python -m benchmarks.audio_frames --sessions 100 500 --ticks 250
+"""
+
+import argparse
+import gc
+import time
+from fractions import Fraction
+
+import av
+import numpy as np
+
+from src.audio.frame_pool import AudioFramePool
+
+FRAME_SIZE = 960
+SAMPLE_RATE = 48000
+
+
+class AllocatingOutput:
+    """原实现：每帧新建 numpy 数组与 AudioFrame"""
+
+    def silence(self):
+        samples = np.zeros(FRAME_SIZE, dtype=np.float32)
+        samples = (samples * 32767).astype(np.int16)
+        new_frame = av.AudioFrame.from_ndarray(samples.reshape(1, -1), format="s16", layout="mono")
+        new_frame.sample_rate = SAMPLE_RATE
+        new_frame.pts = 0
+        return new_frame
+
+    def frame(self, samples):
+        new_frame = av.AudioFrame.from_ndarray(samples.reshape(1, -1), format="s16", layout="mono")
+        new_frame.sample_rate = SAMPLE_RATE
+        new_frame.pts = 0
+        new_frame.time_base = Fraction(1, SAMPLE_RATE)
+        return new_frame
+
+
+def run(outputs, ticks, tts):
+    """每个周期每个会话输出一帧，tts 比例的会话输出语音帧，其余输出静音"""
+    speaking = int(len(outputs) * tts)
+    frames = 0
+    gc.collect()
+    objects = len(gc.get_objects())
+    start = time.perf_counter()
+    for _ in range(ticks):
+        for index, output in enumerate(outputs):
+            if index < speaking:
+                output.frame(tts_samples)
+            else:
+                output.silence()
+            frames += 1
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    return elapsed / frames * 1e6, len(gc.get_objects()) - objects
+
+
+tts_samples = (np.sin(np.arange(FRAME_SIZE) / 8) * 8000).astype(np.int16)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="输出音频帧分配基准测试")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--ticks", type=int, default=250, help="20ms 周期数")
+    parser.add_argument("--tts", type=float, default=0.2, help="正在播放 TTS 的会话比例")
+    args = parser.parse_args()
+
+    print(f"{'N':>6}{'mode':>10}{'us/frame':>12}{'frames/s/core':>16}{'leaked objects':>16}")
+    for sessions in args.sessions:
+        for name, factory in (("allocate", AllocatingOutput), ("pool", AudioFramePool)):
+            outputs = [factory() for _ in range(sessions)]
+            per_frame, leaked = run(outputs, args.ticks, args.tts)
+            print(f"{sessions:>6}{name:>10}{per_frame:>12.2f}{1e6 / per_frame:>16.0f}{leaked:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+DataChannel 消息转发基准测试
+DataChannel Relay Benchmark
+
+用典型的上游消息（tts 状态、逐句文本、stt、llm 表情）测量 DataChannelSender 的每秒转发消息数，
+比较 orjson 与标准库 json：
+
+- relay: 编码并交给一个始终可写的通道，只测服务端 CPU 开销；
+- loopback: 本机两个 RTCPeerConnection 之间经过真实的 SCTP 传输，接收端解码，测端到端吞吐。
+
+    python -m benchmarks.datachannel --messages 100000
+    python -m benchmarks.datachannel --messages 20000 --loopback --batch
+"""
+
+import argparse
+import asyncio
+import importlib
+import itertools
+import time
+
+from aiortc import RTCPeerConnection
+
+import src.config
+from src.datachannel import DataChannelSender
+from src.utils import json_codec
+
+# 一轮对话中上游消息的大致构成
+MESSAGES = [
+    {"type": "stt", "text": "今天天气怎么样", "session_id": "bench"},
+    {"type": "llm", "text": "😊", "emotion": "happy", "session_id": "bench"},
+    {"type": "tts", "state": "start", "session_id": "bench"},
+    {"type": "tts", "state": "sentence_start", "text": "今天是晴天，气温二十五度左右。", "session_id": "bench"},
+    {"type": "tts", "state": "sentence_end", "text": "今天是晴天，气温二十五度左右。", "session_id": "bench"},
+    {"type": "tts", "state": "sentence_start", "text": "适合出门散步。", "session_id": "bench"},
+    {"type": "tts", "state": "sentence_end", "text": "适合出门散步。", "session_id": "bench"},
+    {"type": "tts", "state": "stop", "session_id": "bench"},
+]
+
+
+class NullChannel:
+    """始终可写、丢弃数据的通道"""
+
+    readyState = "open"
+    bufferedAmount = 0
+    bufferedAmountLowThreshold = 0
+
+    def on(self, event, handler):
+        pass
+
+    def send(self, data):
+        pass
+
+
+def use_backend(backend):
+    """与设置 JSON_CODEC 环境变量相同：重新加载 json_codec，选择指定的实现"""
+    src.config.JSON_CODEC = backend
+    importlib.reload(json_codec)
+
+
+def run_relay(messages):
+    """编码并发送 messages 条消息，返回每秒消息数"""
+    sender = DataChannelSender(NullChannel())
+    source = itertools.cycle(MESSAGES)
+    start = time.perf_counter()
+    for message in itertools.islice(source, messages):
+        sender.send(message)
+    return messages / (time.perf_counter() - start)
+
+
+async def run_loopback(messages, batch):
+    """经过本机 SCTP 发送 messages 条消息，返回接收端每秒解码的消息数（排队时被合并、丢弃的不计入）"""
+    server, client = RTCPeerConnection(), RTCPeerConnection()
+    channel = server.createDataChannel("chat")
+    opened = asyncio.Event()
+    received = 0
+
+    @client.on("datachannel")
+    def on_datachannel(remote):
+        @remote.on("message")
+        def on_message(data):
+            nonlocal received
+            decoded = json_codec.loads(data)
+            received += len(decoded) if isinstance(decoded, list) else 1
+
+    channel.on("open", opened.set)
+    await server.setLocalDescription(await server.createOffer())
+    await client.setRemoteDescription(server.localDescription)
+    await client.setLocalDescription(await client.createAnswer())
+    await server.setRemoteDescription(client.localDescription)
+    await asyncio.wait_for(opened.wait(), 10)
+
+    sender = DataChannelSender(channel, batch=batch)
+    source = itertools.cycle(MESSAGES)
+    start = time.perf_counter()
+    # 每次发送 100 条，队列排空后再发送下一批，测量的是通道吞吐而不是队列的丢弃策略
+    for chunk in range(0, messages, 100):
+        for message in itertools.islice(source, min(100, messages - chunk)):
+            sender.send(message)
+        await asyncio.sleep(0)
+        while sender.queue:
+            await asyncio.sleep(0.001)
+    while sender.queue or received < sender.sent:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+
+    stats = sender.get_statistics()
+    await server.close()
+    await client.close()
+    return received / elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DataChannel 消息转发基准测试")
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--loopback", action="store_true", help="经过本机 SCTP 传输测端到端吞吐")
+    parser.add_argument("--batch", action="store_true", help="loopback 时把积压的消息合并为 JSON 数组发送")
+    args = parser.parse_args()
+
+    backends = ["json"] + (["orjson"] if json_codec.orjson is not None else [])
+    if args.loopback:
+        print(f"{'codec':>8}{'msgs/s':>12}{'max depth':>12}{'batches':>10}{'coalesced':>11}{'dropped':>9}")
+    else:
+        print(f"{'codec':>8}{'msgs/s':>12}{'us/msg':>10}")
+    for backend in backends:
+        use_backend(backend)
+        if args.loopback:
+            rate, stats = asyncio.run(run_loopback(args.messages, args.batch))
+            dropped = sum(stats["dropped"].values())
+            print(
+                f"{backend:>8}{rate:>12.0f}{stats['max_depth']:>12}{stats['batches']:>10}"
+                f"{stats['coalesced']:>11}{dropped:>9}"
+            )
+        else:
+            rate = run_relay(args.messages)
+            print(f"{backend:>8}{rate:>12.0f}{1e6 / rate:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
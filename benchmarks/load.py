@@ -0,0 +1,399 @@
+"""
+端到端压力测试
+End-to-End Load Generator
+
+在本机创建 N 个无界面的 aiortc 客户端，按设定速率向运行中的服务发起 /api/offer：
+- 发送合成的 Opus 麦克风音频（静音中每隔几秒出现一段提示音），可选发送视频；
+- 打开 chat DataChannel，定期发送 doublehit / swipe 事件，统计收到的服务端消息；
+- 默认在本进程中启动 benchmarks.mock_xiaozhi，服务端需要以 OTA_URL 指向它。
+
+报告会话建立时间（offer → connected）、音频往返延迟（提示音发出到收到服务端回复的提示音），
+以及测量窗口内服务端各工作进程的 CPU 与每个会话的内存（服务端需在本机运行，通过 /api/health 获取进程号）。
+
+    OTA_URL=http://127.0.0.1:51900/xiaozhi/ota python main.py
+    python -m benchmarks.load --sessions 200 --ramp 20 --duration 60 --processes 4
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import time
+from fractions import Fraction
+
+import av
+import numpy as np
+from aiohttp import ClientSession, ClientTimeout
+from aiortc import RTCPeerConnection, RTCSessionDescription
+from aiortc.mediastreams import MediaStreamError, MediaStreamTrack, VideoStreamTrack
+
+from benchmarks.mock_xiaozhi import ONSET_RMS, MockXiaoZhiBackend, tone
+
+SAMPLE_RATE = 48000
+FRAME_SIZE = 960
+FRAME_DURATION = 0.02
+# 提示音 600Hz、100ms
+PING = tone(0.1, 600, 10000)
+# 超过该时间未收到回复视为丢失（秒）
+PING_TIMEOUT = 3.0
+
+EVENTS = [("doublehit", "Head"), ("doublehit", "Face"), ("doublehit", "Body"), ("swipe", "Head"), ("swipe", "Face")]
+
+
+class PingTrack(MediaStreamTrack):
+    """合成麦克风：低电平噪声，每隔 interval 秒插入一段提示音，记录提示音的发出时间"""
+
+    kind = "audio"
+
+    def __init__(self, interval, first_ping, rng):
+        super().__init__()
+        self.interval_frames = int(interval / FRAME_DURATION)
+        self.rng = rng
+        self.start = None
+        self.index = 0
+        # 第一段提示音在开始发送音频 first_ping 秒后发出，用于测量首次响应时间
+        self.next_ping = int(first_ping / FRAME_DURATION)
+        self.ping_offset = None
+        self.ping_sent_at = None
+        self.pings = 0
+
+    async def recv(self):
+        if self.readyState != "live":
+            raise MediaStreamError
+        if self.start is None:
+            self.start = time.monotonic()
+        wait = self.start + self.index * FRAME_DURATION - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        mono = self.rng.integers(-20, 20, FRAME_SIZE).astype(np.int16)
+        if self.index == self.next_ping:
+            self.ping_offset = 0
+            self.ping_sent_at = time.perf_counter()
+            self.pings += 1
+            self.next_ping += self.interval_frames
+        if self.ping_offset is not None:
+            chunk = PING[self.ping_offset : self.ping_offset + FRAME_SIZE]
+            mono[: len(chunk)] = chunk
+            self.ping_offset += FRAME_SIZE
+            if self.ping_offset >= len(PING):
+                self.ping_offset = None
+
+        frame = av.AudioFrame.from_ndarray(np.repeat(mono, 2).reshape(1, -1), format="s16", layout="stereo")
+        frame.sample_rate = SAMPLE_RATE
+        frame.pts = self.index * FRAME_SIZE
+        frame.time_base = Fraction(1, SAMPLE_RATE)
+        self.index += 1
+        return frame
+
+
+class LoadClient:
+    """一个压测客户端会话"""
+
+    def __init__(self, index, args):
+        self.index = index
+        self.args = args
+        self.rng = np.random.default_rng(index)
+        self.pc = RTCPeerConnection()
+        self.mic = PingTrack(args.ping_interval, args.first_ping, self.rng)
+        self.connected = asyncio.Event()
+        self.tasks = []
+        self.result = {
+            "index": index,
+            "connected": False,
+            "error": None,
+            "answer_ms": None,
+            "setup_ms": None,
+            "first_response_ms": None,
+            "rtt_ms": [],
+            "pings": 0,
+            "events_sent": 0,
+            "messages": {},
+        }
+
+    async def run(self, http, deadline):
+        pc = self.pc
+        pc.addTrack(self.mic)
+        if self.args.video:
+            pc.addTrack(VideoStreamTrack())
+        channel = pc.createDataChannel("chat")
+
+        @pc.on("connectionstatechange")
+        def on_connectionstatechange():
+            if pc.connectionState == "connected":
+                self.connected.set()
+
+        @pc.on("track")
+        def on_track(track):
+            if track.kind == "audio":
+                self.tasks.append(asyncio.ensure_future(self.consume_audio(track)))
+
+        @pc.on("datachannel")
+        def on_datachannel(server_channel):
+            @server_channel.on("message")
+            def on_message(message):
+                message_type = json.loads(message).get("type", "unknown")
+                self.result["messages"][message_type] = self.result["messages"].get(message_type, 0) + 1
+
+        try:
+            await pc.setLocalDescription(await pc.createOffer())
+            start = self.started_at = time.perf_counter()
+            mac = self.args.mac
+            if mac == "unique":
+                mac = "02:00:{:02x}:{:02x}:{:02x}:{:02x}".format(*self.index.to_bytes(4, "big"))
+            body = {"sdp": pc.localDescription.sdp, "type": pc.localDescription.type, "macAddress": mac}
+            async with http.post(self.args.url + "/api/offer", json=body) as resp:
+                if resp.status != 200:
+                    raise RuntimeError("/api/offer 返回 {}".format(resp.status))
+                answer = await resp.json()
+            self.result["answer_ms"] = (time.perf_counter() - start) * 1000
+            await pc.setRemoteDescription(RTCSessionDescription(sdp=answer["sdp"], type=answer["type"]))
+            await asyncio.wait_for(self.connected.wait(), self.args.connect_timeout)
+            self.result["setup_ms"] = (time.perf_counter() - start) * 1000
+            self.result["connected"] = True
+
+            # 定期发送触摸事件，直到测量结束
+            while True:
+                wait = self.rng.exponential(self.args.event_interval) if self.args.event_interval > 0 else 1e9
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(wait, remaining))
+                if self.args.event_interval > 0 and time.time() < deadline and channel.readyState == "open":
+                    event, area = EVENTS[self.rng.integers(len(EVENTS))]
+                    channel.send(json.dumps({"event": event, "area": area}))
+                    self.result["events_sent"] += 1
+        except Exception as e:
+            self.result["error"] = "{}: {}".format(type(e).__name__, e)
+        finally:
+            self.result["pings"] = self.mic.pings
+            for task in self.tasks:
+                task.cancel()
+            await pc.close()
+        return self.result
+
+    async def consume_audio(self, track):
+        """接收服务端音频，检测回复提示音的起点"""
+        while True:
+            try:
+                frame = await track.recv()
+            except MediaStreamError:
+                return
+            sent_at = self.mic.ping_sent_at
+            if sent_at is None:
+                continue
+            elapsed = time.perf_counter() - sent_at
+            if elapsed > PING_TIMEOUT:
+                self.mic.ping_sent_at = None
+                continue
+            samples = frame.to_ndarray().astype(np.float32)
+            if np.sqrt(np.mean(samples**2)) > ONSET_RMS:
+                self.result["rtt_ms"].append(elapsed * 1000)
+                if self.result["first_response_ms"] is None:
+                    self.result["first_response_ms"] = (time.perf_counter() - self.started_at) * 1000
+                self.mic.ping_sent_at = None
+
+
+async def run_clients(args, indices, start_at, deadline):
+    """在当前进程中按计划时间启动一组客户端"""
+    async with ClientSession(timeout=ClientTimeout(total=args.connect_timeout)) as http:
+
+        async def start(index):
+            await asyncio.sleep(max(0.0, start_at + index / args.ramp - time.time()))
+            return await LoadClient(index, args).run(http, deadline)
+
+        return await asyncio.gather(*(start(index) for index in indices))
+
+
+def client_process(args, indices, start_at, deadline):
+    logging.basicConfig(level=logging.WARNING)
+    return asyncio.run(run_clients(args, indices, start_at, deadline))
+
+
+def read_process(pid):
+    """
+    读取本机进程的 CPU 时间与常驻内存
+
+    Returns:
+        tuple: (CPU 秒数, RSS 字节)，进程不在本机时返回 None
+    """
+    try:
+        with open("/proc/{}/stat".format(pid)) as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/{}/statm".format(pid)) as f:
+            rss_pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    return (int(fields[11]) + int(fields[12])) / ticks, rss_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+async def sample_server(http, url):
+    """汇总服务端所有工作进程的 (CPU 秒数, RSS 字节, 会话数)"""
+    async with http.get(url + "/api/health") as resp:
+        health = await resp.json()
+    samples = [read_process(worker["pid"]) for worker in health["workers"]]
+    samples = [sample for sample in samples if sample]
+    if not samples:
+        return None
+    return sum(cpu for cpu, _ in samples), sum(rss for _, rss in samples), health["sessions"]
+
+
+async def monitor(args, start_at, deadline, done):
+    """启动本地小智服务端模拟，并在测量窗口的两端采样服务端资源"""
+    mock = None
+    if args.mock_port:
+        mock = MockXiaoZhiBackend(port=args.mock_port, latency=args.mock_latency)
+        await mock.start()
+
+    server = {}
+    async with ClientSession(timeout=ClientTimeout(total=5)) as http:
+        baseline = await sample_server(http, args.url)
+        # 所有会话建立并稳定后开始测量
+        window_start = min(start_at + args.sessions / args.ramp + args.settle, deadline - 1)
+        await asyncio.sleep(max(0.0, window_start - time.time()))
+        begin = await sample_server(http, args.url)
+        window = time.time()
+        await asyncio.sleep(max(0.0, deadline - 0.5 - time.time()))
+        end = await sample_server(http, args.url)
+        window = time.time() - window
+
+        if baseline and begin and end:
+            sessions = max(1, begin[2])
+            server = {
+                "sessions": begin[2],
+                "cpu_cores": (end[0] - begin[0]) / window,
+                "cpu_percent_per_session": (end[0] - begin[0]) / window / sessions * 100,
+                "rss_mb": end[1] / 2**20,
+                "rss_mb_per_session": (begin[1] - baseline[1]) / sessions / 2**20,
+            }
+
+    while not done.is_set():
+        await asyncio.sleep(0.2)
+    if mock:
+        server["mock"] = mock.get_statistics()
+        await mock.stop()
+    return server
+
+
+def percentiles(values, points=(50, 95, 99)):
+    if not values:
+        return {"p{}".format(point): None for point in points}
+    return {"p{}".format(point): float(np.percentile(values, point)) for point in points}
+
+
+def summarize(results, server):
+    connected = [result for result in results if result["connected"]]
+    rtts = [rtt for result in connected for rtt in result["rtt_ms"]]
+    pings = sum(result["pings"] for result in connected)
+    messages = {}
+    for result in connected:
+        for message_type, count in result["messages"].items():
+            messages[message_type] = messages.get(message_type, 0) + count
+    errors = {}
+    for result in results:
+        if result["error"]:
+            errors[result["error"]] = errors.get(result["error"], 0) + 1
+
+    return {
+        "requested": len(results),
+        "connected": len(connected),
+        "errors": errors,
+        "answer_ms": percentiles([result["answer_ms"] for result in connected]),
+        "setup_ms": percentiles([result["setup_ms"] for result in connected]),
+        "first_response_ms": percentiles(
+            [result["first_response_ms"] for result in connected if result["first_response_ms"] is not None]
+        ),
+        "audio_rtt_ms": percentiles(rtts),
+        "pings": pings,
+        "ping_replies": len(rtts),
+        "events_sent": sum(result["events_sent"] for result in connected),
+        "messages_received": messages,
+        "server": server,
+    }
+
+
+def format_percentiles(values):
+    return "  ".join(
+        "{} {}".format(key, "-" if value is None else "{:.0f}".format(value)) for key, value in values.items()
+    )
+
+
+def print_summary(summary):
+    print("会话: {connected}/{requested} 已连接".format(**summary))
+    for error, count in summary["errors"].items():
+        print("  失败 {} 次: {}".format(count, error))
+    print("POST /api/offer (ms):       " + format_percentiles(summary["answer_ms"]))
+    print("offer → connected (ms):     " + format_percentiles(summary["setup_ms"]))
+    print("offer → 首次语音回复 (ms):  " + format_percentiles(summary["first_response_ms"]))
+    print(
+        "音频往返延迟 (ms):          {}  ({}/{} 收到回复)".format(
+            format_percentiles(summary["audio_rtt_ms"]), summary["ping_replies"], summary["pings"]
+        )
+    )
+    print("DataChannel: 发送事件 {}，收到消息 {}".format(summary["events_sent"], summary["messages_received"]))
+    server = summary["server"]
+    if "cpu_cores" in server:
+        print(
+            "服务端: {sessions} 会话, CPU {cpu_cores:.2f} 核 ({cpu_percent_per_session:.2f}%/会话), "
+            "RSS {rss_mb:.0f} MB ({rss_mb_per_session:.2f} MB/会话)".format(**server)
+        )
+    else:
+        print("服务端: 无法读取进程资源（服务端不在本机？）")
+    if "mock" in server:
+        print("小智服务端模拟: {}".format(server["mock"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端压力测试")
+    parser.add_argument("--url", default="http://127.0.0.1:51000", help="服务地址")
+    parser.add_argument("--sessions", type=int, default=50, help="会话数")
+    parser.add_argument("--ramp", type=float, default=10.0, help="每秒新建的会话数")
+    parser.add_argument("--duration", type=float, default=30.0, help="所有会话建立后保持的时长（秒）")
+    parser.add_argument("--settle", type=float, default=3.0, help="开始测量服务端资源前的等待时长（秒）")
+    parser.add_argument("--processes", type=int, default=1, help="客户端进程数，大量会话时分摊客户端的编码开销")
+    parser.add_argument("--video", action="store_true", help="同时发送视频")
+    parser.add_argument("--ping-interval", type=float, default=3.0, help="提示音间隔（秒）")
+    parser.add_argument("--first-ping", type=float, default=0.5, help="开始发送音频后第一段提示音的时间（秒）")
+    parser.add_argument("--mac", default="unique", help='客户端 MAC："unique" 每个会话不同，"" 使用服务端默认 MAC')
+    parser.add_argument("--mock-latency", type=float, default=0.0, help="小智服务端模拟的网络延迟（秒）")
+    parser.add_argument("--event-interval", type=float, default=10.0, help="触摸事件平均间隔（秒），0 表示不发送")
+    parser.add_argument("--connect-timeout", type=float, default=30.0)
+    parser.add_argument("--mock-port", type=int, default=51900, help="小智服务端模拟的端口，0 表示不启动")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    start_at = time.time() + 2
+    deadline = start_at + args.sessions / args.ramp + args.duration
+    chunks = [list(range(offset, args.sessions, args.processes)) for offset in range(args.processes)]
+
+    async def run_all():
+        done = asyncio.Event()
+        monitor_task = asyncio.ensure_future(monitor(args, start_at, deadline, done))
+        if args.processes > 1:
+            loop = asyncio.get_running_loop()
+            ctx = multiprocessing.get_context("spawn")
+            with ctx.Pool(args.processes) as pool:
+                jobs = [
+                    loop.run_in_executor(None, pool.apply, client_process, (args, chunk, start_at, deadline))
+                    for chunk in chunks
+                ]
+                results = [result for chunk_results in await asyncio.gather(*jobs) for result in chunk_results]
+        else:
+            results = await run_clients(args, chunks[0], start_at, deadline)
+        done.set()
+        return results, await monitor_task
+
+    results, server = asyncio.run(run_all())
+    summary = summarize(results, server)
+    print_summary(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+事件循环延迟基准测试
+Event Loop Lag Benchmark
+
+在同一个事件循环上模拟 N 个会话每 20ms 处理一帧麦克风音频（带回声参考），
+比较回声消除在事件循环中执行与交给线程池执行时的事件循环延迟。
+
+    python -m benchmarks.loop_lag --sessions 40 --seconds 5
+"""
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from src.audio.aec_scheduler import AECScheduler
+from src.audio.echo_manager import EchoCancellationManager
+from src.utils.executor import MediaExecutor
+from src.utils.loop_monitor import LoopLagMonitor
+
+FRAME_SIZE = 960
+CHANNELS = 2
+TICK = 0.02
+
+
+async def session(manager, rng, deadline, start_offset):
+    """模拟一个会话：每 20ms 处理一帧麦克风音频并写入参考音频"""
+    mic = rng.integers(-3000, 3000, FRAME_SIZE * CHANNELS).astype(np.int16)
+    ref = rng.integers(-3000, 3000, FRAME_SIZE).astype(np.int16)
+    await asyncio.sleep(start_offset)
+    next_tick = time.monotonic()
+    while time.monotonic() < deadline:
+        await manager.process_microphone_audio_async(mic)
+        manager.update_reference_audio(ref)
+        next_tick += TICK
+        await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+
+
+async def run_case(mode, batched, sessions, seconds):
+    executor = MediaExecutor(mode=mode)
+    scheduler = AECScheduler(executor=executor) if batched else None
+    managers = [EchoCancellationManager(engine="fdaf", scheduler=scheduler, executor=executor) for _ in range(sessions)]
+    monitor = LoopLagMonitor(interval=0.005, report_interval=0)
+    monitor.start()
+
+    rng = np.random.default_rng(0)
+    deadline = time.monotonic() + seconds
+    cpu_start = time.process_time()
+    await asyncio.gather(*(session(manager, rng, deadline, TICK * i / sessions) for i, manager in enumerate(managers)))
+    cpu = time.process_time() - cpu_start
+
+    await monitor.stop()
+    executor.shutdown()
+    return monitor.get_statistics(), cpu / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="事件循环延迟基准测试")
+    parser.add_argument("--sessions", type=int, default=40)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{args.sessions} 个会话, {args.seconds:.0f}s")
+    print(f"{'executor':<10}{'batched':<9}{'lag p50(ms)':>12}{'lag p99(ms)':>12}{'lag max(ms)':>12}{'cpu':>8}")
+    for batched in (False, True):
+        for mode in ("inline", "thread"):
+            stats, cpu = asyncio.run(run_case(mode, batched, args.sessions, args.seconds))
+            print(
+                f"{mode:<10}{str(batched):<9}{stats['p50_ms']:>12.2f}{stats['p99_ms']:>12.2f}"
+                f"{stats['max_ms']:>12.2f}{cpu:>8.0%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
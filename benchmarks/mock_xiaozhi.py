@@ -0,0 +1,238 @@
+"""
+本地小智服务端模拟
+Local XiaoZhi Backend Mock
+
+在本机提供 OTA 接口与 WebSocket 服务，让 XiaoZhiWebsocket 不连接官方服务器也能完成完整流程：
+- POST /xiaozhi/ota/ 返回指向本服务的 WebSocket 地址，设备视为已激活（activation=True 时返回激活挑战，
+  POST /xiaozhi/ota/activate 后视为已激活）；
+- WebSocket 握手后回复 hello，并像官方服务端一样发起 MCP initialize 与 tools/list；
+- 收到唤醒词 / 文本（listen detect）时回复 stt、llm、tts 消息和一段 TTS 音频；
+- 解码上行的 Opus 麦克风音频，检测到静音后的声音起点时立即回复一段提示音，
+  客户端据此测量音频往返延迟。
+
+服务端通过环境变量 OTA_URL 指向本服务：
+
+    python -m benchmarks.mock_xiaozhi --port 51900
+    OTA_URL=http://127.0.0.1:51900/xiaozhi/ota python main.py
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import uuid
+
+import numpy as np
+from aiohttp import WSMsgType, web
+
+from benchmarks.sessions import SAMPLE_RATE, TTS_SAMPLE_RATE, encode_tts
+
+logger = logging.getLogger(__name__)
+
+# 上行音频参数（与 XiaoZhiWebsocket 的 hello 一致）
+UPLINK_SAMPLE_RATE = 16000
+UPLINK_FRAME_SIZE = 320
+# 能量超过该值（int16 RMS）视为声音
+ONSET_RMS = 1000
+# 声音起点前至少需要的静音帧数
+ONSET_QUIET_FRAMES = 5
+
+
+def tone(seconds, frequency, level):
+    """48kHz 正弦提示音"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (np.sin(2 * np.pi * frequency * t) * level).astype(np.int16)
+
+
+class MockXiaoZhiBackend:
+    """
+    小智服务端模拟
+
+    每个 WebSocket 连接独立解码上行音频；回复的音频预先编码，整段一次性下发，
+    不引入额外的节奏延迟，往返延迟只包含 WebRTC 服务端自身的处理与排队。
+    """
+
+    def __init__(self, host="127.0.0.1", port=51900, reply_seconds=0.3, latency=0.0, activation=False):
+        """
+        初始化模拟服务
+
+        Args:
+            host: 监听地址
+            port: 监听端口
+            reply_seconds: 检测到声音后回复提示音的时长（秒）
+            latency: 模拟到官方服务器的网络往返时间（秒），加在 OTA 响应与 WebSocket 握手上
+            activation: 设备是否需要激活，激活前 OTA 响应中带有激活挑战
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.activation = activation
+        # 已激活的设备 MAC
+        self.activated = set()
+        self.ping_reply = encode_tts(tone(reply_seconds, 1000, 8000))
+        # 对话回复的音量低于 ONSET_RMS，不会被客户端误判为提示音的回复
+        self.speech_reply = encode_tts(tone(0.6, 440, 1200))
+        self.runner = None
+
+        # 统计信息
+        self.ota_requests = 0
+        self.activation_checks = 0
+        self.connections = 0
+        self.active_connections = 0
+        self.uplink_frames = 0
+        self.onsets = 0
+        self.wake_words = 0
+
+    @property
+    def ota_url(self):
+        return "http://{}:{}/xiaozhi/ota".format(self.host, self.port)
+
+    def create_app(self):
+        app = web.Application()
+        app.router.add_post("/xiaozhi/ota/", self.ota)
+        app.router.add_post("/xiaozhi/ota/activate", self.activate)
+        app.router.add_get("/xiaozhi/v1/", self.websocket)
+        return app
+
+    async def start(self):
+        """在当前事件循环中启动服务"""
+        self.runner = web.AppRunner(self.create_app(), access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info("小智服务端模拟已启动: %s", self.ota_url)
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def ota(self, request):
+        """OTA 接口：返回 WebSocket 地址，需要激活的设备在激活前还会收到激活挑战"""
+        self.ota_requests += 1
+        # HTTPS 请求约需两个往返（TLS 握手 + 请求）
+        await asyncio.sleep(self.latency * 2)
+        ota_info = {
+            "websocket": {"url": "ws://{}:{}/xiaozhi/v1/".format(self.host, self.port), "token": "mock"},
+            "firmware": {"version": "0.0.0", "url": ""},
+        }
+        if self.activation and request.headers.get("Device-Id") not in self.activated:
+            ota_info["activation"] = {"code": "000000", "message": "mock", "challenge": "mock"}
+        return web.json_response(ota_info)
+
+    async def activate(self, request):
+        """激活接口：第一次检查即激活成功"""
+        self.activation_checks += 1
+        self.activated.add(request.headers.get("Device-Id"))
+        return web.Response()
+
+    async def websocket(self, request):
+        """模拟一个设备的 WebSocket 会话"""
+        # 导入 xiaozhi_sdk 时才会加载 SDK 自带的 Opus 库，opuslib 需要在其后导入
+        import opuslib
+
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        self.active_connections += 1
+        session_id = uuid.uuid4().hex
+        decoder = opuslib.Decoder(UPLINK_SAMPLE_RATE, 1)
+        quiet_frames = 0
+        tasks = set()
+
+        def spawn(coro):
+            task = asyncio.create_task(coro)
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        try:
+            async for message in ws:
+                if message.type == WSMsgType.BINARY:
+                    self.uplink_frames += 1
+                    pcm = np.frombuffer(decoder.decode(message.data, UPLINK_FRAME_SIZE), dtype=np.int16)
+                    rms = float(np.sqrt(np.mean(pcm.astype(np.float32) ** 2)))
+                    if rms < ONSET_RMS:
+                        quiet_frames += 1
+                    elif quiet_frames >= ONSET_QUIET_FRAMES:
+                        quiet_frames = 0
+                        self.onsets += 1
+                        spawn(self.send_audio(ws, session_id, self.ping_reply, "ping"))
+                    continue
+                if message.type != WSMsgType.TEXT:
+                    continue
+
+                data = json.loads(message.data)
+                if data["type"] == "hello":
+                    # WebSocket (TLS) 握手与 hello 约需三个往返
+                    await asyncio.sleep(self.latency * 3)
+                    await ws.send_json(
+                        {
+                            "type": "hello",
+                            "transport": "websocket",
+                            "session_id": session_id,
+                            "audio_params": {
+                                "format": "opus",
+                                "sample_rate": TTS_SAMPLE_RATE,
+                                "channels": 1,
+                                "frame_duration": 20,
+                            },
+                        }
+                    )
+                    spawn(self.initialize_mcp(ws, session_id))
+                elif data["type"] == "listen" and data.get("state") == "detect":
+                    self.wake_words += 1
+                    spawn(self.reply(ws, session_id, data.get("text", "")))
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.active_connections -= 1
+        return ws
+
+    async def initialize_mcp(self, ws, session_id):
+        """与官方服务端一样在握手后初始化 MCP 并获取工具列表"""
+        vision = {"url": "http://{}:{}/vision".format(self.host, self.port), "token": "mock"}
+        for request_id, method, params in (
+            (1, "initialize", {"capabilities": {"vision": vision}}),
+            (2, "tools/list", {"cursor": ""}),
+        ):
+            payload = {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+            await ws.send_json({"session_id": session_id, "type": "mcp", "payload": payload})
+
+    async def reply(self, ws, session_id, text):
+        """回复一轮对话：stt、llm 表情、tts 文本与音频"""
+        await ws.send_json({"session_id": session_id, "type": "stt", "text": text})
+        await ws.send_json({"session_id": session_id, "type": "llm", "text": "😊", "emotion": "happy"})
+        await self.send_audio(ws, session_id, self.speech_reply, "好的")
+
+    async def send_audio(self, ws, session_id, packets, text):
+        await ws.send_json({"session_id": session_id, "type": "tts", "state": "start"})
+        await ws.send_json({"session_id": session_id, "type": "tts", "state": "sentence_start", "text": text})
+        for packet in packets:
+            await ws.send_bytes(packet)
+        await ws.send_json({"session_id": session_id, "type": "tts", "state": "stop"})
+
+    def get_statistics(self):
+        return {
+            "ota_requests": self.ota_requests,
+            "activation_checks": self.activation_checks,
+            "connections": self.connections,
+            "active_connections": self.active_connections,
+            "uplink_frames": self.uplink_frames,
+            "onsets": self.onsets,
+            "wake_words": self.wake_words,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地小智服务端模拟")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=51900)
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟的网络往返时间（秒）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    backend = MockXiaoZhiBackend(args.host, args.port, latency=args.latency)
+    web.run_app(backend.create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+回声消除参考信号缓冲区微基准测试
+Echo Reference Buffer Microbenchmark
+
+比较旧的 deque + np.concatenate 方式与 AudioRingBuffer 在参考信号路径上
+每帧的耗时与临时内存分配；lms / fdaf 两行测量回声消除器中加锁读写参考信号的实际路径。
+
+    python -m benchmarks.reference_buffer --frames 5000
+"""
+
+import argparse
+import time
+import tracemalloc
+from collections import deque
+
+import numpy as np
+
+from src.audio.echo_canceller import EchoCanceller
+from src.audio.fdaf_canceller import FrequencyDomainEchoCanceller
+from src.audio.ring_buffer import AudioRingBuffer
+
+FRAME_SIZE = 960
+WINDOW_FRAMES = 10
+FILTER_LENGTH = 1024
+
+
+class DequeReference:
+    """旧实现：每帧拷贝入队，读取时拼接最近 10 帧"""
+
+    def __init__(self):
+        self.buffer = deque(maxlen=100)
+
+    def add(self, samples):
+        # update_reference_audio 与 add_reference_audio 各拷贝一次
+        stored = samples.copy()
+        self.buffer.append(stored.copy())
+
+    def reference(self):
+        if len(self.buffer) >= WINDOW_FRAMES:
+            return np.concatenate(list(self.buffer)[-WINDOW_FRAMES:])
+        return np.concatenate(list(self.buffer))
+
+
+class RingReference:
+    """新实现：写入预分配的镜像环形缓冲区，读取返回连续视图"""
+
+    def __init__(self):
+        self.buffer = AudioRingBuffer(WINDOW_FRAMES * FRAME_SIZE)
+
+    def add(self, samples):
+        self.buffer.write(samples)
+
+    def reference(self):
+        return self.buffer.latest()
+
+
+class LmsReference:
+    """EchoCanceller：加锁写入环形缓冲区，加锁拷贝滤波窗口到预分配缓冲区"""
+
+    def __init__(self):
+        self.canceller = EchoCanceller()
+
+    def add(self, samples):
+        self.canceller.add_reference_audio(samples)
+
+    def reference(self):
+        return self.canceller._get_reference_signal()
+
+
+class FdafReference:
+    """FrequencyDomainEchoCanceller：加锁写入远端块，加锁取走并清零"""
+
+    def __init__(self):
+        self.canceller = FrequencyDomainEchoCanceller()
+
+    def add(self, samples):
+        self.canceller.add_reference_audio(samples)
+
+    def reference(self):
+        return self.canceller._take_reference_block()
+
+
+def run(impl, frames_data):
+    """模拟 recv 中每帧的参考信号路径：写入参考音频并读取滤波窗口"""
+    for samples in frames_data:
+        impl.add(samples)
+        impl.reference()[-FILTER_LENGTH:]
+
+
+def measure_time(factory, frames_data, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        impl = factory()
+        start = time.perf_counter()
+        run(impl, frames_data)
+        best = min(best, time.perf_counter() - start)
+    return best / len(frames_data)
+
+
+def measure_allocations(factory, frames_data):
+    """统计稳态下每帧的临时分配峰值（字节）"""
+    impl = factory()
+    # 先填满缓冲区，只统计稳态
+    run(impl, frames_data[:200])
+
+    tracemalloc.start()
+    peaks = []
+    for samples in frames_data[200:]:
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        run(impl, [samples])
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - current)
+    tracemalloc.stop()
+    return float(np.mean(peaks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="参考信号缓冲区微基准测试")
+    parser.add_argument("--frames", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frames_data = [rng.integers(-3000, 3000, FRAME_SIZE, dtype=np.int16) for _ in range(args.frames)]
+
+    print(f"{'impl':<8}{'us/frame':>10}{'transient bytes/frame':>24}")
+    for name, factory in (
+        ("deque", DequeReference),
+        ("ring", RingReference),
+        ("lms", LmsReference),
+        ("fdaf", FdafReference),
+    ):
+        per_frame = measure_time(factory, frames_data, args.repeat)
+        peak_bytes = measure_allocations(factory, frames_data)
+        print(f"{name:<8}{per_frame * 1e6:>10.2f}{peak_bytes:>24.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+多会话离线基准测试
+Offline Multi-Session Benchmark
+
+在进程内驱动 N 个 AudioFaceSwapper（含 EchoCancellationManager、VAD、播放时钟），不需要网络：
+- 客户端一侧用假的麦克风轨道按 20ms 时钟产生音频（近端说话 + 经回声路径的扬声器播放内容），
+  并像 RTCRtpSender 一样持续拉取输出帧做 Opus 编码；
+- 服务端一侧用 FakeXiaoZhiWebsocket 代替 XiaoZhiWebsocket，send_audio 与 TTS 解码都使用 SDK 自带的 AudioOpus，
+  TTS 按实时节奏推入 output_audio_queue。
+
+输出每个会话数下每核每秒处理的帧数、实时率、每帧延迟 p50/p99（麦克风帧产生到 VAD 决定是否发送）、
+每个会话的内存以及 ERLE。回声分量在假麦克风里是已知的，ERLE 由处理前后的回声能量直接计算，不依赖引擎自身的统计，
+没有回声的运行输出 n/a。可以设置阈值，超出时以非零状态退出，用于性能回归检查。
+
+    python -m benchmarks.sessions --sessions 1 10 50 100 200 500 --duration 10
+    python -m benchmarks.sessions --mic-wav mic.wav --tts-wav tts.wav --max-p99-ms 20 --min-realtime 0.98 --json result.json
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import math
+import resource
+import sys
+import time
+import wave
+from collections import deque
+from fractions import Fraction
+from types import SimpleNamespace
+
+import av
+import numpy as np
+from aiortc.codecs.opus import OpusEncoder
+from aiortc.mediastreams import MediaStreamError, MediaStreamTrack
+from xiaozhi_sdk.opus import AudioOpus
+
+from src.track.audio import AudioFaceSwapper
+
+SAMPLE_RATE = 48000
+FRAME_SIZE = 960
+FRAME_DURATION = 0.02
+# 服务端 TTS 的 Opus 参数
+TTS_SAMPLE_RATE = 24000
+TTS_FRAME_SIZE = 480
+
+
+def load_wav(path):
+    """读取 16bit WAV，转为 48kHz 单声道 int16"""
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError("只支持 16bit PCM WAV: {}".format(path))
+        channels = f.getnchannels()
+        rate = f.getframerate()
+        samples = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+    samples = samples.reshape(-1, channels).mean(axis=1)
+    if rate != SAMPLE_RATE:
+        positions = np.arange(0, len(samples) - 1, rate / SAMPLE_RATE)
+        samples = np.interp(positions, np.arange(len(samples)), samples)
+    return np.clip(samples, -32768, 32767).astype(np.int16)
+
+
+def synthetic_speech(seconds, rng, talk=1.5, pause=3.0, level=3000):
+    """说话 talk 秒、停顿 pause 秒交替的类语音信号（带音节包络的谐波）"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 120 + 40 * np.sin(2 * np.pi * 0.7 * t + rng.uniform(0, 6))
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 8))
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t + rng.uniform(0, 6)), 0, None)
+    talking = (t % (talk + pause)) < talk
+    noise = rng.standard_normal(len(t)) * 30
+    return np.clip(voice * syllables * talking * level + noise, -32768, 32767).astype(np.int16)
+
+
+def resample(samples, rate):
+    positions = np.arange(0, len(samples) - 1, SAMPLE_RATE / rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.int16)
+
+
+class FakeXiaoZhiWebsocket:
+    """
+    进程内的 XiaoZhiWebsocket 替身
+
+    send_audio 与真实 SDK 一样重采样到 16kHz 并 Opus 编码；TTS 预先编码为 24kHz/20ms 的 Opus 包，
+    说话阶段按实时节奏每 60ms 解码三包推入 output_audio_queue，与服务端下发的节奏一致。
+    """
+
+    def __init__(self, tts_packets, turn_frames, pause_frames):
+        self.audio_opus = AudioOpus(SAMPLE_RATE, 2, 20)
+        self.audio_opus.set_out_audio_frame({"sample_rate": TTS_SAMPLE_RATE, "frame_duration": 20, "channels": 1})
+        self.output_audio_queue = deque()
+        self.tts_packets = tts_packets
+        self.turn_frames = turn_frames
+        self.pause_frames = pause_frames
+        self.sent_frames = 0
+        self.video_frame = None
+
+    async def send_audio(self, pcm):
+        await self.audio_opus.pcm_to_opus(pcm)
+        self.sent_frames += 1
+        return True
+
+    async def run(self):
+        """交替播放 TTS 与等待用户说话"""
+        index = 0
+        while True:
+            for _ in range(0, self.turn_frames, 3):
+                for _ in range(3):
+                    packet = self.tts_packets[index % len(self.tts_packets)]
+                    index += 1
+                    self.output_audio_queue.extend(await self.audio_opus.opus_to_pcm(packet))
+                await asyncio.sleep(3 * FRAME_DURATION)
+            await asyncio.sleep(self.pause_frames * FRAME_DURATION)
+
+
+class ClientMicTrack(MediaStreamTrack):
+    """
+    客户端麦克风：近端语音 + 扬声器播放内容经过回声路径后的回声，交错立体声 s16
+
+    每帧的产生时间、近端语音与回声分量记录在 captured 中，用于计算处理延迟和 ERLE。
+    """
+
+    kind = "audio"
+
+    def __init__(self, near, echo_path):
+        super().__init__()
+        self.near = near
+        self.echo_path = echo_path
+        self.speaker = deque()
+        self.history = np.zeros(len(echo_path) - 1, dtype=np.float32)
+        self.captured = deque()
+        self.start = None
+        self.index = 0
+
+    def play(self, samples):
+        """客户端扬声器播放的一帧"""
+        self.speaker.append(samples)
+
+    async def recv(self):
+        if self.readyState != "live":
+            raise MediaStreamError
+        if self.start is None:
+            self.start = time.monotonic()
+        wait = self.start + self.index * FRAME_DURATION - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        played = self.speaker.popleft() if self.speaker else np.zeros(FRAME_SIZE, dtype=np.int16)
+        padded = np.concatenate([self.history, played.astype(np.float32)])
+        echo = np.convolve(padded, self.echo_path, mode="valid")
+        self.history = padded[FRAME_SIZE:]
+
+        offset = (self.index * FRAME_SIZE) % (len(self.near) - FRAME_SIZE)
+        near = self.near[offset : offset + FRAME_SIZE]
+        mono = np.clip(near + echo, -32768, 32767).astype(np.int16)
+        frame = av.AudioFrame.from_ndarray(np.repeat(mono, 2).reshape(1, -1), format="s16", layout="stereo")
+        frame.sample_rate = SAMPLE_RATE
+        frame.pts = self.index * FRAME_SIZE
+        frame.time_base = Fraction(1, SAMPLE_RATE)
+        self.index += 1
+        self.captured.append((time.perf_counter(), near, echo))
+        return frame
+
+
+class Session:
+    """一个会话：假麦克风、AudioFaceSwapper、假服务端以及模拟 RTCRtpSender 的拉流任务"""
+
+    def __init__(self, index, near, tts_packets, echo_path, latencies):
+        self.mic = ClientMicTrack(near, echo_path)
+        self.server = FakeXiaoZhiWebsocket(tts_packets, turn_frames=150, pause_frames=150)
+        xiaozhi = SimpleNamespace(server=self.server, pc=SimpleNamespace(session_id="bench-{}".format(index)))
+        self.track = AudioFaceSwapper(xiaozhi, self.mic)
+        self.encoder = OpusEncoder()
+        self.output_frames = 0
+        self.mic_frames = 0
+        # 有回声的帧上处理前的回声能量与处理后的残余回声能量
+        self.echo_energy = 0.0
+        self.residual_energy = 0.0
+        self.latencies = latencies
+
+        # 在 VAD 门限处记录每帧从产生到处理完成的延迟，并用回声消除后的音频累计 ERLE
+        gate_process = self.track.vad_gate.process
+
+        def timed_process(pcm_data):
+            result = gate_process(pcm_data)
+            captured, near, echo = self.mic.captured.popleft()
+            self.latencies.append(time.perf_counter() - captured)
+            self.mic_frames += 1
+            echo_energy = float(np.dot(echo, echo))
+            # 回声均方根小于 1 个采样单位时视为没有回声
+            if echo_energy > FRAME_SIZE:
+                residual = pcm_data[::2].astype(np.float32) - near
+                self.echo_energy += echo_energy
+                self.residual_energy += float(np.dot(residual, residual))
+            return result
+
+        self.track.vad_gate.process = timed_process
+        self.tasks = [asyncio.ensure_future(self.server.run()), asyncio.ensure_future(self.pull_output())]
+
+    async def pull_output(self):
+        """像 RTCRtpSender 一样拉取输出帧、在线程池中编码，并交给客户端扬声器"""
+        loop = asyncio.get_running_loop()
+        while True:
+            frame = await self.track.recv()
+            self.mic.play(np.frombuffer(frame.planes[0], dtype=np.int16)[:FRAME_SIZE].copy())
+            await loop.run_in_executor(None, self.encoder.encode, frame)
+            self.output_frames += 1
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        self.track.stop()
+        self.mic.stop()
+        await asyncio.gather(*self.tasks, self.track.microphone_task, return_exceptions=True)
+
+
+def rss_bytes():
+    """当前进程常驻内存"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+async def run_sessions(count, args, near_sources, tts_packets, echo_path, rng):
+    """运行 count 个会话并返回统计结果"""
+    gc.collect()
+    rss_before = rss_bytes()
+    latencies = []
+    sessions = []
+    for index in range(count):
+        sessions.append(Session(index, near_sources[index % len(near_sources)], tts_packets, echo_path, latencies))
+        # 各会话的 20ms 相位随机分布
+        if index % 10 == 9:
+            await asyncio.sleep(rng.uniform(0, FRAME_DURATION))
+
+    await asyncio.sleep(args.warmup)
+    gc.collect()
+    rss_after = rss_bytes()
+    latencies.clear()
+    for session in sessions:
+        session.mic_frames = session.output_frames = 0
+        session.echo_energy = session.residual_energy = 0.0
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+
+    await asyncio.sleep(args.duration)
+
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    mic_frames = sum(session.mic_frames for session in sessions)
+    output_frames = sum(session.output_frames for session in sessions)
+    sent_frames = sum(session.track.vad_gate.sent_frames for session in sessions)
+    suppressed_frames = sum(session.track.vad_gate.suppressed_frames for session in sessions)
+    underruns = sum(session.track.playout.underruns for session in sessions)
+    erle = [
+        10 * math.log10(session.echo_energy / session.residual_energy)
+        for session in sessions
+        if session.echo_energy > 0 and session.residual_energy > 0
+    ]
+    await asyncio.gather(*(session.close() for session in sessions))
+
+    expected = count * wall / FRAME_DURATION
+    latency = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "sessions": count,
+        "mic_frames_per_core_s": mic_frames / max(cpu, 1e-9),
+        "realtime": min(mic_frames, output_frames) / expected,
+        "p50_ms": float(np.percentile(latency, 50)),
+        "p99_ms": float(np.percentile(latency, 99)),
+        "cpu_cores": cpu / wall,
+        "mem_per_session_kb": (rss_after - rss_before) / count / 1024,
+        "vad_sent_ratio": sent_frames / max(1, sent_frames + suppressed_frames),
+        "playout_underruns": underruns,
+        "erle_db": float(np.mean(erle)) if erle else None,
+    }
+
+
+def encode_tts(samples):
+    """把 48kHz TTS 编码为服务端下发格式的 Opus 包"""
+    # 导入 xiaozhi_sdk 时才会加载 SDK 自带的 Opus 库，opuslib 需要在其后导入
+    import opuslib
+
+    encoder = opuslib.Encoder(fs=TTS_SAMPLE_RATE, channels=1, application=opuslib.APPLICATION_AUDIO)
+    pcm = resample(samples, TTS_SAMPLE_RATE)
+    return [
+        encoder.encode(pcm[start : start + TTS_FRAME_SIZE].tobytes(), TTS_FRAME_SIZE)
+        for start in range(0, len(pcm) - TTS_FRAME_SIZE, TTS_FRAME_SIZE)
+    ]
+
+
+async def main_async(args):
+    rng = np.random.default_rng(0)
+    if args.mic_wav:
+        near_sources = [load_wav(args.mic_wav)]
+    else:
+        near_sources = [synthetic_speech(20, rng) for _ in range(8)]
+    tts = load_wav(args.tts_wav) if args.tts_wav else synthetic_speech(10, rng, talk=10, pause=0, level=6000)
+    tts_packets = encode_tts(tts)
+
+    # 房间回声路径：20ms 延迟后指数衰减
+    echo_path = np.zeros(2048, dtype=np.float32)
+    decay = rng.standard_normal(1088) * np.exp(-np.arange(1088) / 200)
+    echo_path[960:] = decay / np.linalg.norm(decay) * 0.4
+
+    results = []
+    print(
+        f"{'N':>6}{'frames/s/core':>15}{'realtime':>10}{'p50 ms':>9}{'p99 ms':>9}"
+        f"{'cores':>8}{'KB/session':>12}{'vad sent':>10}{'ERLE dB':>9}{'underruns':>11}"
+    )
+    for count in args.sessions:
+        result = await run_sessions(count, args, near_sources, tts_packets, echo_path, rng)
+        results.append(result)
+        erle = "n/a" if result["erle_db"] is None else "{:.1f}".format(result["erle_db"])
+        print(
+            f"{count:>6}{result['mic_frames_per_core_s']:>15.0f}{result['realtime']:>10.3f}"
+            f"{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}{result['cpu_cores']:>8.2f}"
+            f"{result['mem_per_session_kb']:>12.0f}{result['vad_sent_ratio']:>10.2f}{erle:>9}"
+            f"{result['playout_underruns']:>11}"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多会话离线基准测试")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 50, 100, 200, 500])
+    parser.add_argument("--duration", type=float, default=10.0, help="每个会话数的测量时长（秒）")
+    parser.add_argument("--warmup", type=float, default=2.0, help="测量前的预热时长（秒）")
+    parser.add_argument("--mic-wav", help="近端麦克风录音（16bit WAV），默认使用合成语音")
+    parser.add_argument("--tts-wav", help="TTS 音频（16bit WAV），默认使用合成语音")
+    parser.add_argument("--max-p99-ms", type=float, help="p99 延迟超过该值时失败")
+    parser.add_argument("--min-realtime", type=float, help="实时率低于该值时失败")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failed = [
+        result["sessions"]
+        for result in results
+        if (args.max_p99_ms is not None and result["p99_ms"] > args.max_p99_ms)
+        or (args.min_realtime is not None and result["realtime"] < args.min_realtime)
+    ]
+    if failed:
+        print("超出阈值的会话数: {}".format(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
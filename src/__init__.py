@@ -1,22 +1,36 @@
+import argparse
 import asyncio
-import json
+import functools
 import logging
 import os
 import sys
+import time
 
 from aiohttp import web
 from aiortc import RTCConfiguration, RTCPeerConnection, RTCSessionDescription
 
-from src.config import DEFAULT_MAC_ADDR, OTA_URL, PORT
+from src import cluster
+from src.admission import AdmissionController
+from src.assets import asset_store
+from src.config import ADMIN_TOKEN, DEFAULT_MAC_ADDR, OTA_URL, PORT, TRICKLE_POLL_TIMEOUT, WORKERS
 from src.config.ice_config import ice_config
+from src.mcp_tools import tool_registry
+from src.reaper import SessionReaper, describe_session
+from src.resume import ResumableSessions
 from src.server import XiaoZhiServer
 from src.track.audio import AudioFaceSwapper
-from src.track.video import VideoFaceSwapper
-
-# 设置 logger
-logging.basicConfig(
-    stream=sys.stdout, level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
-)
+from src.track.video import VideoFrameConsumer
+from src.trickle import add_remote_candidates, start_gathering, wait_local_candidates
+from src.upstream import upstream_pool
+from src.utils import json_codec
+from src.utils.executor import media_executor
+from src.utils.log import log_pipeline, session_extra
+from src.utils.loop_monitor import loop_monitor
+from src.utils.metrics import metrics_registry, render
+from src.utils.profiler import profiler, to_speedscope
+
+# 设置 logger：格式化与输出在后台线程中进行
+log_pipeline.install()
 logger = logging.getLogger(__name__)
 
 # 禁用 aioice.ice 模块的日志输出
@@ -24,6 +38,13 @@ logging.getLogger("aioice.ice").setLevel(logging.WARNING)
 
 ROOT = os.path.dirname(__file__)
 
+# 页面与静态资源缓存在内存中，文件变化时自动重新加载
+asset_store.add_page("index", os.path.join(ROOT, "index.html"))
+asset_store.add_page("chat", os.path.join(ROOT, "chat.html"))
+asset_store.add_page("chatv2", os.path.join(ROOT, "chatv2.html"))
+asset_store.add_static("static", os.path.join(ROOT, "static"))
+asset_store.add_static("image", os.path.join(ROOT, "image"))
+
 
 def get_client_ip(request):
     """
@@ -57,30 +78,48 @@ def get_client_ip(request):
 
 
 async def index(request):
-    content = open(os.path.join(ROOT, "index.html"), "r", encoding="utf-8").read()
-    return web.Response(content_type="text/html", text=content)
+    return await asset_store.page(request, "index")
 
 
 async def chatv2(request):
-    content = open(os.path.join(ROOT, "chatv2.html"), "r", encoding="utf-8").read()
-    return web.Response(content_type="text/html", text=content)
+    return await asset_store.page(request, "chatv2")
 
 
 async def chat(request):
-    content = open(os.path.join(ROOT, "chat.html"), "r", encoding="utf-8").read()
-    return web.Response(content_type="text/html", text=content)
+    return await asset_store.page(request, "chat")
 
 
 async def ice(request):
-    """返回ICE服务器配置"""
-    ice_servers_config = ice_config.get_ice_config()
-    return web.Response(content_type="application/json", text=json.dumps(ice_servers_config, ensure_ascii=False))
+    """返回ICE服务器配置（响应体只在 TURN 临时凭据更新时重新编码）"""
+    return web.Response(content_type="application/json", body=ice_config.get_response_body())
 
 
 async def offer(request):
-    params = await request.json()
+    global sessions_created
+    started = time.perf_counter()
+    params = await request.json(loads=json_codec.loads)
     _offer = RTCSessionDescription(sdp=params["sdp"], type=params["type"])
 
+    # 携带 resumeToken 时恢复原有会话（会话属于其他工作进程时转发），失败则创建新会话
+    xiaozhi = resume_token = None
+    if params.get("resumeToken"):
+        forwarded = await cluster.forward_to_owner(request, params.get("sessionId"))
+        if forwarded is not None:
+            return forwarded
+        xiaozhi, resume_token = resumable_sessions.resume(params.get("sessionId"), params["resumeToken"])
+        if xiaozhi is None:
+            logger.info("会话不存在或已过期，创建新会话 [%s]", params.get("sessionId"))
+
+    if xiaozhi is None:
+        # 准入控制在创建 RTCPeerConnection 之前进行，过载时尽快返回；通过后直到登记会话之间不能有 await
+        reason = await admission.admit()
+        if reason is not None:
+            return web.json_response(
+                {"error": "服务繁忙，请稍后重试", "reason": reason, "retryAfter": admission.retry_after},
+                status=503,
+                headers={"Retry-After": str(admission.retry_after)},
+            )
+
     # 使用动态ICE服务器配置
     ice_servers = ice_config.get_server_ice_servers()
     configuration = RTCConfiguration(iceServers=ice_servers)
@@ -90,37 +129,305 @@ async def offer(request):
     # Store client IP in the peer connection object
     # 使用改进的IP获取函数
     pc.client_ip = get_client_ip(request)
-    pc.mac_address = params.get("macAddress") or DEFAULT_MAC_ADDR
-
-    await server(pc, _offer)
+    # 客户端支持时，积压的 DataChannel 消息合并为 JSON 数组发送
+    pc.batch_messages = bool(params.get("batch"))
+    # 客户端支持 trickle ICE 时立即返回应答，候选通过 /api/candidates 交换
+    pc.trickle = bool(params.get("trickle"))
+    pc.offer_started = started
+    resumed = xiaozhi is not None
+    if resumed:
+        previous_pc = xiaozhi.pc
+        pc.session_id = previous_pc.session_id
+        pc.mac_address = previous_pc.mac_address
+        xiaozhi.attach(pc)
+        # 旧连接可能还没有检测到断开，直接关闭
+        await previous_pc.close()
+        logger.info("会话已恢复 [%s %s] %s", pc.mac_address, pc.client_ip, pc.session_id)
+    else:
+        sessions_created += 1
+        # 会话 ID 带有工作进程编号，会话固定在创建它的进程上
+        pc.session_id = cluster.new_session_id()
+        pc.mac_address = params.get("macAddress") or DEFAULT_MAC_ADDR
+        xiaozhi = XiaoZhiServer(pc)
+        resume_token = resumable_sessions.add(pc.session_id, xiaozhi)
+
+    answer = await server(pc, _offer, xiaozhi, resumed)
+    offer_answer_seconds.labels(gather=ice_config.gather_mode, trickle=str(pc.trickle).lower()).observe(
+        time.perf_counter() - started
+    )
 
     return web.Response(
         content_type="application/json",
-        text=json.dumps({"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}),
+        body=json_codec.dumps_bytes(
+            {
+                "sdp": ice_config.advertise_public_ip(answer.sdp),
+                "type": answer.type,
+                "sessionId": pc.session_id,
+                "resumeToken": resume_token,
+                "resumed": resumed,
+                "trickle": pc.trickle,
+            }
+        ),
     )
 
 
+def trickle_peer(session_id, token):
+    """会话当前的 RTCPeerConnection，会话不存在、令牌错误或连接未使用 trickle ICE 时返回 None"""
+    xiaozhi = resumable_sessions.lookup(session_id, token)
+    if xiaozhi is None or not getattr(xiaozhi.pc, "trickle", False):
+        return None
+    return xiaozhi.pc
+
+
+async def get_candidates(request):
+    """长轮询服务端 ICE 候选"""
+    session_id = request.query.get("sessionId")
+    forwarded = await cluster.forward_to_owner(request, session_id)
+    if forwarded is not None:
+        return forwarded
+    pc = trickle_peer(session_id, request.headers.get("X-Resume-Token"))
+    if pc is None:
+        raise web.HTTPNotFound(text="会话不存在")
+    return web.json_response(await wait_local_candidates(pc, TRICKLE_POLL_TIMEOUT), dumps=json_codec.dumps)
+
+
+async def post_candidates(request):
+    """添加浏览器 ICE 候选"""
+    params = await request.json(loads=json_codec.loads)
+    forwarded = await cluster.forward_to_owner(request, params.get("sessionId"))
+    if forwarded is not None:
+        return forwarded
+    pc = trickle_peer(params.get("sessionId"), params.get("resumeToken"))
+    if pc is None:
+        raise web.HTTPNotFound(text="会话不存在")
+    added = await add_remote_candidates(pc, params.get("candidates") or [], bool(params.get("complete")))
+    return web.json_response({"added": added}, dumps=json_codec.dumps)
+
+
+async def health(request):
+    """返回所有工作进程汇总的健康状态与会话数，以及当前进程的准入限制与负载"""
+    stats = cluster.get_cluster_stats(get_session_counts)
+    stats["admission"] = admission.get_statistics()
+    stats["resume"] = resumable_sessions.get_statistics()
+    stats["ice"] = ice_config.get_statistics()
+    return web.json_response(stats)
+
+
+async def metrics(request):
+    """Prometheus 指标，多进程模式下汇总所有工作进程"""
+    if request.headers.get(cluster.FORWARDED_HEADER):
+        return web.json_response(metrics_registry.collect())
+    families_list = [metrics_registry.collect()]
+    if cluster.worker_count > 1:
+        families_list.extend(await cluster.gather_from_workers(request.rel_url.path))
+    return web.Response(text=render(families_list), content_type="text/plain", charset="utf-8")
+
+
+def check_admin(request):
+    """
+    管理接口鉴权：配置了 ADMIN_TOKEN 时校验 Bearer 令牌，否则只允许本机访问
+    """
+    if ADMIN_TOKEN:
+        if request.headers.get("Authorization") != "Bearer {}".format(ADMIN_TOKEN):
+            raise web.HTTPUnauthorized()
+    elif request.remote not in ("127.0.0.1", "::1"):
+        raise web.HTTPForbidden(text="管理接口只允许本机访问，远程访问请配置 ADMIN_TOKEN")
+
+
+def admin_headers(request):
+    """转发给其他工作进程时携带的鉴权头"""
+    return {"Authorization": request.headers["Authorization"]} if "Authorization" in request.headers else None
+
+
+async def profiler_status(request):
+    """查看或调整热路径分析器，多进程模式下同时作用于所有工作进程"""
+    check_admin(request)
+    if request.method == "POST":
+        params = await request.json()
+        try:
+            profiler.configure(
+                enabled=params.get("enabled"),
+                sample_rate=params.get("sample_rate"),
+                max_events=params.get("max_events"),
+                clear=params.get("clear", False),
+            )
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=str(e))
+    else:
+        params = None
+
+    status = dict(profiler.get_statistics(), worker=cluster.worker_id)
+    if request.headers.get(cluster.FORWARDED_HEADER):
+        return web.json_response(status)
+    workers = [status]
+    if cluster.worker_count > 1:
+        method = request.method
+        workers += await cluster.gather_from_workers(request.rel_url.path, method, params, admin_headers(request))
+    return web.json_response({"workers": sorted(workers, key=lambda item: item["worker"])})
+
+
+async def profiler_trace(request):
+    """
+    导出采样记录
+
+    Query:
+        format: "chrome"（默认，chrome://tracing / Perfetto）或 "speedscope"
+    """
+    check_admin(request)
+    events = profiler.chrome_trace(pid=cluster.worker_id)
+    if request.headers.get(cluster.FORWARDED_HEADER):
+        return web.json_response(events)
+    if cluster.worker_count > 1:
+        for worker_events in await cluster.gather_from_workers(request.rel_url.path, headers=admin_headers(request)):
+            events.extend(worker_events)
+
+    if request.query.get("format") == "speedscope":
+        body, filename = to_speedscope(events), "xiaozhi-profile.speedscope.json"
+    else:
+        body, filename = {"traceEvents": events, "displayTimeUnit": "ms"}, "xiaozhi-trace.json"
+    return web.json_response(body, headers={"Content-Disposition": 'attachment; filename="{}"'.format(filename)})
+
+
+async def sessions_status(request):
+    """当前会话的收发活动与内存估计，以及空闲会话回收记录，多进程模式下汇总所有工作进程"""
+    check_admin(request)
+    now = time.perf_counter()
+    status = {
+        "worker": cluster.worker_id,
+        "sessions": [describe_session(xiaozhi, now) for xiaozhi in resumable_sessions.sessions.values()],
+        "reaper": reaper.get_statistics(),
+    }
+    if request.headers.get(cluster.FORWARDED_HEADER):
+        return web.json_response(status)
+    workers = [status]
+    if cluster.worker_count > 1:
+        workers += await cluster.gather_from_workers(request.rel_url.path, headers=admin_headers(request))
+    return web.json_response({"workers": sorted(workers, key=lambda item: item["worker"])})
+
+
 pcs = set()
+# 当前进程累计创建的会话数
+sessions_created = 0
+
+connection_state_transitions = metrics_registry.counter(
+    "xiaozhi_connection_state_transitions", "Peer connection state changes by new state", labelnames=("state",)
+)
+# 从收到 offer 到返回应答（非 trickle 模式包括服务端 ICE 候选收集）、到连接建立的耗时
+offer_answer_seconds = metrics_registry.histogram(
+    "xiaozhi_offer_answer_seconds",
+    "Time from receiving an offer to returning the answer by ICE gather mode and trickle ICE",
+    labelnames=("gather", "trickle"),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0),
+)
+offer_connected_seconds = metrics_registry.histogram(
+    "xiaozhi_offer_connected_seconds",
+    "Time from receiving an offer to the peer connection becoming connected by trickle ICE",
+    labelnames=("trickle",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0),
+)
+
+
+def collect_session_metrics():
+    """导出当前进程的会话数"""
+    return [
+        ("xiaozhi_sessions", "gauge", "Active peer connections", [("xiaozhi_sessions", {}, len(pcs))]),
+        (
+            "xiaozhi_sessions_created",
+            "counter",
+            "Peer connections created",
+            [("xiaozhi_sessions_created_total", {}, sessions_created)],
+        ),
+    ]
+
+
+metrics_registry.register_collector(collect_session_metrics)
 
 
-async def server(pc, offer):
-    # Dictionary to store track instances
+def get_session_counts():
+    """当前进程的 (会话数, 累计创建会话数)"""
+    return len(pcs), sessions_created
 
-    xiaozhi = XiaoZhiServer(pc)
 
+# 已连接与等待恢复的会话，都计入准入控制的会话数
+resumable_sessions = ResumableSessions()
+metrics_registry.register_collector(resumable_sessions.collect_metrics)
+
+admission = AdmissionController(lambda: len(resumable_sessions))
+metrics_registry.register_collector(admission.collect_metrics)
+
+
+async def end_session(xiaozhi):
+    """关闭会话的上游连接（包括尚未完成的预热），释放准入名额"""
+    await xiaozhi.close()
+    admission.release()
+
+
+async def close_peer(pc, xiaozhi, ended):
+    """
+    关闭媒体连接；会话仍在使用该连接时结束会话，或进入宽限期等待客户端恢复
+
+    Args:
+        pc: RTCPeerConnection
+        xiaozhi: 会话的 XiaoZhiServer
+        ended: 客户端主动关闭，会话立即结束
+    """
+    if pc not in pcs:
+        # 已经处理过（pc.close() 会再次触发 closed 状态）
+        return
+    pcs.discard(pc)
+    # 取消视频消费任务
+    if hasattr(pc, "video_task") and not pc.video_task.done():
+        pc.video_task.cancel()
+        try:
+            await pc.video_task
+        except asyncio.CancelledError:
+            pass
+    await pc.close()
+
+    if xiaozhi.pc is not pc:
+        # 会话已经恢复到新的连接上
+        return
+    if ended:
+        resumable_sessions.remove(pc.session_id)
+        await end_session(xiaozhi)
+    else:
+        resumable_sessions.detach(pc.session_id, functools.partial(end_session, xiaozhi))
+
+
+async def reap_session(xiaozhi, reason):
+    """回收空闲或超时的会话：通知客户端后立即结束，不进入恢复宽限期"""
+    xiaozhi.safe_send({"type": "session", "state": "closed", "reason": reason})
+    pc = xiaozhi.pc
+    if pc in pcs:
+        await close_peer(pc, xiaozhi, ended=True)
+    elif resumable_sessions.remove(pc.session_id) is not None:
+        await end_session(xiaozhi)
+
+
+reaper = SessionReaper(lambda: resumable_sessions.sessions.values(), reap_session)
+metrics_registry.register_collector(reaper.collect_metrics)
+
+
+async def server(pc, offer, xiaozhi, resumed=False):
     # 监听来自客户端的 DataChannel
     @pc.on("datachannel")
     def on_datachannel(channel):
 
         @channel.on("message")
         async def on_message(message):
-            logger.info("收到客户端消息 [%s %s]: %s", pc.mac_address, pc.client_ip, message)
-            if xiaozhi.server is None:
-                await xiaozhi.start()
+            xiaozhi.last_inbound = time.perf_counter()
+            logger.info(
+                "收到客户端消息 [%s %s]:",
+                pc.mac_address,
+                pc.client_ip,
+                extra=session_extra(pc, "client", message),
+            )
+            # 等待预热中的上游连接，已断开时重新连接
+            await xiaozhi.start()
 
             if xiaozhi.server.output_audio_queue:
                 return
-            message = json.loads(message)
+            message = json_codec.loads(message)
 
             send_text_dict = {
                 "doublehit": {
@@ -140,22 +447,16 @@ async def server(pc, offer):
     @pc.on("connectionstatechange")
     async def on_connectionstatechange():
         logger.info("Connection state is %s %s %s", pc.connectionState, pc.mac_address, pc.client_ip)
+        connection_state_transitions.labels(state=pc.connectionState).inc()
         if pc.connectionState == "connected":
+            offer_connected_seconds.labels(trickle=str(pc.trickle).lower()).observe(
+                time.perf_counter() - pc.offer_started
+            )
             await xiaozhi.start()
 
         if pc.connectionState in ["failed", "closed", "disconnected"]:
-            # 取消视频消费任务
-            if hasattr(pc, "video_task") and not pc.video_task.done():
-                pc.video_task.cancel()
-                try:
-                    await pc.video_task
-                except asyncio.CancelledError:
-                    pass
-            # Stop all AudioFaceSwapper instances
-            if xiaozhi.server:
-                await xiaozhi.server.close()
-            await pc.close()
-            pcs.discard(pc)
+            # ICE 失败（网络切换、consent 超时）时保留会话等待恢复，客户端主动关闭时立即结束
+            await close_peer(pc, xiaozhi, ended=pc.connectionState == "closed")
 
     @pc.on("track")
     def on_track(track):
@@ -165,25 +466,54 @@ async def server(pc, offer):
             # 将 track 实例存储在 pc 对象上
             pc.audio_track = t
         elif track.kind == "video":
-            # 不 addTrack 视频轨道，只消费视频帧（节省 CPU）
+            # 不 addTrack 视频轨道，只按需解码视频帧供拍照使用（节省 CPU）
+            receiver = next((t.receiver for t in pc.getTransceivers() if t.receiver.track is track), None)
+            pc.video_consumer = VideoFrameConsumer(xiaozhi, track, receiver)
+
             async def consume_video():
-                while True:
-                    try:
-                        frame = await track.recv()
-                        if xiaozhi and xiaozhi.server:
-                            xiaozhi.server.video_frame = frame
-                    except asyncio.CancelledError:
-                        logger.debug("视频消费任务被取消 [%s %s]", pc.mac_address, pc.client_ip)
-                        break
-                    except Exception as e:
-                        logger.debug("视频消费任务异常退出 [%s %s]: %s", pc.mac_address, pc.client_ip, e)
-                        break
+                try:
+                    await pc.video_consumer.run()
+                except asyncio.CancelledError:
+                    logger.debug("视频消费任务被取消 [%s %s]", pc.mac_address, pc.client_ip)
+                except Exception as e:
+                    logger.debug("视频消费任务异常退出 [%s %s]: %s", pc.mac_address, pc.client_ip, e)
+
             # 保存任务引用以便后续取消
             pc.video_task = asyncio.create_task(consume_video())
 
-    await pc.setRemoteDescription(offer)
-    answer = await pc.createAnswer()
-    await pc.setLocalDescription(answer)
+    # 上游连接（OTA + WebSocket 握手）与 ICE / DTLS 握手并行建立
+    xiaozhi.prewarm()
+
+    # 新会话还没有建立过连接，失败时立即结束（释放上游连接与准入名额）；恢复的会话重新进入宽限期
+    close_on_error = functools.partial(close_peer, pc, xiaozhi, ended=not resumed)
+    try:
+        await pc.setRemoteDescription(offer)
+        answer = await pc.createAnswer()
+        if not pc.trickle:
+            # 等待候选收集完成，应答中包含全部候选
+            await pc.setLocalDescription(answer)
+            return pc.localDescription
+    except Exception:
+        await close_on_error()
+        raise
+    # 应答中不含候选，候选收集在后台进行
+    start_gathering(pc, answer, close_on_error)
+    return answer
+
+
+async def on_startup(app):
+    # 多进程模式下用工作进程编号区分各进程的指标
+    metrics_registry.const_labels["worker"] = str(cluster.worker_id)
+    # 监控事件循环延迟
+    loop_monitor.start()
+    admission.start()
+    reaper.start()
+    # 检查按需解码视频依赖的 aiortc 私有属性
+    VideoFrameConsumer.check_receiver_internals()
+    # 为默认 MAC 预先建立上游连接
+    upstream_pool.start(functools.partial(tool_registry.bind, None))
+    # 向集群发布会话数与心跳
+    app["heartbeat_task"] = asyncio.create_task(cluster.heartbeat(get_session_counts))
 
 
 async def on_shutdown(app):
@@ -191,10 +521,21 @@ async def on_shutdown(app):
     coros = [pc.close() for pc in pcs]
     await asyncio.gather(*coros)
     pcs.clear()
+    for session_id in list(resumable_sessions.sessions):
+        await resumable_sessions.remove(session_id).close()
 
+    app["heartbeat_task"].cancel()
+    await admission.stop()
+    await reaper.stop()
+    await upstream_pool.stop()
+    await loop_monitor.stop()
+    media_executor.shutdown()
+    log_pipeline.flush()
 
-def run():
+
+def create_app():
     app = web.Application()
+    app.on_startup.append(on_startup)
     app.on_shutdown.append(on_shutdown)
 
     app.router.add_get("/", index)
@@ -203,7 +544,28 @@ def run():
 
     app.router.add_get("/api/ice", ice)
     app.router.add_post("/api/offer", offer)
-    app.router.add_static("/static/", path=os.path.join(ROOT, "static"), name="static")
-    app.router.add_static("/image/", path=os.path.join(ROOT, "image"), name="image")
+    app.router.add_get("/api/candidates", get_candidates)
+    app.router.add_post("/api/candidates", post_candidates)
+    app.router.add_get("/api/health", health)
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/api/admin/profiler", profiler_status)
+    app.router.add_post("/api/admin/profiler", profiler_status)
+    app.router.add_get("/api/admin/profiler/trace", profiler_trace)
+    app.router.add_get("/api/admin/sessions", sessions_status)
+    app.router.add_get("/static/{path:.+}", asset_store.static_handler("static"), name="static")
+    app.router.add_get("/image/{path:.+}", asset_store.static_handler("image"), name="image")
+    return app
+
+
+def run():
+    parser = argparse.ArgumentParser(description="XiaoZhi WebRTC")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="工作进程数，大于 1 时启用多进程分片模式")
+    args = parser.parse_args()
+
+    # 在 fork 工作进程之前加载并压缩静态资源，各进程共享
+    asset_store.preload()
 
-    web.run_app(app, host="0.0.0.0", port=PORT)
+    if args.workers > 1:
+        cluster.run_workers(create_app, args.workers, host="0.0.0.0", port=PORT)
+    else:
+        web.run_app(create_app(), host="0.0.0.0", port=PORT)
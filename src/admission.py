@@ -0,0 +1,233 @@
+"""
+会话准入控制
+Session Admission Control
+
+每个工作进程独立判断是否接受新的 /api/offer：会话数达到上限、事件循环延迟过高或 CPU 过载时，
+新会话排入一个短等待队列，队列已满或等待超时则快速返回 503，避免过载拖垮已建立的会话。
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+
+import numpy as np
+
+from src.config import (
+    ADMISSION_MAX_CPU,
+    ADMISSION_MAX_LOOP_LAG,
+    ADMISSION_MAX_SESSIONS,
+    ADMISSION_QUEUE_SIZE,
+    ADMISSION_QUEUE_TIMEOUT,
+    ADMISSION_RETRY_AFTER,
+)
+from src.utils.loop_monitor import loop_monitor
+from src.utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionController:
+    """
+    会话准入控制
+
+    按顺序检查三个条件，返回第一个不满足的原因：
+    - "sessions": 当前会话数已达到 max_sessions
+    - "loop_lag": 最近 1 秒事件循环延迟 p90 超过 max_loop_lag
+    - "cpu": 最近一次采样的进程 CPU 使用超过 max_cpu 核
+    """
+
+    REASONS = ("sessions", "loop_lag", "cpu")
+    # CPU 采样间隔（秒）
+    CPU_SAMPLE_INTERVAL = 1.0
+    # 排队请求在没有会话释放时重新检查负载的间隔（秒）
+    RECHECK_INTERVAL = 0.1
+
+    def __init__(
+        self,
+        get_sessions,
+        max_sessions=ADMISSION_MAX_SESSIONS,
+        max_loop_lag=ADMISSION_MAX_LOOP_LAG,
+        max_cpu=ADMISSION_MAX_CPU,
+        queue_size=ADMISSION_QUEUE_SIZE,
+        queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+        retry_after=ADMISSION_RETRY_AFTER,
+        monitor=loop_monitor,
+    ):
+        """
+        初始化准入控制
+
+        Args:
+            get_sessions: 返回当前会话数的函数
+            max_sessions: 最大会话数，0 表示不限制
+            max_loop_lag: 事件循环延迟上限（秒），0 表示不检查
+            max_cpu: 进程 CPU 上限（核数），0 表示不检查
+            queue_size: 等待队列长度，0 表示不排队
+            queue_timeout: 排队最长等待时间（秒）
+            retry_after: 拒绝时建议的重试间隔（秒）
+            monitor: 提供延迟采样的 LoopLagMonitor
+        """
+        self.get_sessions = get_sessions
+        self.max_sessions = max_sessions
+        self.max_loop_lag = max_loop_lag
+        self.max_cpu = max_cpu
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.monitor = monitor
+
+        self.cpu = 0.0
+        self.cpu_task = None
+        # 有会话释放时完成，唤醒排队的请求
+        self.released = None
+        self.waiting = 0
+
+        # 统计信息
+        self.admitted = 0
+        self.queued = 0
+        self.queue_timeouts = 0
+        self.rejected = dict.fromkeys(self.REASONS, 0)
+
+    def start(self):
+        """在当前事件循环上启动 CPU 采样"""
+        if self.max_cpu and (self.cpu_task is None or self.cpu_task.done()):
+            self.cpu_task = asyncio.get_running_loop().create_task(self._sample_cpu())
+
+    async def stop(self):
+        if self.cpu_task is not None and not self.cpu_task.done():
+            self.cpu_task.cancel()
+            try:
+                await self.cpu_task
+            except asyncio.CancelledError:
+                pass
+        self.cpu_task = None
+
+    async def _sample_cpu(self):
+        last_wall, last_cpu = time.monotonic(), time.process_time()
+        while True:
+            await asyncio.sleep(self.CPU_SAMPLE_INTERVAL)
+            wall, cpu = time.monotonic(), time.process_time()
+            self.cpu = (cpu - last_cpu) / max(1e-6, wall - last_wall)
+            last_wall, last_cpu = wall, cpu
+
+    def recent_loop_lag(self):
+        """最近 1 秒事件循环延迟的 p90（秒）"""
+        count = max(1, int(1.0 / self.monitor.interval))
+        samples = list(itertools.islice(reversed(self.monitor.samples), count))
+        if not samples:
+            return 0.0
+        return float(np.percentile(samples, 90))
+
+    def check(self):
+        """
+        检查当前是否可以接受新会话
+
+        Returns:
+            str: 不满足的条件，可以接受时返回 None
+        """
+        if self.max_sessions and self.get_sessions() >= self.max_sessions:
+            return "sessions"
+        if self.max_loop_lag and self.recent_loop_lag() > self.max_loop_lag:
+            return "loop_lag"
+        if self.max_cpu and self.cpu > self.max_cpu:
+            return "cpu"
+        return None
+
+    async def admit(self):
+        """
+        申请接受一个新会话，必要时排队等待
+
+        返回 None 后调用方应当立即（不经过 await）登记新会话，保证会话数检查不被并发请求绕过。
+
+        Returns:
+            str: 被拒绝的原因，接受时返回 None
+        """
+        reason = self.check()
+        if reason is None:
+            self.admitted += 1
+            return None
+
+        if self.waiting >= self.queue_size:
+            self.rejected[reason] += 1
+            return reason
+
+        self.waiting += 1
+        self.queued += 1
+        deadline = time.monotonic() + self.queue_timeout
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.queue_timeouts += 1
+                    self.rejected[reason] += 1
+                    return reason
+                if self.released is None or self.released.done():
+                    self.released = asyncio.get_running_loop().create_future()
+                try:
+                    await asyncio.wait_for(asyncio.shield(self.released), min(remaining, self.RECHECK_INTERVAL))
+                except asyncio.TimeoutError:
+                    pass
+                current = self.check()
+                if current is None:
+                    self.admitted += 1
+                    return None
+                reason = current
+        finally:
+            self.waiting -= 1
+
+    def release(self):
+        """会话结束时调用，唤醒排队的请求"""
+        if self.released is not None and not self.released.done():
+            self.released.set_result(None)
+
+    def get_statistics(self):
+        """获取准入限制与当前负载"""
+        return {
+            "limits": {
+                "max_sessions": self.max_sessions,
+                "max_loop_lag_ms": self.max_loop_lag * 1000,
+                "max_cpu": self.max_cpu,
+                "queue_size": self.queue_size,
+                "queue_timeout": self.queue_timeout,
+            },
+            "load": {
+                "sessions": self.get_sessions(),
+                "loop_lag_ms": self.recent_loop_lag() * 1000,
+                "cpu": self.cpu if self.max_cpu else None,
+                "waiting": self.waiting,
+                "accepting": self.check() is None,
+            },
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "queue_timeouts": self.queue_timeouts,
+            "rejected": dict(self.rejected),
+        }
+
+    def collect_metrics(self):
+        """导出 Prometheus 指标"""
+        return [
+            (
+                "xiaozhi_admission_rejected",
+                "counter",
+                "Offers rejected by admission control by reason",
+                [("xiaozhi_admission_rejected_total", {"reason": key}, value) for key, value in self.rejected.items()],
+            ),
+            (
+                "xiaozhi_admission_admitted",
+                "counter",
+                "Offers admitted",
+                [("xiaozhi_admission_admitted_total", {}, self.admitted)],
+            ),
+            (
+                "xiaozhi_admission_waiting",
+                "gauge",
+                "Offers waiting in the admission queue",
+                [("xiaozhi_admission_waiting", {}, self.waiting)],
+            ),
+            (
+                "xiaozhi_admission_max_sessions",
+                "gauge",
+                "Configured session limit per worker (0 = unlimited)",
+                [("xiaozhi_admission_max_sessions", {}, self.max_sessions)],
+            ),
+        ]
@@ -0,0 +1,319 @@
+"""
+静态资源缓存
+Static Asset Cache
+
+页面与静态文件在启动时读入内存并预先生成 gzip / brotli 压缩版本，之后只在文件 mtime 变化时重新加载。
+页面中引用的 static/ 资源会被加上 ?v=<内容哈希>，带当前版本号的请求返回长期缓存头；
+所有响应都带 ETag，支持 If-None-Match 返回 304。
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import time
+
+from aiohttp import web
+
+from src.config import ASSET_BROTLI_QUALITY, ASSET_CACHE_MAX_AGE, ASSET_COMPRESS_MIN_SIZE, ASSET_GZIP_LEVEL
+from src.utils.executor import media_executor
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 值得压缩的文本类型
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "application/manifest+json", "image/svg")
+# 版本化资源的缓存头
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# 页面中对 static/ 资源的引用
+STATIC_REF_PATTERN = re.compile(r'((?:src|href)=")(/?static/)([^"?#]+)(")')
+
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+
+
+def compress_variants(body, content_type):
+    """
+    生成压缩版本
+
+    Args:
+        body: 原始内容
+        content_type: MIME 类型
+
+    Returns:
+        dict: 编码名 -> 压缩后的内容，只保留比原始内容更小的版本
+    """
+    if len(body) < ASSET_COMPRESS_MIN_SIZE or not content_type.startswith(COMPRESSIBLE_TYPES):
+        return {}
+    variants = {"gzip": gzip.compress(body, compresslevel=ASSET_GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, quality=ASSET_BROTLI_QUALITY)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(body) * 0.9}
+
+
+def accepted_encodings(header):
+    """解析 Accept-Encoding，返回客户端接受的编码集合（忽略 q=0）"""
+    encodings = set()
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+
+class Asset:
+    """内存中的一个资源及其压缩版本"""
+
+    def __init__(self, path, body, mtime, size, content_type, deps=None):
+        self.path = path
+        self.body = body
+        self.mtime = mtime
+        self.size = size
+        self.content_type = content_type
+        self.variants = compress_variants(body, content_type)
+        self.version = hashlib.sha1(body).hexdigest()[:12]
+        self.etag = 'W/"{}"'.format(self.version)
+        # 页面引用的静态资源及渲染时的版本号
+        self.deps = deps or {}
+
+
+class AssetStore:
+    """
+    页面与静态资源的内存缓存
+
+    页面按名称注册，静态目录按 URL 前缀挂载。所有文件在 preload 时读入并压缩，
+    多进程模式下在 fork 之前调用，工作进程共享已经压缩好的内容。
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.mounts = {}
+        self.assets = {}
+
+        # 统计信息
+        self.hits = 0
+        self.not_modified = 0
+        self.reloads = 0
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+
+    def add_page(self, name, path):
+        """注册页面"""
+        self.pages[name] = os.path.abspath(path)
+
+    def add_static(self, prefix, directory):
+        """挂载静态目录"""
+        self.mounts[prefix] = os.path.abspath(directory)
+
+    def preload(self):
+        """同步加载所有页面与静态文件（启动时调用，不要在事件循环中调用）"""
+        start = time.monotonic()
+        for prefix, directory in self.mounts.items():
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    relative = os.path.relpath(os.path.join(root, name), directory).replace(os.sep, "/")
+                    self._lookup(prefix, relative, load=True)
+        for name in self.pages:
+            self._lookup_page(name, load=True)
+
+        raw = sum(len(asset.body) for asset in self.assets.values())
+        compressed = sum(
+            min([len(asset.body)] + [len(v) for v in asset.variants.values()]) for asset in self.assets.values()
+        )
+        logger.info(
+            "静态资源已加载: %d 个文件, %.1f MB, 压缩后 %.1f MB, 耗时 %.1fs (brotli %s)",
+            len(self.assets),
+            raw / 1e6,
+            compressed / 1e6,
+            time.monotonic() - start,
+            "可用" if brotli is not None else "未安装",
+        )
+
+    def _resolve(self, prefix, relative):
+        """把 URL 路径解析为挂载目录下的文件，越界或不存在时返回 None"""
+        directory = self.mounts.get(prefix)
+        if directory is None:
+            return None
+        path = os.path.abspath(os.path.join(directory, relative))
+        if not path.startswith(directory + os.sep):
+            return None
+        return path
+
+    def _stale(self, asset, path):
+        """文件不存在返回 None，mtime 或大小变化返回 True"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if asset is None:
+            return True
+        return stat.st_mtime_ns != asset.mtime or stat.st_size != asset.size
+
+    def _load(self, path, render=None):
+        """读取文件并生成 Asset，页面由 render 改写静态资源引用"""
+        stat = os.stat(path)
+        with open(path, "rb") as f:
+            body = f.read()
+        deps = None
+        if render is not None:
+            body, deps = render(body)
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith(COMPRESSIBLE_TYPES):
+            content_type += "; charset=utf-8"
+        return Asset(path, body, stat.st_mtime_ns, stat.st_size, content_type, deps)
+
+    def _lookup(self, prefix, relative, load=False):
+        """
+        获取静态资源，文件变化时重新加载
+
+        Args:
+            load: 为 True 时在当前线程同步加载；否则只检查，需要加载时返回 (None, path)
+
+        Returns:
+            tuple: (Asset, path)，文件不存在时为 (None, None)
+        """
+        path = self._resolve(prefix, relative)
+        if path is None or not os.path.isfile(path):
+            return None, None
+        asset = self.assets.get(path)
+        stale = self._stale(asset, path)
+        if stale is None:
+            self.assets.pop(path, None)
+            return None, None
+        if stale:
+            if not load:
+                return None, path
+            if asset is not None:
+                self.reloads += 1
+            asset = self.assets[path] = self._load(path)
+        return asset, path
+
+    def _lookup_page(self, name, load=False):
+        """获取页面，页面文件或其引用的静态资源变化时重新渲染"""
+        path = self.pages[name]
+        asset = self.assets.get(path)
+        stale = self._stale(asset, path)
+        if stale is None:
+            return None, None
+        if not stale:
+            for (prefix, relative), version in asset.deps.items():
+                dep, _ = self._lookup(prefix, relative, load=load)
+                if dep is None or dep.version != version:
+                    stale = True
+                    break
+        if stale:
+            if not load:
+                return None, path
+            if asset is not None:
+                self.reloads += 1
+            asset = self.assets[path] = self._load(path, render=self._render_page)
+        return asset, path
+
+    def _render_page(self, body):
+        """给页面中的 static/ 引用加上内容版本号"""
+        deps = {}
+
+        def replace(match):
+            relative = match.group(3)
+            dep, _ = self._lookup("static", relative, load=True)
+            if dep is None:
+                return match.group(0)
+            deps[("static", relative)] = dep.version
+            return "{}{}{}?v={}{}".format(match.group(1), match.group(2), relative, dep.version, match.group(4))
+
+        text = STATIC_REF_PATTERN.sub(replace, body.decode("utf-8"))
+        return text.encode("utf-8"), deps
+
+    async def page(self, request, name):
+        """返回页面响应"""
+        asset, path = self._lookup_page(name)
+        if asset is None and path is not None:
+            # 文件已变化，在线程池中重新加载与压缩
+            asset, path = await media_executor.run(self._lookup_page, name, True)
+        if asset is None:
+            raise web.HTTPNotFound()
+        # 页面本身不带版本号，每次都需要重新验证
+        return self.respond(request, asset, "no-cache")
+
+    def static_handler(self, prefix):
+        """
+        创建静态目录的路由处理函数，路由形如 /{prefix}/{path:.+}
+
+        Args:
+            prefix: add_static 挂载时使用的前缀
+        """
+
+        async def handler(request):
+            relative = request.match_info["path"]
+            asset, path = self._lookup(prefix, relative)
+            if asset is None and path is not None:
+                # 文件已变化，在线程池中重新加载与压缩
+                asset, path = await media_executor.run(self._lookup, prefix, relative, True)
+            if asset is None:
+                raise web.HTTPNotFound()
+
+            if request.query.get("v") == asset.version:
+                cache_control = IMMUTABLE_CACHE_CONTROL
+            else:
+                cache_control = "public, max-age={}".format(ASSET_CACHE_MAX_AGE)
+            return self.respond(request, asset, cache_control)
+
+        return handler
+
+    def respond(self, request, asset, cache_control):
+        """
+        根据 If-None-Match 与 Accept-Encoding 构造响应
+
+        Args:
+            request: aiohttp 请求
+            asset: 资源
+            cache_control: Cache-Control 头
+
+        Returns:
+            web.Response: 200 或 304 响应
+        """
+        headers = {"ETag": asset.etag, "Cache-Control": cache_control}
+        if asset.variants:
+            headers["Vary"] = "Accept-Encoding"
+
+        if_none_match = request.headers.get("If-None-Match", "")
+        if if_none_match.strip() == "*" or asset.etag in (tag.strip() for tag in if_none_match.split(",")):
+            self.not_modified += 1
+            self.bytes_saved += len(asset.body)
+            return web.Response(status=304, headers=headers)
+
+        body = asset.body
+        accepted = accepted_encodings(request.headers.get("Accept-Encoding"))
+        for encoding in ("br", "gzip"):
+            if encoding in asset.variants and encoding in accepted:
+                body = asset.variants[encoding]
+                headers["Content-Encoding"] = encoding
+                break
+
+        self.hits += 1
+        self.bytes_sent += len(body)
+        self.bytes_saved += len(asset.body) - len(body)
+        headers["Content-Type"] = asset.content_type
+        return web.Response(body=body, headers=headers)
+
+    def get_statistics(self):
+        """获取资源缓存统计信息"""
+        return {
+            "assets": len(self.assets),
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "reloads": self.reloads,
+            "bytes_sent": self.bytes_sent,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+# 全局实例
+asset_store = AssetStore()
@@ -4,5 +4,6 @@ Audio Processing Module
 """
 
 from .echo_canceller import EchoCanceller
+from .fdaf_canceller import FrequencyDomainEchoCanceller
 
-__all__ = ["EchoCanceller"]
+__all__ = ["EchoCanceller", "FrequencyDomainEchoCanceller"]
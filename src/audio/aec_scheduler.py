@@ -0,0 +1,133 @@
+"""
+多会话批量回声消除调度器
+Batched Multi-Session Echo Cancellation Scheduler
+"""
+
+import asyncio
+import logging
+import weakref
+
+from src.audio.fdaf_canceller import FdafStateBank, FrequencyDomainEchoCanceller, process_batch
+from src.config.echo_config import EchoConfig
+from src.utils.executor import media_executor
+from src.utils.profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+
+class AECScheduler:
+    """
+    批量回声消除调度器
+
+    所有会话的频域回声消除器共享同一个 FdafStateBank。每个 20ms 周期内到达的麦克风帧先排队，
+    当所有会话都已提交，或首帧等待超过 max_wait 后，整批用一次向量化运算处理，
+    再把结果分发回各自的音频轨道。批运算交给 executor 执行，不占用事件循环。
+    """
+
+    def __init__(self, max_wait=None, executor=media_executor):
+        """
+        初始化调度器
+
+        Args:
+            max_wait: 首帧入队后最长等待时间（秒），默认使用 EchoConfig.BATCH_MAX_WAIT
+            executor: 执行批运算的 MediaExecutor
+        """
+        self.max_wait = EchoConfig.BATCH_MAX_WAIT if max_wait is None else max_wait
+        self.executor = executor
+        self.bank = FdafStateBank()
+        self.sessions = weakref.WeakSet()
+
+        # 当前周期待处理的 (回声消除器, 麦克风音频, future)
+        self.pending = []
+        self.pending_cancellers = set()
+        self.flush_handle = None
+        # 正在执行的批次任务
+        self.tasks = set()
+
+        # 统计信息
+        self.batches = 0
+        self.batched_frames = 0
+
+    def create_canceller(self):
+        """创建一个挂在共享状态库上的频域回声消除器"""
+        canceller = FrequencyDomainEchoCanceller(bank=self.bank)
+        self.sessions.add(canceller)
+        return canceller
+
+    async def process(self, canceller, input_audio):
+        """
+        提交一帧麦克风音频，等待所在批次处理完成
+
+        Args:
+            canceller: create_canceller 创建的回声消除器
+            input_audio: 麦克风音频 (int16)
+
+        Returns:
+            numpy array: 处理后的音频数据 (int16)
+        """
+        if canceller in self.pending_cancellers:
+            # 同一会话在一个周期内提交了两帧，先处理已排队的批次
+            self.flush()
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((canceller, input_audio, future))
+        self.pending_cancellers.add(canceller)
+
+        if len(self.pending) >= len(self.sessions):
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.max_wait, self.flush)
+
+        return await future
+
+    def flush(self):
+        """立即处理当前排队的所有帧"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        jobs = self.pending
+        if not jobs:
+            return
+        self.pending = []
+        self.pending_cancellers = set()
+
+        task = asyncio.get_running_loop().create_task(self._run_batch(jobs))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run_batch(self, jobs):
+        """执行一个批次并分发结果"""
+        trace = profiler.sample("aec.batch", lane="aec scheduler", batch_size=len(jobs))
+        try:
+            outputs = await self.executor.run(process_batch, [job[0] for job in jobs], [job[1] for job in jobs])
+        except Exception as e:
+            logger.error("批量回声消除失败: %s", e)
+            for _, _, future in jobs:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.batched_frames += len(jobs)
+        if trace:
+            trace.mark("process_batch")
+        for (_, _, future), output in zip(jobs, outputs):
+            if not future.done():
+                future.set_result(output)
+        if trace:
+            trace.finish()
+
+    def get_statistics(self):
+        """获取调度器统计信息"""
+        return {
+            "sessions": len(self.sessions),
+            "bank_capacity": self.bank.capacity,
+            "batches": self.batches,
+            "batched_frames": self.batched_frames,
+            "average_batch_size": self.batched_frames / max(1, self.batches),
+        }
+
+
+# 全局实例
+aec_scheduler = AECScheduler()
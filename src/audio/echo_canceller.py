@@ -3,11 +3,13 @@
 Echo Cancellation Module
 """
 
+import threading
 import time
 from collections import deque
 
 import numpy as np
 
+from src.audio.ring_buffer import AudioRingBuffer
 from src.config.echo_config import EchoConfig
 
 
@@ -30,8 +32,12 @@ class EchoCanceller:
         self.adaptive_filter = np.zeros(self.adaptive_filter_length)
         self.learning_rate = adaptive_params["learning_rate"]
 
-        # 缓冲区
-        self.echo_buffer = deque(maxlen=buffer_params["echo_buffer_size"])
+        # 缓冲区 - 参考信号使用预分配的环形缓冲区，读取时直接返回连续视图
+        self.echo_buffer = AudioRingBuffer(buffer_params["reference_window_samples"])
+        # 参考音频在事件循环中写入，回声消除在 executor 中读取，读写都要持有该锁；
+        # 读取时把最新窗口拷贝到预分配的缓冲区，锁只在拷贝期间持有
+        self.reference_lock = threading.Lock()
+        self.reference_window = np.zeros(self.adaptive_filter_length, dtype=np.float32)
         self.input_buffer = deque(maxlen=buffer_params["input_buffer_size"])
 
         # 预热参数
@@ -56,7 +62,8 @@ class EchoCanceller:
             reference_audio: 参考音频数据 (numpy array)
         """
         if reference_audio is not None:
-            self.echo_buffer.append(reference_audio.copy())
+            with self.reference_lock:
+                self.echo_buffer.write(reference_audio)
 
     def process_audio(self, input_audio, reference_audio=None):
         """
@@ -109,14 +116,11 @@ class EchoCanceller:
             return self._noise_gate(input_audio)
 
         # 获取最近的参考音频
-        ref_data = self._get_reference_signal()
+        ref_signal = self._get_reference_signal()
 
-        if len(ref_data) < self.adaptive_filter_length:
+        if len(ref_signal) < self.adaptive_filter_length:
             return self._noise_gate(input_audio)
 
-        # 截取适当长度的参考信号
-        ref_signal = ref_data[-self.adaptive_filter_length :]
-
         # 计算预测的回声
         predicted_echo = np.convolve(ref_signal, self.adaptive_filter, mode="valid")
 
@@ -127,11 +131,12 @@ class EchoCanceller:
         return self._noise_gate(cleaned_audio)
 
     def _get_reference_signal(self):
-        """获取参考信号"""
-        if len(self.echo_buffer) >= 10:
-            return np.concatenate(list(self.echo_buffer)[-10:])
-        else:
-            return np.concatenate(list(self.echo_buffer))
+        """获取参考信号（最近一个滤波器长度，不足时为全部样本），返回预分配缓冲区的视图，下一帧会被覆盖"""
+        with self.reference_lock:
+            latest = self.echo_buffer.latest(self.adaptive_filter_length)
+            window = self.reference_window[: len(latest)]
+            np.copyto(window, latest)
+        return window
 
     def _subtract_echo(self, input_audio, predicted_echo, ref_signal):
         """执行回声减法和滤波器更新"""
@@ -243,6 +248,15 @@ class EchoCanceller:
 
         return input_audio
 
+    def memory_usage(self):
+        """滤波器与缓冲区占用的内存（字节）"""
+        return (
+            self.adaptive_filter.nbytes
+            + self.echo_buffer.storage.nbytes
+            + self.reference_window.nbytes
+            + sum(getattr(item, "nbytes", 0) for item in self.input_buffer)
+        )
+
     def get_statistics(self):
         """
         获取统计信息
@@ -266,7 +280,8 @@ class EchoCanceller:
     def reset(self):
         """重置回声消除器状态"""
         self.adaptive_filter = np.zeros(self.adaptive_filter_length)
-        self.echo_buffer.clear()
+        with self.reference_lock:
+            self.echo_buffer.clear()
         self.input_buffer.clear()
         self.start_time = time.time()
         self.processed_frames = 0
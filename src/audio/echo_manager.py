@@ -3,9 +3,20 @@
 Echo Cancellation Manager - 统一管理回声消除逻辑
 """
 
+import threading
+
 import numpy as np
 
 from src.audio.echo_canceller import EchoCanceller
+from src.audio.fdaf_canceller import FrequencyDomainEchoCanceller
+from src.config.echo_config import EchoConfig
+from src.utils.profiler import profiler
+
+# 可选的回声消除引擎
+ECHO_CANCELLER_ENGINES = {
+    "lms": EchoCanceller,
+    "fdaf": FrequencyDomainEchoCanceller,
+}
 
 
 class EchoCancellationManager:
@@ -18,19 +29,33 @@ class EchoCancellationManager:
     - 自适应参数调整
     """
 
-    def __init__(self, enable_echo_cancellation=True, enable_debug=False):
+    def __init__(self, enable_echo_cancellation=True, enable_debug=False, engine=None, scheduler=None, executor=None):
         """
         初始化回声消除管理器
 
         Args:
             enable_echo_cancellation: 是否启用回声消除
             enable_debug: 是否启用调试信息
+            engine: 回声消除引擎名称 ("lms" / "fdaf")，默认使用 EchoConfig.ENGINE
+            scheduler: 批量回声消除调度器 (AECScheduler)，仅 fdaf 引擎可用
+            executor: 异步处理时执行回声消除的 MediaExecutor，为空时在事件循环中执行
         """
         self.enable_echo_cancellation = enable_echo_cancellation
         self.enable_debug = enable_debug
 
         # 初始化回声消除器
-        self.echo_canceller = EchoCanceller()
+        self.engine = engine or EchoConfig.ENGINE
+        if self.engine not in ECHO_CANCELLER_ENGINES:
+            raise ValueError(f"未知的回声消除引擎: {self.engine}，可选: {', '.join(ECHO_CANCELLER_ENGINES)}")
+        if scheduler is not None and self.engine != "fdaf":
+            raise ValueError("批量回声消除仅支持 fdaf 引擎")
+
+        self.scheduler = scheduler
+        self.executor = executor
+        if scheduler is not None:
+            self.echo_canceller = scheduler.create_canceller()
+        else:
+            self.echo_canceller = ECHO_CANCELLER_ENGINES[self.engine]()
 
         # 参考信号存储
         self.reference_audio = None
@@ -63,12 +88,13 @@ class EchoCancellationManager:
                 # self._log_debug("参考音频为空，跳过更新")
                 return
 
-            # 检查数值有效性
-            if not np.all(np.isfinite(reference_samples)):
+            # 检查数值有效性（整数音频不可能出现无效值，跳过检查避免每帧分配临时数组）
+            if reference_samples.dtype.kind == "f" and not np.all(np.isfinite(reference_samples)):
                 # self._log_debug("参考音频包含无效值，进行清理")
                 reference_samples = np.where(np.isfinite(reference_samples), reference_samples, 0)
 
-            self.reference_audio = reference_samples.copy()
+            # 参考音频出队后不会再被修改，直接保存引用；回声消除器写入时自行拷贝到预分配缓冲区
+            self.reference_audio = reference_samples
             # 同时添加到回声消除器的缓冲区
             self.echo_canceller.add_reference_audio(reference_samples)
 
@@ -86,32 +112,84 @@ class EchoCancellationManager:
         Returns:
             numpy array: 处理后的音频数据 (int16)
         """
+        trace = profiler.sample("aec.process", lane=threading.current_thread().name, engine=self.engine)
+        input_audio, ready = self._prepare_input(input_audio)
+        if not ready:
+            return input_audio
+
+        # 执行回声消除 - 添加异常处理
+        try:
+            if self.engine == "lms":
+                cleaned_audio = self.echo_canceller.process_audio(input_audio, reference_audio=self.reference_audio)
+            else:
+                # 频域引擎按帧对齐参考信号，参考音频只通过 update_reference_audio 写入
+                cleaned_audio = self.echo_canceller.process_audio(input_audio)
+        except Exception as e:
+            self._log_debug(f"Frame {self.frame_count}: 回声消除处理失败: {e}")
+            # 回声消除失败时，返回原始音频
+            return input_audio
+
+        if trace:
+            trace.mark("process_audio")
+        output = self._finish_output(input_audio, cleaned_audio)
+        if trace:
+            trace.mark("finish_output")
+            trace.finish()
+        return output
+
+    async def process_microphone_audio_async(self, input_audio):
+        """
+        处理麦克风输入的音频；配置了调度器时与其他会话合并批量处理，
+        否则在 executor 中执行单会话处理
+
+        Args:
+            input_audio: 麦克风输入的音频数据 (numpy array, int16)
+
+        Returns:
+            numpy array: 处理后的音频数据 (int16)
+        """
+        if self.scheduler is None:
+            if self.executor is None:
+                return self.process_microphone_audio(input_audio)
+            return await self.executor.run(self.process_microphone_audio, input_audio)
+
+        input_audio, ready = self._prepare_input(input_audio)
+        if not ready:
+            return input_audio
+
+        try:
+            cleaned_audio = await self.scheduler.process(self.echo_canceller, input_audio)
+        except Exception as e:
+            self._log_debug(f"Frame {self.frame_count}: 批量回声消除处理失败: {e}")
+            return input_audio
+
+        return self._finish_output(input_audio, cleaned_audio)
+
+    def _prepare_input(self, input_audio):
+        """
+        输入检查，返回 (音频, 是否需要回声消除)；不需要时返回的音频即为最终输出
+        """
         self.frame_count += 1
 
         # 输入验证
         if input_audio is None or len(input_audio) == 0:
             self._log_debug(f"Frame {self.frame_count}: 输入音频为空")
-            return np.zeros(960, dtype=np.int16)  # 返回静音帧
+            return np.zeros(960, dtype=np.int16), False  # 返回静音帧
 
         # 检查输入音频的数值有效性
-        if not np.all(np.isfinite(input_audio)):
+        if input_audio.dtype.kind == "f" and not np.all(np.isfinite(input_audio)):
             self._log_debug(f"Frame {self.frame_count}: 输入音频包含无效值，使用零填充")
             input_audio = np.where(np.isfinite(input_audio), input_audio, 0)
 
         # 如果回声消除未启用或没有参考信号，直接返回原始音频
         if not self.enable_echo_cancellation or self.reference_audio is None:
             # self._log_debug(f"Frame {self.frame_count}: 回声消除未启用或无参考信号")
-            return input_audio
+            return input_audio, False
 
-        # 执行回声消除 - 添加异常处理
-        try:
-            cleaned_audio = self.echo_canceller.process_audio(input_audio, reference_audio=self.reference_audio)
-        except Exception as e:
-            self._log_debug(f"Frame {self.frame_count}: 回声消除处理失败: {e}")
-            # 回声消除失败时，返回原始音频
-            return input_audio
+        return input_audio, True
 
-        # 安全检查和后处理
+    def _finish_output(self, input_audio, cleaned_audio):
+        """安全检查、混合与调试输出"""
         try:
             final_audio = self._safety_check_and_mix(input_audio, cleaned_audio)
         except Exception as e:
@@ -235,11 +313,17 @@ class EchoCancellationManager:
                 "over_suppression_count": self.over_suppression_count,
                 "over_suppression_rate": self.over_suppression_count / max(1, self.frame_count),
                 "echo_cancellation_enabled": self.enable_echo_cancellation,
+                "engine": self.engine,
                 "has_reference_audio": self.reference_audio is not None,
             },
             "echo_canceller_stats": echo_stats,
         }
 
+    def memory_usage(self):
+        """回声消除状态占用的内存估计（字节）"""
+        reference = self.reference_audio.nbytes if self.reference_audio is not None else 0
+        return self.echo_canceller.memory_usage() + reference
+
     def reset(self):
         """重置管理器状态"""
         self.echo_canceller.reset()
@@ -0,0 +1,436 @@
+"""
+频域分块回声消除器模块
+Partitioned-Block Frequency-Domain Adaptive Filter (PBFDAF) Echo Cancellation Module
+"""
+
+import heapq
+import threading
+import weakref
+
+import numpy as np
+
+from src.config.echo_config import EchoConfig
+
+
+def pbfdaf_step(state, near, far, step_size, power_smoothing, constrained_partitions):
+    """
+    分块频域自适应滤波的单步运算 (overlap-save, NLMS 归一化)
+
+    所有状态数组的第一维是会话批次维度，一次调用即可同时处理多个会话。
+    状态数组会被原地更新。
+
+    Args:
+        state: 状态字典，包含
+            - weights: 频域滤波器系数 (B, P, K) complex
+            - far_spectra: 远端信号历史频谱，下标 0 为最新块 (B, P, K) complex
+            - far_prev: 上一个远端块 (B, N) float
+            - power: 远端信号的平滑功率谱 (B, K) float
+        near: 近端（麦克风）信号块 (B, N) float
+        far: 远端（参考）信号块 (B, N) float
+        step_size: 归一化步长
+        power_smoothing: 功率谱平滑系数
+        constrained_partitions: 需要做梯度约束（去除循环卷积分量）的分块，
+            slice(None) 表示全部分块，None 表示不约束
+
+    Returns:
+        tuple: (误差信号 (B, N), 回声估计 (B, N))
+    """
+    weights = state["weights"]
+    far_spectra = state["far_spectra"]
+    far_prev = state["far_prev"]
+    power = state["power"]
+    block_size = far.shape[-1]
+    fft_size = 2 * block_size
+
+    # 远端频谱历史后移一个分块，写入最新的 [上一块, 当前块] 频谱
+    far_spectra[:, 1:] = far_spectra[:, :-1]
+    far_spectra[:, 0] = np.fft.rfft(np.concatenate((far_prev, far), axis=-1), axis=-1)
+    far_prev[...] = far
+
+    # 回声估计：各分块频域乘积求和后取后半段 (overlap-save)
+    echo_spectrum = np.einsum("bpk,bpk->bk", weights, far_spectra)
+    echo = np.fft.irfft(echo_spectrum, n=fft_size, axis=-1)[:, block_size:]
+    error = near - echo
+
+    # 远端功率谱平滑，用于逐频点归一化步长
+    latest_power = far_spectra[:, 0].real ** 2 + far_spectra[:, 0].imag ** 2
+    power *= power_smoothing
+    power += (1.0 - power_smoothing) * latest_power
+
+    error_spectrum = np.fft.rfft(
+        np.concatenate((np.zeros_like(error), error), axis=-1),
+        axis=-1,
+    )
+    # 各分块共享同一功率估计，总功率约为 分块数 * 单块功率
+    total_power = power * weights.shape[1]
+    regularization = np.mean(total_power, axis=-1, keepdims=True) * 1e-3 + 1e-6
+    normalized = error_spectrum * (step_size / (total_power + regularization))
+
+    gradient = np.conj(far_spectra) * normalized[:, None, :]
+    if constrained_partitions is not None:
+        # 梯度约束：时域只保留前 N 个系数
+        gradient_time = np.fft.irfft(gradient[:, constrained_partitions], n=fft_size, axis=-1)
+        gradient_time[..., block_size:] = 0.0
+        gradient[:, constrained_partitions] = np.fft.rfft(gradient_time, axis=-1)
+
+    weights += gradient
+    return error, echo
+
+
+class FdafStateBank:
+    """
+    多会话共享的频域滤波器状态
+
+    各会话的状态按槽位堆叠在同一组数组中，批量处理时一次 FFT 调用即可覆盖多个会话。
+    槽位总是优先分配最小的空闲编号，使活跃会话尽量落在连续区间内，批处理时直接使用切片视图。
+    状态使用单精度存储，内存带宽减半，对回声消除精度没有可感知的影响。
+    """
+
+    def __init__(self, capacity=1):
+        """
+        初始化状态库
+
+        Args:
+            capacity: 初始槽位数，不足时自动翻倍扩容
+        """
+        fdaf_params = EchoConfig.get_fdaf_params()
+
+        self.block_size = fdaf_params["block_size"]
+        self.partitions = fdaf_params["partitions"]
+        self.step_size = fdaf_params["step_size"]
+        self.power_smoothing = fdaf_params["power_smoothing"]
+        self.constraint = fdaf_params["constraint"]
+        self.chunk_size = fdaf_params["batch_chunk_size"]
+        self.bins = self.block_size + 1
+
+        self.capacity = 0
+        self.state = {}
+        self.free_slots = []
+        self.steps = 0
+        # 批处理可能在线程池中执行，槽位分配与扩容需要与运算互斥
+        self.lock = threading.Lock()
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        """扩容到指定槽位数，保留已有状态"""
+        shapes = {
+            "weights": ((self.partitions, self.bins), np.complex64),
+            "far_spectra": ((self.partitions, self.bins), np.complex64),
+            "far_prev": ((self.block_size,), np.float32),
+            "power": ((self.bins,), np.float32),
+        }
+        for name, (shape, dtype) in shapes.items():
+            grown = np.zeros((capacity,) + shape, dtype=dtype)
+            if name in self.state:
+                grown[: self.capacity] = self.state[name]
+            self.state[name] = grown
+
+        for slot in range(self.capacity, capacity):
+            heapq.heappush(self.free_slots, slot)
+        self.capacity = capacity
+
+    def acquire(self):
+        """分配一个槽位"""
+        with self.lock:
+            if not self.free_slots:
+                self._grow(max(1, self.capacity * 2))
+            return heapq.heappop(self.free_slots)
+
+    def release(self, slot):
+        """释放槽位并清空其状态"""
+        with self.lock:
+            self._clear(slot)
+            heapq.heappush(self.free_slots, slot)
+
+    def clear(self, slot):
+        """清空某个槽位的滤波器状态"""
+        with self.lock:
+            self._clear(slot)
+
+    def _clear(self, slot):
+        for value in self.state.values():
+            value[slot] = 0
+
+    @property
+    def active_slots(self):
+        return self.capacity - len(self.free_slots)
+
+    def _constrained_partitions(self):
+        """当前步需要做梯度约束的分块"""
+        if self.constraint == "full":
+            return slice(None)
+        if self.constraint == "rotating":
+            # 每步只约束一个分块，轮流进行 (与 Speex MDF 相同的做法)
+            index = self.steps % self.partitions
+            return slice(index, index + 1)
+        return None
+
+    def process(self, slots, near, far):
+        """
+        批量处理多个槽位的一帧
+
+        Args:
+            slots: 升序排列的槽位列表
+            near: 近端信号 (B, N)
+            far: 远端信号 (B, N)
+
+        Returns:
+            tuple: (误差信号 (B, N), 回声估计 (B, N))
+        """
+        with self.lock:
+            constrained = self._constrained_partitions()
+            self.steps += 1
+
+            # 大批次按块处理，让每块的中间数组留在 CPU 缓存中
+            error = np.empty_like(near)
+            echo = np.empty_like(near)
+            for start in range(0, len(slots), self.chunk_size):
+                rows = slice(start, start + self.chunk_size)
+                error[rows], echo[rows] = self._process_chunk(slots[rows], near[rows], far[rows], constrained)
+            return error, echo
+
+    def _process_chunk(self, slots, near, far, constrained):
+        """处理一块槽位"""
+        if slots[-1] - slots[0] + 1 == len(slots):
+            # 连续槽位：切片视图，原地更新
+            index = slice(slots[0], slots[-1] + 1)
+            view = {name: value[index] for name, value in self.state.items()}
+            return pbfdaf_step(view, near, far, self.step_size, self.power_smoothing, constrained)
+
+        # 非连续槽位：收集后运算再写回
+        index = np.asarray(slots)
+        gathered = {name: value[index] for name, value in self.state.items()}
+        result = pbfdaf_step(gathered, near, far, self.step_size, self.power_smoothing, constrained)
+        for name, value in gathered.items():
+            self.state[name][index] = value
+        return result
+
+
+def process_batch(cancellers, input_audios):
+    """
+    用一次向量化运算处理多个会话的一帧音频
+
+    Args:
+        cancellers: 共享同一个 FdafStateBank 的 FrequencyDomainEchoCanceller 列表，不可重复
+        input_audios: 与 cancellers 一一对应的麦克风音频 (int16)
+
+    Returns:
+        list: 处理后的音频 (int16)，顺序与输入一致
+    """
+    outputs = list(input_audios)
+    jobs = []
+    for position, (canceller, input_audio) in enumerate(zip(cancellers, input_audios)):
+        near, far, channels = canceller._begin(input_audio)
+        if near is not None:
+            jobs.append((canceller.slot, position, canceller, near, far, channels))
+
+    if not jobs:
+        return outputs
+
+    jobs.sort(key=lambda job: job[0])
+    bank = jobs[0][2].bank
+    slots = [job[0] for job in jobs]
+    near = np.stack([job[3] for job in jobs])
+    far = np.stack([job[4] for job in jobs])
+    error, echo = bank.process(slots, near, far)
+
+    for row, (_, position, canceller, near_block, _, channels) in enumerate(jobs):
+        outputs[position] = canceller._finish(input_audios[position], near_block, error[row], echo[row], channels)
+    return outputs
+
+
+class FrequencyDomainEchoCanceller:
+    """
+    分块频域自适应回声消除器
+    Partitioned-block frequency-domain adaptive filter (PBFDAF) echo canceller
+
+    与 EchoCanceller 接口一致，每个 20ms 帧只需要少量 FFT，
+    代替时域 LMS 的逐帧卷积与逐样本梯度更新。
+    """
+
+    def __init__(self, bank=None):
+        """
+        初始化频域回声消除器
+
+        Args:
+            bank: 共享的 FdafStateBank，为空时使用独立的状态库
+        """
+        fdaf_params = EchoConfig.get_fdaf_params()
+
+        self.block_size = fdaf_params["block_size"]
+        self.partitions = fdaf_params["partitions"]
+        self.divergence_ratio = fdaf_params["divergence_ratio"]
+
+        # 滤波器状态保存在状态库的槽位中，对象销毁时自动归还槽位
+        self.bank = bank or FdafStateBank()
+        self.slot = self.bank.acquire()
+        self._finalizer = weakref.finalize(self, self.bank.release, self.slot)
+
+        # 当前帧对应的远端参考块（预分配）；参考音频在事件循环中写入，回声消除在 executor 中读取，
+        # 读取与清零必须在同一次加锁内完成
+        self.pending_reference = np.zeros(self.block_size, dtype=np.float32)
+        self.pending_samples = 0
+        self.reference_lock = threading.Lock()
+        # 执行线程取走的远端块（预分配），以及没有参考音频时使用的静音块
+        self.reference_block = np.zeros(self.block_size, dtype=np.float32)
+        self.silent_reference = np.zeros(self.block_size, dtype=np.float32)
+        # 连续静音远端块计数，超过分块数时跳过运算
+        self.silent_blocks = self.partitions + 1
+
+        # 统计信息
+        self.processed_frames = 0
+        self.echo_detected_frames = 0
+        self.divergence_resets = 0
+        self.near_energy = 0.0
+        self.error_energy = 0.0
+
+    def add_reference_audio(self, reference_audio):
+        """
+        添加参考音频（播放的音频）到当前帧的远端块
+
+        Args:
+            reference_audio: 参考音频数据 (numpy array)
+        """
+        if reference_audio is None:
+            return
+
+        samples = np.asarray(reference_audio).reshape(-1)[-self.block_size :]
+        with self.reference_lock:
+            free = self.block_size - self.pending_samples
+            if len(samples) > free:
+                # 超出一个分块时只保留最新的样本
+                keep = self.block_size - len(samples)
+                start = self.pending_samples - keep
+                self.pending_reference[:keep] = self.pending_reference[start : self.pending_samples]
+                self.pending_samples = keep
+            self.pending_reference[self.pending_samples : self.pending_samples + len(samples)] = samples
+            self.pending_samples += len(samples)
+
+    def process_audio(self, input_audio, reference_audio=None):
+        """
+        处理音频，执行回声消除
+
+        Args:
+            input_audio: 输入音频数据 (numpy array, int16)，可以是交织的多声道数据
+            reference_audio: 当前的参考音频数据 (numpy array, optional)
+
+        Returns:
+            numpy array: 处理后的音频数据 (int16)
+        """
+        if reference_audio is not None:
+            self.add_reference_audio(reference_audio)
+
+        return process_batch([self], [input_audio])[0]
+
+    def _begin(self, input_audio):
+        """
+        开始处理一帧，返回 (近端块, 远端块, 声道数)；近端块为 None 时直接透传原始音频
+        """
+        self.processed_frames += 1
+
+        # 取走当前帧的远端块，之后写入的参考音频属于下一帧
+        far = self._take_reference_block()
+        near, channels = self._split_channels(input_audio)
+        if near is None:
+            # 帧长与分块大小不匹配，无法处理
+            return None, None, 0
+
+        # 没有新参考音频时远端块为静音
+        if far is not None:
+            self.silent_blocks = 0
+        else:
+            self.silent_blocks += 1
+            far = self.silent_reference
+        if self.silent_blocks > self.partitions:
+            # 远端历史全部为静音，回声估计与梯度都为零，直接透传
+            return None, None, 0
+
+        return near, far, channels
+
+    def _split_channels(self, input_audio):
+        """将交织音频混合为单声道近端块，返回 (近端块, 声道数)"""
+        if len(input_audio) == 0 or len(input_audio) % self.block_size != 0:
+            return None, 0
+
+        channels = len(input_audio) // self.block_size
+        audio_float = input_audio.astype(np.float32)
+        if channels == 1:
+            return audio_float, channels
+        return audio_float.reshape(self.block_size, channels).mean(axis=1), channels
+
+    def _take_reference_block(self):
+        """取出当前帧的远端块（拷贝到 reference_block）并清零，没有新参考音频时返回 None"""
+        with self.reference_lock:
+            if not self.pending_samples:
+                return None
+            np.copyto(self.reference_block, self.pending_reference)
+            self.pending_reference[:] = 0.0
+            self.pending_samples = 0
+        return self.reference_block
+
+    def _finish(self, input_audio, near, error, echo, channels):
+        """检查发散、统计并恢复为 int16 交织格式"""
+        near_energy = float(np.dot(near, near))
+        error_energy = float(np.dot(error, error))
+
+        if not np.isfinite(error_energy) or error_energy > near_energy * self.divergence_ratio + 1.0:
+            # 滤波器发散，重置并透传原始音频
+            self.divergence_resets += 1
+            self.bank.clear(self.slot)
+            return input_audio
+
+        self.near_energy = 0.9 * self.near_energy + 0.1 * near_energy
+        self.error_energy = 0.9 * self.error_energy + 0.1 * error_energy
+        if error_energy < near_energy * 0.64:
+            self.echo_detected_frames += 1
+
+        if channels == 1:
+            cleaned_audio = error
+        else:
+            cleaned_audio = (input_audio.reshape(self.block_size, channels) - echo[:, None]).reshape(-1)
+
+        return np.clip(cleaned_audio, -32767, 32767).astype(np.int16)
+
+    def memory_usage(self):
+        """本会话在共享状态库中的槽位与参考缓冲占用的内存（字节）"""
+        reference = self.pending_reference.nbytes + self.reference_block.nbytes + self.silent_reference.nbytes
+        return sum(array[self.slot].nbytes for array in self.bank.state.values()) + reference
+
+    def get_statistics(self):
+        """
+        获取统计信息
+
+        Returns:
+            dict: 统计信息字典
+        """
+        echo_detection_rate = 0
+        if self.processed_frames > 0:
+            echo_detection_rate = self.echo_detected_frames / self.processed_frames
+
+        erle_db = 0.0
+        if self.error_energy > 0 and self.near_energy > 0:
+            erle_db = 10 * np.log10(self.near_energy / self.error_energy)
+
+        return {
+            "processed_frames": self.processed_frames,
+            "echo_detected_frames": self.echo_detected_frames,
+            "echo_detection_rate": echo_detection_rate,
+            "warmup_completed": True,
+            "buffer_size": self.pending_samples,
+            "filter_coefficients_norm": float(np.linalg.norm(self.bank.state["weights"][self.slot])),
+            "erle_db": float(erle_db),
+            "divergence_resets": self.divergence_resets,
+        }
+
+    def reset(self):
+        """重置回声消除器状态"""
+        self.bank.clear(self.slot)
+        with self.reference_lock:
+            self.pending_reference[:] = 0.0
+            self.pending_samples = 0
+        self.silent_blocks = self.partitions + 1
+        self.processed_frames = 0
+        self.echo_detected_frames = 0
+        self.divergence_resets = 0
+        self.near_energy = 0.0
+        self.error_energy = 0.0
@@ -0,0 +1,93 @@
+"""
+输出音频帧池
+Outbound Audio Frame Pool
+"""
+
+from fractions import Fraction
+
+import av
+import numpy as np
+
+
+class AudioFramePool:
+    """
+    单个输出轨道的 av.AudioFrame 复用池
+
+    静音帧只在创建时清零一次，之后每个周期只更新 pts；TTS 音频直接拷贝进预分配帧的缓冲区，
+    不再每帧新建 numpy 数组和 AudioFrame。RTCRtpSender 在编码完上一帧后才会读取下一帧，
+    因此每个轨道轮换两块缓冲区就足够，帧不能跨轨道共享（pts 在编码线程中被读取）。
+    pts 按输出样本数单调递增，time_base 固定为 1/sample_rate。
+    """
+
+    def __init__(self, samples=960, sample_rate=48000, layout="mono", size=2):
+        """
+        初始化帧池
+
+        Args:
+            samples: 每帧样本数（每声道）
+            sample_rate: 采样率
+            layout: 声道布局
+            size: 轮换使用的音频帧数量
+        """
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.layout = layout
+        self.time_base = Fraction(1, sample_rate)
+        self.pts = 0
+
+        self.silence_frame = self._allocate()
+        self._buffer(self.silence_frame)[:] = 0
+        self.frames = [self._allocate() for _ in range(size)]
+        self.buffers = [self._buffer(frame) for frame in self.frames]
+        self.index = 0
+
+    def memory_usage(self):
+        """预分配帧占用的内存（字节）"""
+        return self.silence_frame.planes[0].buffer_size + sum(buffer.nbytes for buffer in self.buffers)
+
+    def _allocate(self):
+        frame = av.AudioFrame(format="s16", layout=self.layout, samples=self.samples)
+        frame.sample_rate = self.sample_rate
+        frame.time_base = self.time_base
+        return frame
+
+    def _buffer(self, frame):
+        """音频帧数据缓冲区的可写 int16 视图"""
+        return np.frombuffer(frame.planes[0], dtype=np.int16)
+
+    def _stamp(self, frame, samples):
+        frame.pts = self.pts
+        self.pts += samples
+        return frame
+
+    def silence(self):
+        """
+        获取下一帧静音
+
+        Returns:
+            av.AudioFrame: 复用的静音帧，内容不可修改
+        """
+        return self._stamp(self.silence_frame, self.samples)
+
+    def frame(self, samples):
+        """
+        用音频数据填充下一块预分配的帧
+
+        Args:
+            samples: int16 音频数据，长度不等于帧长时新建一帧
+
+        Returns:
+            av.AudioFrame: 音频帧，在下一次调用 frame 之前有效
+        """
+        samples = np.asarray(samples, dtype=np.int16).reshape(-1)
+        channels = len(self.silence_frame.layout.channels)
+        if len(samples) != self.samples * channels:
+            frame = av.AudioFrame.from_ndarray(samples.reshape(1, -1), format="s16", layout=self.layout)
+            frame.sample_rate = self.sample_rate
+            frame.time_base = self.time_base
+            return self._stamp(frame, frame.samples)
+
+        frame = self.frames[self.index]
+        self.buffers[self.index][:] = samples
+        self.index = (self.index + 1) % len(self.frames)
+        return self._stamp(frame, self.samples)
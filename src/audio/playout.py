@@ -0,0 +1,137 @@
+"""
+输出语音播放调度
+Outbound Audio Playout Scheduler
+"""
+
+import asyncio
+import logging
+import time
+
+from src.config import PLAYOUT_MAX_FRAMES, PLAYOUT_PREBUFFER_FRAMES, PLAYOUT_PREBUFFER_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class AudioPlayout:
+    """
+    时钟驱动的输出语音播放调度
+
+    按自己的单调 20ms 时钟出帧，与麦克风帧的到达完全解耦。服务端返回的 TTS 帧所在的队列
+    同时作为抖动缓冲：一段语音开始时先攒够 prebuffer_frames 帧（或等待 prebuffer_timeout）
+    再开始播放，播放中途队列取空时输出静音并重新进入缓冲。
+    """
+
+    # 队列取空后在这个时间内又收到语音，视为播放中断（欠载），而不是一段语音正常结束
+    UNDERRUN_WINDOW = 1.0
+    # 时钟落后超过这么多帧时（发送端卡顿）直接重新对齐，不再连续补帧
+    MAX_LATE_FRAMES = 5
+
+    def __init__(
+        self,
+        frame_duration=0.02,
+        prebuffer_frames=PLAYOUT_PREBUFFER_FRAMES,
+        prebuffer_timeout=PLAYOUT_PREBUFFER_TIMEOUT,
+        max_frames=PLAYOUT_MAX_FRAMES,
+    ):
+        """
+        初始化播放调度
+
+        Args:
+            frame_duration: 每帧时长（秒）
+            prebuffer_frames: 开始播放前缓冲的帧数
+            prebuffer_timeout: 缓冲不足时最多等待的时间（秒）
+            max_frames: 待播放帧数上限，超出时丢弃最旧的帧，0 表示不限制
+        """
+        self.frame_duration = frame_duration
+        self.prebuffer_frames = prebuffer_frames
+        self.prebuffer_timeout = prebuffer_timeout
+        self.max_frames = max_frames
+
+        self.start = None
+        self.ticks = 0
+        self.playing = False
+        self.buffering_since = None
+        self.starved_at = None
+
+        # 统计信息
+        self.played_frames = 0
+        self.silence_frames = 0
+        self.underruns = 0
+        self.overruns = 0
+        self.dropped_frames = 0
+        self.clock_resyncs = 0
+
+    async def wait_tick(self):
+        """等待下一个 20ms 时钟周期"""
+        now = time.monotonic()
+        if self.start is None:
+            self.start = now
+        deadline = self.start + self.ticks * self.frame_duration
+        if now - deadline > self.MAX_LATE_FRAMES * self.frame_duration:
+            self.clock_resyncs += 1
+            self.start = now
+            self.ticks = 0
+            deadline = now
+        elif deadline > now:
+            await asyncio.sleep(deadline - now)
+        self.ticks += 1
+
+    def take(self, queue):
+        """
+        按抖动缓冲状态取出本周期待播放的语音，每个时钟周期调用一次
+
+        Args:
+            queue: 服务端 TTS 帧队列 (deque)，为 None 时视为空
+
+        Returns:
+            numpy array: 语音帧 (int16)，需要输出静音时返回 None
+        """
+        samples = self._pop(queue)
+        if samples is None:
+            self.silence_frames += 1
+        else:
+            self.played_frames += 1
+        return samples
+
+    def _pop(self, queue):
+        if not queue:
+            if self.playing:
+                # 播放中途取空，输出静音并重新缓冲
+                self.playing = False
+                self.starved_at = time.monotonic()
+            self.buffering_since = None
+            return None
+
+        if self.max_frames and len(queue) > self.max_frames:
+            excess = len(queue) - self.max_frames
+            for _ in range(excess):
+                queue.popleft()
+            self.overruns += 1
+            self.dropped_frames += excess
+            logger.debug("输出语音缓冲溢出，丢弃 %d 帧", excess)
+
+        if not self.playing:
+            now = time.monotonic()
+            if self.buffering_since is None:
+                self.buffering_since = now
+            if len(queue) < self.prebuffer_frames and now - self.buffering_since < self.prebuffer_timeout:
+                return None
+            if self.starved_at is not None and now - self.starved_at < self.UNDERRUN_WINDOW:
+                self.underruns += 1
+            self.playing = True
+            self.buffering_since = None
+            self.starved_at = None
+
+        return queue.popleft()
+
+    def get_statistics(self):
+        """获取播放统计信息"""
+        return {
+            "playing": self.playing,
+            "played_frames": self.played_frames,
+            "silence_frames": self.silence_frames,
+            "underruns": self.underruns,
+            "overruns": self.overruns,
+            "dropped_frames": self.dropped_frames,
+            "clock_resyncs": self.clock_resyncs,
+        }
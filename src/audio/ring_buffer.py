@@ -0,0 +1,83 @@
+"""
+音频环形缓冲区模块
+Audio Ring Buffer Module
+"""
+
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    预分配的定长音频环形缓冲区
+
+    内部存储为两倍容量的镜像数组，每个样本同时写入 i 和 i + capacity 两个位置，
+    因此任意不超过容量的最新窗口都是一段连续内存，可以直接返回视图而无需拼接或拷贝。
+    """
+
+    def __init__(self, capacity, dtype=np.float32):
+        """
+        初始化环形缓冲区
+
+        Args:
+            capacity: 最多保留的样本数
+            dtype: 存储的数据类型，写入时原地转换
+        """
+        self.capacity = capacity
+        self.storage = np.zeros(2 * capacity, dtype=dtype)
+        self.write_index = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def write(self, samples):
+        """
+        写入音频样本，超出容量时覆盖最旧的样本
+
+        Args:
+            samples: 音频数据 (numpy array)，多维数组按展平后的顺序写入
+        """
+        samples = np.asarray(samples).reshape(-1)
+        count = len(samples)
+        if count == 0:
+            return
+        if count > self.capacity:
+            samples = samples[-self.capacity :]
+            count = self.capacity
+
+        capacity = self.capacity
+        start = self.write_index
+        first = min(count, capacity - start)
+        rest = count - first
+
+        self.storage[start : start + first] = samples[:first]
+        self.storage[start + capacity : start + capacity + first] = samples[:first]
+        if rest:
+            self.storage[:rest] = samples[first:]
+            self.storage[capacity : capacity + rest] = samples[first:]
+
+        self.write_index = (start + count) % capacity
+        self.size = min(self.size + count, capacity)
+
+    def latest(self, count=None):
+        """
+        获取最新的 count 个样本
+
+        Args:
+            count: 样本数，默认为当前全部样本
+
+        Returns:
+            numpy array: 连续内存的只读视图，下一次 write 之后内容会变化
+        """
+        if count is None or count > self.size:
+            count = self.size
+        end = self.write_index + self.capacity
+        view = self.storage[end - count : end]
+        view.flags.writeable = False
+        return view
+
+    def clear(self):
+        """清空缓冲区"""
+        self.storage[:] = 0
+        self.write_index = 0
+        self.size = 0
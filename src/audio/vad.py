@@ -0,0 +1,164 @@
+"""
+语音活动检测门限
+Voice Activity Gate
+"""
+
+import logging
+import math
+from collections import deque
+
+import numpy as np
+
+from src.config import (
+    VAD_ENERGY_THRESHOLD_DB,
+    VAD_HANGOVER,
+    VAD_MODE,
+    VAD_ONSET_FRAMES,
+    VAD_PRE_ROLL,
+    VAD_SNR_DB,
+    VAD_ZCR_THRESHOLD,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class VoiceActivityGate:
+    """
+    基于能量与过零率的语音活动检测门限
+
+    用户不说话时不再把麦克风帧发送到服务端，省去 Opus 编码与 websocket 流量。
+    门限关闭期间保留最近 pre_roll 秒的帧，检测到语音时先补发，避免切掉语音开头；
+    语音结束后继续发送 hangover 秒，让服务端自己的 VAD 能看到足够长的静音来判断说话结束。
+    """
+
+    MODES = ("gate", "off")
+    # 清音检测放宽的能量阈值 (dB)
+    ZCR_MARGIN_DB = 6.0
+    # 噪声底噪的平滑系数
+    NOISE_SMOOTHING = 0.95
+
+    def __init__(
+        self,
+        mode=VAD_MODE,
+        frame_duration=0.02,
+        energy_threshold_db=VAD_ENERGY_THRESHOLD_DB,
+        snr_db=VAD_SNR_DB,
+        zcr_threshold=VAD_ZCR_THRESHOLD,
+        onset_frames=VAD_ONSET_FRAMES,
+        hangover=VAD_HANGOVER,
+        pre_roll=VAD_PRE_ROLL,
+        channels=2,
+    ):
+        """
+        初始化门限
+
+        Args:
+            mode: "gate" 只发送语音帧, "off" 发送所有帧
+            frame_duration: 每帧时长（秒）
+            energy_threshold_db: 能量阈值 (dBFS)
+            snr_db: 相对自适应噪声底噪的最小信噪比 (dB)
+            zcr_threshold: 清音过零率阈值
+            onset_frames: 连续多少帧语音才打开门限
+            hangover: 语音结束后继续发送的时长（秒）
+            pre_roll: 门限打开时补发的预录时长（秒）
+            channels: 交错存储的声道数，检测只使用第一个声道
+        """
+        if mode not in self.MODES:
+            raise ValueError("不支持的 VAD 模式: {}".format(mode))
+
+        self.enabled = mode == "gate"
+        self.energy_threshold_db = energy_threshold_db
+        self.snr_db = snr_db
+        self.zcr_threshold = zcr_threshold
+        self.onset_frames = onset_frames
+        self.hangover_frames = int(round(hangover / frame_duration))
+        self.channels = channels
+
+        self.pre_roll = deque(maxlen=max(1, int(round(pre_roll / frame_duration))))
+        self.noise_floor_db = energy_threshold_db - snr_db
+        self.speech_run = 0
+        self.hangover_left = 0
+        self.open = False
+
+        # 统计信息
+        self.sent_frames = 0
+        self.suppressed_frames = 0
+        self.speech_segments = 0
+
+    def is_speech(self, pcm_data):
+        """
+        判断一帧是否包含语音
+
+        Args:
+            pcm_data: 麦克风音频 (int16)
+
+        Returns:
+            bool: 是否为语音帧
+        """
+        samples = pcm_data[:: self.channels].astype(np.float32)
+        energy = float(np.dot(samples, samples)) / max(1, len(samples))
+        energy_db = 10.0 * math.log10(energy / (32768.0**2) + 1e-12)
+        zcr = np.count_nonzero(np.signbit(samples[1:]) != np.signbit(samples[:-1])) / max(1, len(samples) - 1)
+
+        threshold = max(self.energy_threshold_db, self.noise_floor_db + self.snr_db)
+        speech = energy_db > threshold or (zcr > self.zcr_threshold and energy_db > threshold - self.ZCR_MARGIN_DB)
+        if not speech:
+            # 只在非语音帧上更新噪声底噪
+            self.noise_floor_db = self.NOISE_SMOOTHING * self.noise_floor_db + (1 - self.NOISE_SMOOTHING) * energy_db
+        return speech
+
+    def process(self, pcm_data):
+        """
+        处理一帧麦克风音频
+
+        Args:
+            pcm_data: 回声消除后的麦克风音频 (int16)
+
+        Returns:
+            list[bytes]: 需要发送到服务端的帧（可能为空，门限打开时包含预录帧）
+        """
+        frame = pcm_data.tobytes()
+        if not self.enabled:
+            self.sent_frames += 1
+            return [frame]
+
+        if self.is_speech(pcm_data):
+            self.speech_run += 1
+        else:
+            self.speech_run = 0
+
+        if self.speech_run >= self.onset_frames:
+            self.hangover_left = self.hangover_frames
+            if not self.open:
+                self.open = True
+                self.speech_segments += 1
+                frames = list(self.pre_roll) + [frame]
+                self.pre_roll.clear()
+                # 预录帧此前已计入 suppressed，改为计入 sent
+                self.suppressed_frames -= len(frames) - 1
+                self.sent_frames += len(frames)
+                return frames
+        elif self.open:
+            if self.hangover_left > 0:
+                self.hangover_left -= 1
+            else:
+                self.open = False
+
+        if self.open:
+            self.sent_frames += 1
+            return [frame]
+
+        self.pre_roll.append(frame)
+        self.suppressed_frames += 1
+        return []
+
+    def get_statistics(self):
+        """获取门限统计信息"""
+        return {
+            "enabled": self.enabled,
+            "open": self.open,
+            "sent_frames": self.sent_frames,
+            "suppressed_frames": self.suppressed_frames,
+            "speech_segments": self.speech_segments,
+            "noise_floor_db": round(self.noise_floor_db, 1),
+        }
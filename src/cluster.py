@@ -0,0 +1,272 @@
+"""
+多进程分片服务
+Multi-Process Sharded Server
+
+主进程 fork 出 N 个工作进程，共同以 SO_REUSEPORT 监听同一个 HTTP 端口，由内核分配新连接。
+每个工作进程拥有自己的 RTCPeerConnection 与 UDP ICE 套接字，会话从创建起就固定在该进程上：
+会话 ID 中带有工作进程编号，后续与会话相关的 HTTP 请求如果落到其他进程，
+通过仅监听本机的内部端口转发给所属进程。
+各进程的会话数与心跳写入共享内存，任意进程都能汇总整个集群的健康状态。
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+import uuid
+
+from aiohttp import ClientSession, ClientTimeout, web
+
+from src.config import CLUSTER_HEARTBEAT_INTERVAL, CLUSTER_INTERNAL_PORT_BASE
+
+logger = logging.getLogger(__name__)
+
+# 共享内存中每个工作进程占用的字段
+STAT_FIELDS = ("pid", "sessions", "sessions_created", "heartbeat")
+
+# 转发请求时附带的请求头，防止循环转发
+FORWARDED_HEADER = "X-Cluster-Forwarded"
+
+# 当前进程的工作进程编号与总数，单进程模式下为 0 / 1
+worker_id = 0
+worker_count = 1
+_stats = None
+
+
+def init_worker(index, count, stats):
+    """在工作进程中初始化分片信息"""
+    global worker_id, worker_count, _stats
+    worker_id = index
+    worker_count = count
+    _stats = stats
+
+
+def new_session_id():
+    """生成带工作进程编号的会话 ID"""
+    return "{}-{}".format(worker_id, uuid.uuid4().hex)
+
+
+def session_owner(session_id):
+    """
+    解析会话所属的工作进程
+
+    Returns:
+        int: 工作进程编号，无法解析时返回 None
+    """
+    owner, _, _ = (session_id or "").partition("-")
+    if not owner.isdigit() or int(owner) >= worker_count:
+        return None
+    return int(owner)
+
+
+def is_local_session(session_id):
+    """会话是否属于当前进程"""
+    owner = session_owner(session_id)
+    return owner is None or owner == worker_id
+
+
+async def forward_to_owner(request, session_id):
+    """
+    把请求转发给会话所属的工作进程
+
+    Args:
+        request: aiohttp 请求
+        session_id: 会话 ID
+
+    Returns:
+        web.Response: 所属进程的响应；会话属于当前进程或无法转发时返回 None
+    """
+    owner = session_owner(session_id)
+    if owner is None or owner == worker_id or request.headers.get(FORWARDED_HEADER):
+        return None
+
+    url = "http://127.0.0.1:{}{}".format(CLUSTER_INTERNAL_PORT_BASE + owner, request.rel_url)
+    headers = {key: value for key, value in request.headers.items() if key.lower() not in ("host", "content-length")}
+    headers[FORWARDED_HEADER] = str(worker_id)
+    # 保留客户端 IP
+    headers.setdefault("X-Real-IP", request.remote or "unknown")
+
+    async with ClientSession(timeout=ClientTimeout(total=30)) as session:
+        async with session.request(request.method, url, headers=headers, data=await request.read()) as resp:
+            body = await resp.read()
+            return web.Response(status=resp.status, body=body, content_type=resp.content_type)
+
+
+async def gather_from_workers(path, method="GET", data=None, headers=None):
+    """
+    向其他所有工作进程的内部端口发送请求并收集 JSON 响应
+
+    Args:
+        path: 请求路径，由各进程在本地处理（带 FORWARDED_HEADER，不会再次转发）
+        method: HTTP 方法
+        data: 作为 JSON 请求体发送的数据
+        headers: 附加请求头（如管理接口的 Authorization）
+
+    Returns:
+        list: 各进程返回的 JSON，请求失败的进程被跳过
+    """
+    results = []
+    request_headers = dict(headers or {})
+    request_headers[FORWARDED_HEADER] = str(worker_id)
+    async with ClientSession(timeout=ClientTimeout(total=5)) as session:
+
+        async def fetch(index):
+            url = "http://127.0.0.1:{}{}".format(CLUSTER_INTERNAL_PORT_BASE + index, path)
+            try:
+                async with session.request(method, url, json=data, headers=request_headers) as resp:
+                    results.append(await resp.json())
+            except Exception as e:
+                logger.warning("请求工作进程 %d 失败: %s", index, e)
+
+        await asyncio.gather(*(fetch(index) for index in range(worker_count) if index != worker_id))
+    return results
+
+
+def publish_stats(sessions, sessions_created):
+    """把当前进程的会话数写入共享内存"""
+    if _stats is None:
+        return
+    values = (os.getpid(), sessions, sessions_created, time.time())
+    offset = worker_id * len(STAT_FIELDS)
+    with _stats.get_lock():
+        for index, value in enumerate(values):
+            _stats[offset + index] = value
+
+
+async def heartbeat(get_counts):
+    """
+    周期性发布会话数与心跳
+
+    Args:
+        get_counts: 返回 (当前会话数, 累计创建会话数) 的函数
+    """
+    while True:
+        publish_stats(*get_counts())
+        await asyncio.sleep(CLUSTER_HEARTBEAT_INTERVAL)
+
+
+def get_cluster_stats(get_counts):
+    """
+    汇总所有工作进程的健康状态与会话数
+
+    Args:
+        get_counts: 返回当前进程 (当前会话数, 累计创建会话数) 的函数
+
+    Returns:
+        dict: 集群统计信息
+    """
+    workers = []
+    if _stats is None:
+        sessions, sessions_created = get_counts()
+        workers.append(
+            {
+                "worker": 0,
+                "pid": os.getpid(),
+                "sessions": sessions,
+                "sessions_created": sessions_created,
+                "alive": True,
+            }
+        )
+    else:
+        publish_stats(*get_counts())
+        now = time.time()
+        with _stats.get_lock():
+            values = list(_stats)
+        for index in range(worker_count):
+            row = dict(zip(STAT_FIELDS, values[index * len(STAT_FIELDS) : (index + 1) * len(STAT_FIELDS)]))
+            workers.append(
+                {
+                    "worker": index,
+                    "pid": int(row["pid"]),
+                    "sessions": int(row["sessions"]),
+                    "sessions_created": int(row["sessions_created"]),
+                    "alive": now - row["heartbeat"] < CLUSTER_HEARTBEAT_INTERVAL * 3,
+                }
+            )
+
+    alive = [worker for worker in workers if worker["alive"]]
+    return {
+        "status": "ok" if len(alive) == len(workers) else "degraded",
+        "worker": worker_id,
+        "worker_count": worker_count,
+        "alive_workers": len(alive),
+        "sessions": sum(worker["sessions"] for worker in alive),
+        "sessions_created": sum(worker["sessions_created"] for worker in workers),
+        "workers": workers,
+    }
+
+
+async def _serve(app, host, port):
+    """在工作进程中启动 HTTP 服务，直到收到退出信号"""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port, reuse_port=True).start()
+    # 内部端口只监听本机，用于转发属于本进程的会话请求
+    await web.TCPSite(runner, "127.0.0.1", CLUSTER_INTERNAL_PORT_BASE + worker_id).start()
+    logger.info("工作进程 %d (pid %d) 已启动，端口 %d", worker_id, os.getpid(), port)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    try:
+        await stop_event.wait()
+    finally:
+        await runner.cleanup()
+
+
+def _worker_main(index, count, stats, app_factory, host, port):
+    init_worker(index, count, stats)
+    asyncio.run(_serve(app_factory(), host, port))
+
+
+def run_workers(app_factory, workers, host, port):
+    """
+    启动多进程分片服务，工作进程异常退出时自动重启
+
+    Args:
+        app_factory: 创建 aiohttp Application 的函数，在每个工作进程中调用
+        workers: 工作进程数
+        host: 监听地址
+        port: 共享的 HTTP 端口
+    """
+    ctx = multiprocessing.get_context("fork")
+    stats = ctx.Array("d", workers * len(STAT_FIELDS))
+    processes = {}
+    stopping = False
+
+    def start(index):
+        process = ctx.Process(
+            target=_worker_main,
+            args=(index, workers, stats, app_factory, host, port),
+            name="xiaozhi-worker-{}".format(index),
+        )
+        process.start()
+        processes[index] = process
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for index in range(workers):
+        start(index)
+    logger.info("已启动 %d 个工作进程，共享端口 %d", workers, port)
+
+    while not stopping:
+        time.sleep(1)
+        for index, process in list(processes.items()):
+            if not process.is_alive() and not stopping:
+                logger.warning("工作进程 %d 退出 (code %s)，重新启动", index, process.exitcode)
+                start(index)
+
+    for process in processes.values():
+        if process.is_alive():
+            process.terminate()
+    for process in processes.values():
+        process.join(timeout=10)
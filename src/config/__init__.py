@@ -1,6 +1,141 @@
 import os
 
-OTA_URL = "https://api.tenclass.net/xiaozhi/ota"
+# 小智 OTA 接口地址，压力测试时可指向本地模拟服务 (benchmarks.mock_xiaozhi)
+OTA_URL = os.getenv("OTA_URL", "https://api.tenclass.net/xiaozhi/ota")
 DEFAULT_MAC_ADDR = "00:00:00:00:00:AA"
 # 从环境变量读取端口，如果没有设置则使用默认值51000
 PORT = int(os.getenv("PORT", "51000"))
+
+# 媒体计算执行器: "thread" 在线程池中执行音视频处理, "inline" 直接在事件循环中执行
+MEDIA_EXECUTOR_MODE = os.getenv("MEDIA_EXECUTOR_MODE", "thread")
+# 线程池大小，0 表示使用 CPU 核数
+MEDIA_EXECUTOR_WORKERS = int(os.getenv("MEDIA_EXECUTOR_WORKERS", "0"))
+
+# 事件循环延迟监控（秒）
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.02"))
+LOOP_LAG_WARN_THRESHOLD = float(os.getenv("LOOP_LAG_WARN_THRESHOLD", "0.01"))
+LOOP_LAG_REPORT_INTERVAL = float(os.getenv("LOOP_LAG_REPORT_INTERVAL", "60"))
+
+# 多进程分片: 工作进程数 (共享 PORT，SO_REUSEPORT)，命令行 --workers 优先
+WORKERS = int(os.getenv("WORKERS", "1"))
+# 工作进程内部转发端口 = 基准端口 + 工作进程编号，仅监听 127.0.0.1
+CLUSTER_INTERNAL_PORT_BASE = int(os.getenv("CLUSTER_INTERNAL_PORT_BASE", str(PORT + 1000)))
+# 工作进程心跳间隔（秒），超过 3 个间隔未更新视为不可用
+CLUSTER_HEARTBEAT_INTERVAL = float(os.getenv("CLUSTER_HEARTBEAT_INTERVAL", "1.0"))
+
+# 视频解码模式: "lazy" 无拍照请求时丢弃视频 RTP 包不解码, "full" 解码每一帧
+VIDEO_DECODE_MODE = os.getenv("VIDEO_DECODE_MODE", "lazy")
+# 拍照请求后全速解码的时长（秒）
+VIDEO_ACTIVE_WINDOW = float(os.getenv("VIDEO_ACTIVE_WINDOW", "3.0"))
+# 拍照时等待新关键帧的最长时间（秒），超时使用最近一帧
+VIDEO_FRAME_TIMEOUT = float(os.getenv("VIDEO_FRAME_TIMEOUT", "1.5"))
+# lazy 模式下定期刷新最近一帧的间隔（秒），0 表示只在拍照时解码
+VIDEO_REFRESH_INTERVAL = float(os.getenv("VIDEO_REFRESH_INTERVAL", "0"))
+
+# 拍照快照: 长边缩放上限（像素）、JPEG 质量，以及缓存的快照在多久内（秒）直接复用
+SNAPSHOT_MAX_SIZE = int(os.getenv("SNAPSHOT_MAX_SIZE", "640"))
+SNAPSHOT_JPEG_QUALITY = int(os.getenv("SNAPSHOT_JPEG_QUALITY", "80"))
+SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", "2.0"))
+
+# 输出语音播放: 开始播放前缓冲的帧数 (20ms/帧)，缓冲不足时最多等待的时间（秒）
+PLAYOUT_PREBUFFER_FRAMES = int(os.getenv("PLAYOUT_PREBUFFER_FRAMES", "3"))
+PLAYOUT_PREBUFFER_TIMEOUT = float(os.getenv("PLAYOUT_PREBUFFER_TIMEOUT", "0.1"))
+# 待播放帧数上限，超出时丢弃最旧的帧，0 表示不限制
+PLAYOUT_MAX_FRAMES = int(os.getenv("PLAYOUT_MAX_FRAMES", "250"))
+
+# 语音活动检测: "gate" 只向服务端发送有语音的麦克风帧, "off" 发送所有帧
+VAD_MODE = os.getenv("VAD_MODE", "gate")
+# 能量阈值 (dBFS)，同时要求高于自适应噪声底噪 VAD_SNR_DB
+VAD_ENERGY_THRESHOLD_DB = float(os.getenv("VAD_ENERGY_THRESHOLD_DB", "-45"))
+VAD_SNR_DB = float(os.getenv("VAD_SNR_DB", "9"))
+# 过零率高于该值的清音（s/f 等摩擦音）能量阈值放宽 6dB
+VAD_ZCR_THRESHOLD = float(os.getenv("VAD_ZCR_THRESHOLD", "0.25"))
+# 连续多少帧语音才打开门限，语音结束后继续发送的时长（秒），打开前补发的预录时长（秒）
+VAD_ONSET_FRAMES = int(os.getenv("VAD_ONSET_FRAMES", "2"))
+VAD_HANGOVER = float(os.getenv("VAD_HANGOVER", "1.2"))
+VAD_PRE_ROLL = float(os.getenv("VAD_PRE_ROLL", "0.2"))
+
+# 静态资源缓存: 未带版本号的资源缓存时间（秒），带版本号的资源永久缓存
+ASSET_CACHE_MAX_AGE = int(os.getenv("ASSET_CACHE_MAX_AGE", "300"))
+# 预压缩参数，小于 ASSET_COMPRESS_MIN_SIZE 字节的文件不压缩（brotli 需要安装 brotli 包）
+ASSET_GZIP_LEVEL = int(os.getenv("ASSET_GZIP_LEVEL", "9"))
+ASSET_BROTLI_QUALITY = int(os.getenv("ASSET_BROTLI_QUALITY", "11"))
+ASSET_COMPRESS_MIN_SIZE = int(os.getenv("ASSET_COMPRESS_MIN_SIZE", "1024"))
+
+# 管理接口令牌 (Authorization: Bearer <token>)，为空时管理接口只允许本机访问
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# 热路径分析器: 默认抽样比例与最多保留的事件数，通过 /api/admin/profiler 开启
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", "0.01"))
+PROFILER_MAX_EVENTS = int(os.getenv("PROFILER_MAX_EVENTS", "100000"))
+
+# 会话准入控制（每个工作进程）: 最大会话数，0 表示不限制
+ADMISSION_MAX_SESSIONS = int(os.getenv("ADMISSION_MAX_SESSIONS", "0"))
+# 最近 1 秒事件循环延迟 p90 超过该值（秒）时拒绝新会话，0 表示不检查
+ADMISSION_MAX_LOOP_LAG = float(os.getenv("ADMISSION_MAX_LOOP_LAG", "0.05"))
+# 进程 CPU 使用超过该值（核数，包含媒体线程池）时拒绝新会话，0 表示不检查
+ADMISSION_MAX_CPU = float(os.getenv("ADMISSION_MAX_CPU", "0"))
+# 超出限制时最多排队等待的请求数与最长等待时间（秒），0 表示直接拒绝
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "0"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "3.0"))
+# 拒绝时通过 Retry-After 建议客户端重试的间隔（秒）
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "5"))
+
+# 小智上游连接: OTA 结果按 MAC 缓存的时间（秒），0 表示每次连接都请求 OTA
+UPSTREAM_OTA_TTL = float(os.getenv("UPSTREAM_OTA_TTL", "300"))
+# 为默认 MAC 预先建立的上游连接数，0 表示不预连接；空闲超过 UPSTREAM_POOL_MAX_AGE 秒的预连接关闭后重建
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", "0"))
+UPSTREAM_POOL_MAX_AGE = float(os.getenv("UPSTREAM_POOL_MAX_AGE", "60"))
+
+# MCP 工具: 额外工具的 JSON 配置文件路径，以及不提供给上游的工具名（逗号分隔）
+MCP_TOOLS_FILE = os.getenv("MCP_TOOLS_FILE", "")
+MCP_DISABLED_TOOLS = [name.strip() for name in os.getenv("MCP_DISABLED_TOOLS", "").split(",") if name.strip()]
+
+# 会话恢复: 媒体连接失败后保留会话（包括上游连接）等待客户端重新协商的时间（秒），0 表示立即关闭
+RESUME_GRACE_PERIOD = float(os.getenv("RESUME_GRACE_PERIOD", "30"))
+
+# 空闲会话回收: 收发都没有活动超过 SESSION_IDLE_TIMEOUT 秒、或存活超过 SESSION_MAX_LIFETIME 秒的会话被关闭，0 表示不限制
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "600"))
+SESSION_MAX_LIFETIME = float(os.getenv("SESSION_MAX_LIFETIME", "0"))
+REAPER_INTERVAL = float(os.getenv("REAPER_INTERVAL", "10"))
+
+# 日志: 输出格式 "text" / "json"，后台写出队列长度（队列满时丢弃）
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# 每个会话每种消息类型每秒最多记录的日志数与突发上限，0 表示不限速
+LOG_SESSION_RATE = float(os.getenv("LOG_SESSION_RATE", "20"))
+LOG_SESSION_BURST = int(os.getenv("LOG_SESSION_BURST", "50"))
+# 高频消息类型抽样，格式 "类型:N,..."，每 N 条只记录 1 条
+LOG_SAMPLE = {
+    msg_type.strip(): int(every)
+    for msg_type, _, every in (item.partition(":") for item in os.getenv("LOG_SAMPLE", "tts:4").split(","))
+    if msg_type.strip() and every.strip()
+}
+
+# DataChannel 发送队列: bufferedAmount 高 / 低水位（字节），队列最多保留的消息数，合并发送时单条消息上限（字节）
+DATACHANNEL_HIGH_WATERMARK = int(os.getenv("DATACHANNEL_HIGH_WATERMARK", str(64 * 1024)))
+DATACHANNEL_LOW_WATERMARK = int(os.getenv("DATACHANNEL_LOW_WATERMARK", str(16 * 1024)))
+DATACHANNEL_MAX_QUEUE = int(os.getenv("DATACHANNEL_MAX_QUEUE", "256"))
+DATACHANNEL_BATCH_MAX_BYTES = int(os.getenv("DATACHANNEL_BATCH_MAX_BYTES", str(16 * 1024)))
+
+# JSON 编解码: "auto"（安装了 orjson 时使用 orjson）、"orjson" 或 "json"
+JSON_CODEC = os.getenv("JSON_CODEC", "auto")
+
+# ICE: 服务端候选收集方式，"stun" 通过 STUN 获取公网地址，"host" 只使用本机地址（不访问 STUN，应答更快）
+ICE_GATHER_MODE = os.getenv("ICE_GATHER_MODE", "stun")
+# 服务端已知的公网 IP（1:1 NAT，如云主机弹性 IP），设置后不访问 STUN，在应答中按本机端口公布该地址
+ICE_PUBLIC_IP = os.getenv("ICE_PUBLIC_IP", "")
+# STUN 服务器（逗号分隔），为空时使用内置列表；服务端只使用第一个（aiortc 只支持一个 STUN 服务器）
+ICE_STUN_URLS = [url.strip() for url in os.getenv("ICE_STUN_URLS", "").split(",") if url.strip()]
+# 前端 ICE 配置文件（JSON，格式同 RTCConfiguration），其中的键覆盖默认配置
+ICE_CONFIG_FILE = os.getenv("ICE_CONFIG_FILE", "")
+# TURN 服务器（逗号分隔），只提供给前端；配置 TURN_SECRET 时按 TURN REST API（coturn use-auth-secret）
+# 生成有效期为 TURN_TTL 秒的临时凭据，否则使用固定的 TURN_USERNAME / TURN_CREDENTIAL
+TURN_URLS = [url.strip() for url in os.getenv("TURN_URLS", "").split(",") if url.strip()]
+TURN_SECRET = os.getenv("TURN_SECRET", "")
+TURN_USERNAME = os.getenv("TURN_USERNAME", "xiaozhi")
+TURN_CREDENTIAL = os.getenv("TURN_CREDENTIAL", "")
+TURN_TTL = int(os.getenv("TURN_TTL", "86400"))
+
+# Trickle ICE: GET /api/candidates 长轮询等待服务端候选收集完成的最长时间（秒）
+TRICKLE_POLL_TIMEOUT = float(os.getenv("TRICKLE_POLL_TIMEOUT", "10"))
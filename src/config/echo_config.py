@@ -1,16 +1,35 @@
 # 回声消除配置文件
 # Echo Cancellation Configuration
 
+import os
+
 
 class EchoConfig:
     """回声消除配置类"""
 
+    # 回声消除引擎: "lms" 为时域 LMS，"fdaf" 为分块频域自适应滤波（收敛更快，但每帧 CPU 约为 lms 的两倍）
+    ENGINE = os.getenv("AEC_ENGINE", "lms")
+
+    # 频域分块自适应滤波器参数
+    FDAF_BLOCK_SIZE = 960  # 分块大小，与 20ms 帧长一致
+    FDAF_PARTITIONS = 8  # 分块数，可覆盖的回声尾长 = 分块数 * 20ms
+    FDAF_STEP_SIZE = 0.3  # 归一化步长
+    FDAF_POWER_SMOOTHING = 0.9  # 远端功率谱平滑系数
+    FDAF_CONSTRAINT = "rotating"  # 梯度约束: "full" 每帧约束全部分块, "rotating" 每帧轮流约束一个, "none" 不约束
+    FDAF_DIVERGENCE_RATIO = 4.0  # 输出能量超过输入能量的倍数时视为发散
+
+    # 多会话批量处理 - 同一周期内所有会话的帧合并为一次向量化运算 (仅 fdaf 引擎)
+    BATCH_ENABLED = True
+    BATCH_MAX_WAIT = 0.005  # 首帧入队后最长等待时间 (秒)，即批处理引入的最大额外延迟
+    BATCH_CHUNK_SIZE = 16  # 单次向量化运算的会话数上限，过大时中间数组超出 CPU 缓存
+
     # 自适应滤波器参数 - 更保守的设置以避免过度抑制
     ADAPTIVE_FILTER_LENGTH = 1024  # 恢复到较小的滤波器长度
     LEARNING_RATE = 0.02  # 降低学习率以避免过度调整
 
     # 缓冲区参数 - 适中的缓冲区大小
-    ECHO_BUFFER_SIZE = 100  # 回声缓冲区大小 (约2秒)
+    REFERENCE_WINDOW_FRAMES = 10  # 参考信号窗口 (帧数，约0.2秒)
+    FRAME_SIZE = 960  # 每帧样本数 (48kHz 20ms)
     INPUT_BUFFER_SIZE = 50  # 输入缓冲区大小
 
     # 预热参数 - 更温和的预热处理
@@ -51,10 +70,26 @@ class EchoConfig:
         """获取自适应滤波器参数"""
         return {"filter_length": cls.ADAPTIVE_FILTER_LENGTH, "learning_rate": cls.LEARNING_RATE}
 
+    @classmethod
+    def get_fdaf_params(cls):
+        """获取频域分块自适应滤波器参数"""
+        return {
+            "block_size": cls.FDAF_BLOCK_SIZE,
+            "partitions": cls.FDAF_PARTITIONS,
+            "step_size": cls.FDAF_STEP_SIZE,
+            "power_smoothing": cls.FDAF_POWER_SMOOTHING,
+            "constraint": cls.FDAF_CONSTRAINT,
+            "divergence_ratio": cls.FDAF_DIVERGENCE_RATIO,
+            "batch_chunk_size": cls.BATCH_CHUNK_SIZE,
+        }
+
     @classmethod
     def get_buffer_params(cls):
         """获取缓冲区参数"""
-        return {"echo_buffer_size": cls.ECHO_BUFFER_SIZE, "input_buffer_size": cls.INPUT_BUFFER_SIZE}
+        return {
+            "reference_window_samples": cls.REFERENCE_WINDOW_FRAMES * cls.FRAME_SIZE,
+            "input_buffer_size": cls.INPUT_BUFFER_SIZE,
+        }
 
     @classmethod
     def get_warmup_params(cls):
@@ -1,40 +1,211 @@
-import os
-from typing import Any, Dict, List
+"""
+ICE 配置
+ICE Configuration
+
+前端（/api/ice）与服务端 RTCPeerConnection 使用的 ICE 配置在启动时构建一次，之后只读：
+
+- 前端配置: 默认 STUN 列表（ICE_STUN_URLS 可覆盖）、TURN 服务器，ICE_CONFIG_FILE 中的键覆盖默认值；
+- 服务端: aiortc 只使用一个 STUN 服务器，每个新连接都要等 STUN 往返后才能返回应答。ICE_GATHER_MODE=host
+  或设置 ICE_PUBLIC_IP 时不访问 STUN，只收集本机地址；ICE_PUBLIC_IP 会在应答 SDP 中按本机端口公布为 srflx 候选；
+- TURN 临时凭据（TURN REST API）缓存到剩余有效期不足一半时才重新生成，响应体随凭据一起缓存。
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
 
 from aiortc import RTCIceServer
 
+from src.config import (
+    ICE_CONFIG_FILE,
+    ICE_GATHER_MODE,
+    ICE_PUBLIC_IP,
+    ICE_STUN_URLS,
+    TURN_CREDENTIAL,
+    TURN_SECRET,
+    TURN_TTL,
+    TURN_URLS,
+    TURN_USERNAME,
+)
+from src.utils import json_codec
+
+logger = logging.getLogger(__name__)
+
+# 默认STUN服务器
+DEFAULT_STUN_URLS = [
+    "stun:stun.miwifi.com:3478",
+    "stun:stun.l.google.com:19302",
+    "stun:stun1.l.google.com:19302",
+    "stun:stun.stunprotocol.org:3478",
+]
+
+
+def turn_rest_credentials(secret: str, user: str, ttl: int, now: float) -> Dict[str, Any]:
+    """
+    生成 TURN REST API 临时凭据
+
+    Args:
+        secret: 与 TURN 服务器共享的密钥（coturn static-auth-secret）
+        user: 用户名中的用户部分
+        ttl: 有效期（秒）
+        now: 当前时间戳
+
+    Returns:
+        dict: username / credential / expires_at
+    """
+    expires_at = int(now) + ttl
+    username = "{}:{}".format(expires_at, user)
+    digest = hmac.new(secret.encode(), username.encode(), hashlib.sha1).digest()
+    return {"username": username, "credential": base64.b64encode(digest).decode(), "expires_at": expires_at}
+
 
 class ICEConfig:
     """ICE服务器配置管理类"""
 
-    def __init__(self):
-        # 默认STUN服务器
-        self.default_stun_urls = [
-            "stun:stun.miwifi.com:3478",
-            "stun:stun.l.google.com:19302",
-            "stun:stun1.l.google.com:19302",
-            "stun:stun.stunprotocol.org:3478",
-        ]
+    def __init__(
+        self,
+        stun_urls: Optional[List[str]] = None,
+        config_file: str = ICE_CONFIG_FILE,
+        gather_mode: str = ICE_GATHER_MODE,
+        public_ip: str = ICE_PUBLIC_IP,
+        turn_urls: Optional[List[str]] = None,
+        turn_secret: str = TURN_SECRET,
+        turn_username: str = TURN_USERNAME,
+        turn_credential: str = TURN_CREDENTIAL,
+        turn_ttl: int = TURN_TTL,
+    ):
+        """
+        构建前端与服务端的 ICE 配置
+
+        Args:
+            stun_urls: STUN 服务器列表，为空时使用 ICE_STUN_URLS 或内置列表
+            config_file: 前端 ICE 配置文件，其中的键覆盖默认配置
+            gather_mode: 服务端候选收集方式，"stun" 或 "host"
+            public_ip: 服务端公网 IP，设置后不访问 STUN 并在应答中公布该地址
+            turn_urls: 提供给前端的 TURN 服务器列表
+            turn_secret: TURN REST API 共享密钥，为空时使用固定凭据
+            turn_username: 固定凭据的用户名，或临时凭据用户名中的用户部分
+            turn_credential: 固定凭据的密码
+            turn_ttl: 临时凭据有效期（秒）
+        """
+        self.default_stun_urls = stun_urls or ICE_STUN_URLS or DEFAULT_STUN_URLS
+        self.turn_urls = turn_urls if turn_urls is not None else TURN_URLS
+        self.turn_secret = turn_secret
+        self.turn_username = turn_username
+        self.turn_credential = turn_credential
+        self.turn_ttl = turn_ttl
+        self.public_ip = public_ip
+        self.gather_mode = "host" if public_ip else gather_mode
+
+        # 前端配置中不含 TURN 凭据的部分
+        self.base_config = {
+            "iceServers": [{"urls": url} for url in self.default_stun_urls],
+            "iceCandidatePoolSize": 10,
+            "iceTransportPolicy": "all",
+        }
+        if config_file:
+            with open(config_file, encoding="utf-8") as f:
+                self.base_config.update(json.load(f))
+            logger.info("已加载 ICE 配置文件: %s", config_file)
 
-    def get_ice_config(self) -> Dict[str, Any]:
-        """获取前端ICE配置"""
-        ice_servers = []
+        # 服务端只收集本机地址时不配置 STUN，aiortc 在 iceServers 为 None 时会使用自己的默认 STUN 服务器
+        if self.gather_mode == "host":
+            self.server_ice_servers = []
+        else:
+            self.server_ice_servers = [RTCIceServer(urls=self.default_stun_urls[0])]
 
-        # 添加默认STUN服务器
-        for url in self.default_stun_urls:
-            ice_servers.append({"urls": url})
+        # 缓存的前端配置与 /api/ice 响应体，TURN 临时凭据过半有效期后重新生成
+        self.turn_auth = None
+        self.client_config = None
+        self.response_body = None
+        self.refresh_at = 0.0
+        self.credentials_issued = 0
 
-        return {"iceServers": ice_servers, "iceCandidatePoolSize": 10, "iceTransportPolicy": "all"}
+    def _refresh(self, now: float):
+        config = dict(self.base_config, iceServers=list(self.base_config["iceServers"]))
+        self.refresh_at = float("inf")
+        if self.turn_urls:
+            if self.turn_secret:
+                self.turn_auth = turn_rest_credentials(self.turn_secret, self.turn_username, self.turn_ttl, now)
+                self.refresh_at = now + self.turn_ttl / 2
+                self.credentials_issued += 1
+            else:
+                self.turn_auth = {"username": self.turn_username, "credential": self.turn_credential}
+            config["iceServers"].append(
+                {
+                    "urls": self.turn_urls,
+                    "username": self.turn_auth["username"],
+                    "credential": self.turn_auth["credential"],
+                }
+            )
+        self.client_config = config
+        self.response_body = json_codec.dumps_bytes(config)
+
+    def get_ice_config(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """获取前端ICE配置（共享对象，调用方不能修改）"""
+        now = time.time() if now is None else now
+        if self.client_config is None or now >= self.refresh_at:
+            self._refresh(now)
+        return self.client_config
+
+    def get_response_body(self) -> bytes:
+        """/api/ice 的 JSON 响应体"""
+        self.get_ice_config()
+        return self.response_body
 
     def get_server_ice_servers(self) -> List[RTCIceServer]:
-        """获取服务器端ICE服务器对象"""
-        servers = []
+        """获取服务器端ICE服务器对象（共享列表，调用方不能修改）"""
+        return self.server_ice_servers
+
+    def advertise_public_ip(self, sdp: str) -> str:
+        """
+        在应答 SDP 中为每个 IPv4 host 候选追加一个公网地址的 srflx 候选（端口相同）
+
+        Args:
+            sdp: 服务端的应答 SDP
 
-        # 添加默认STUN服务器
-        for url in self.default_stun_urls:
-            servers.append(RTCIceServer(urls=url))
+        Returns:
+            str: 追加候选后的 SDP，未设置 ICE_PUBLIC_IP 时原样返回
+        """
+        if not self.public_ip:
+            return sdp
+        lines = []
+        for line in sdp.split("\r\n"):
+            lines.append(line)
+            if not line.startswith("a=candidate:"):
+                continue
+            foundation, component, transport, _, host, port, _, kind = line[len("a=candidate:") :].split()[:8]
+            if kind != "host" or ":" in host or host == self.public_ip:
+                continue
+            # RFC 8445 优先级: srflx 类型偏好 100
+            priority = (100 << 24) | (65535 << 8) | (256 - int(component))
+            lines.append(
+                "a=candidate:{} {} {} {} {} {} typ srflx raddr {} rport {}".format(
+                    hashlib.md5((foundation + self.public_ip).encode()).hexdigest(),
+                    component,
+                    transport,
+                    priority,
+                    self.public_ip,
+                    port,
+                    host,
+                    port,
+                )
+            )
+        return "\r\n".join(lines)
 
-        return servers
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            "gather_mode": self.gather_mode,
+            "public_ip": self.public_ip or None,
+            "stun": None if self.gather_mode == "host" else self.default_stun_urls[0],
+            "turn": bool(self.turn_urls),
+            "turn_expires_at": (self.turn_auth or {}).get("expires_at"),
+            "turn_credentials_issued": self.credentials_issued,
+        }
 
 
 # 全局实例
@@ -0,0 +1,210 @@
+"""
+DataChannel 发送队列
+Backpressure-Aware DataChannel Sender
+
+每个会话一个发送队列：通道已打开且 bufferedAmount 低于高水位时直接发送；否则消息进入队列，
+在通道打开或 bufferedAmount 回落到低水位（bufferedamountlow 事件）时再发送，避免慢速客户端在服务端
+堆积无上限的 SCTP 缓冲。排队期间只保留最新的状态类消息（不带文本的 tts 状态、音量设置），
+队列满时丢弃最旧的消息；客户端声明支持时，积压的多条小消息合并为一个 JSON 数组发送。
+"""
+
+import logging
+import weakref
+from collections import Counter, deque
+
+from src.config import (
+    DATACHANNEL_BATCH_MAX_BYTES,
+    DATACHANNEL_HIGH_WATERMARK,
+    DATACHANNEL_LOW_WATERMARK,
+    DATACHANNEL_MAX_QUEUE,
+)
+from src.utils import json_codec
+from src.utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# 存活的发送队列，以及所有发送队列累计的消息计数
+active_senders = weakref.WeakSet()
+message_totals = Counter()
+
+
+def coalesce_key(message):
+    """
+    排队时可以被后续同类消息替换的消息
+
+    Args:
+        message: dict 消息，或已经编码好的字符串（不参与合并）
+
+    Returns:
+        tuple: 同类消息的键，不可替换时返回 None
+    """
+    if not isinstance(message, dict):
+        return None
+    if message.get("type") == "tts" and "text" not in message:
+        # tts start / stop 等状态更新只有最新的有意义，带文本的 sentence_start 需要逐条显示
+        return ("tts",)
+    if message.get("type") == "tool" and message.get("text") == "set_volume":
+        return ("tool", "set_volume")
+    return None
+
+
+def encode(message):
+    return message if isinstance(message, str) else json_codec.dumps(message)
+
+
+class DataChannelSender:
+    """
+    单个会话的 DataChannel 发送队列
+    """
+
+    def __init__(
+        self,
+        channel,
+        high_watermark=DATACHANNEL_HIGH_WATERMARK,
+        low_watermark=DATACHANNEL_LOW_WATERMARK,
+        max_queue=DATACHANNEL_MAX_QUEUE,
+        batch=False,
+        batch_max_bytes=DATACHANNEL_BATCH_MAX_BYTES,
+    ):
+        """
+        初始化发送队列
+
+        Args:
+            channel: RTCDataChannel
+            high_watermark: bufferedAmount 超过该值（字节）时消息进入队列
+            low_watermark: bufferedAmount 回落到该值（字节）时继续发送
+            max_queue: 队列中最多保留的消息数，超出时丢弃最旧的消息
+            batch: 是否把积压的多条消息合并为一个 JSON 数组发送（客户端需要支持）
+            batch_max_bytes: 合并后单条消息的最大字节数
+        """
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.max_queue = max_queue
+        self.batch = batch
+        self.batch_max_bytes = batch_max_bytes
+        # (coalesce_key, message)
+        self.queue = deque()
+        self.channel = None
+
+        # 统计信息
+        self.sent = 0
+        self.batches = 0
+        self.coalesced = 0
+        self.dropped = Counter()
+        self.max_depth = 0
+
+        self.set_channel(channel)
+        active_senders.add(self)
+
+    def set_channel(self, channel):
+        """切换到新的 DataChannel（会话恢复），队列中尚未发送的消息在新通道打开后发送"""
+        self.channel = channel
+        channel.bufferedAmountLowThreshold = self.low_watermark
+        channel.on("open", self.flush)
+        channel.on("bufferedamountlow", self.flush)
+
+    @property
+    def writable(self):
+        return self.channel.readyState == "open" and self.channel.bufferedAmount <= self.high_watermark
+
+    def send(self, message):
+        """
+        发送或排队一条消息
+
+        Args:
+            message: dict 消息（发送时才编码），或已经编码好的字符串
+
+        Returns:
+            bool: 是否已发送或进入队列，通道已关闭时返回 False
+        """
+        if not self.queue and self.writable:
+            self._send(encode(message))
+            return True
+        if self.channel.readyState in ("closing", "closed"):
+            self._drop("closed")
+            return False
+
+        key = coalesce_key(message)
+        if key is not None:
+            for index, (queued_key, _) in enumerate(self.queue):
+                if queued_key == key:
+                    del self.queue[index]
+                    self.coalesced += 1
+                    message_totals["coalesced"] += 1
+                    break
+        if len(self.queue) >= self.max_queue:
+            self.queue.popleft()
+            self._drop("overflow")
+        self.queue.append((key, message))
+        self.max_depth = max(self.max_depth, len(self.queue))
+        return True
+
+    def flush(self):
+        """发送队列中的消息，直到队列为空或 bufferedAmount 再次超过高水位"""
+        while self.queue and self.writable:
+            if not self.batch or len(self.queue) == 1:
+                self._send(encode(self.queue.popleft()[1]))
+                continue
+
+            parts = []
+            size = 2
+            while self.queue:
+                data = encode(self.queue[0][1])
+                if parts and size + len(data) + 1 > self.batch_max_bytes:
+                    break
+                self.queue.popleft()
+                parts.append(data)
+                size += len(data) + 1
+            self._send("[" + ",".join(parts) + "]", count=len(parts))
+            self.batches += 1
+
+    def _send(self, data, count=1):
+        self.channel.send(data)
+        self.sent += count
+        message_totals["sent"] += count
+
+    def _drop(self, reason):
+        self.dropped[reason] += 1
+        message_totals["dropped_" + reason] += 1
+
+    def get_statistics(self):
+        return {
+            "depth": len(self.queue),
+            "max_depth": self.max_depth,
+            "buffered_amount": self.channel.bufferedAmount,
+            "sent": self.sent,
+            "batches": self.batches,
+            "coalesced": self.coalesced,
+            "dropped": dict(self.dropped),
+        }
+
+
+def collect_datachannel_metrics():
+    """导出所有会话发送队列的深度与累计计数"""
+    senders = list(active_senders)
+    return [
+        (
+            "xiaozhi_datachannel_queue_depth",
+            "gauge",
+            "Outbound DataChannel messages waiting for the SCTP buffer to drain, summed over sessions",
+            [("xiaozhi_datachannel_queue_depth", {}, sum(len(sender.queue) for sender in senders))],
+        ),
+        (
+            "xiaozhi_datachannel_messages",
+            "counter",
+            "Outbound DataChannel messages by result",
+            [
+                ("xiaozhi_datachannel_messages_total", {"result": "sent"}, message_totals["sent"]),
+                ("xiaozhi_datachannel_messages_total", {"result": "coalesced"}, message_totals["coalesced"]),
+                (
+                    "xiaozhi_datachannel_messages_total",
+                    {"result": "dropped_overflow"},
+                    message_totals["dropped_overflow"],
+                ),
+                ("xiaozhi_datachannel_messages_total", {"result": "dropped_closed"}, message_totals["dropped_closed"]),
+            ],
+        ),
+    ]
+
+
+metrics_registry.register_collector(collect_datachannel_metrics)
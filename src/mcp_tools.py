@@ -0,0 +1,241 @@
+"""
+MCP 工具注册表
+MCP Tool Registry
+
+工具描述（名称、说明、参数 schema）在进程内只构建一次，之后只读；工具函数是 handler(session, arguments)
+形式的普通函数，会话建立时用 BoundTool 绑定到 XiaoZhiServer，不再为每个会话创建闭包，
+也不再修改 SDK 模块级别的共享工具字典。
+
+额外工具通过 MCP_TOOLS_FILE 指定的 JSON 文件配置，格式为工具列表：
+
+    [
+        {
+            "name": "set_light",
+            "description": "Turn the light on or off.",
+            "inputSchema": {"type": "object", "properties": {"on": {"type": "boolean"}}},
+            "handler": "client"
+        },
+        {
+            "name": "get_weather",
+            "description": "...",
+            "inputSchema": {"type": "object", "properties": {}},
+            "handler": "mypackage.tools:get_weather"
+        }
+    ]
+
+- "client"（默认）: 把调用转发给浏览器端，DataChannel 消息为 {"type": "tool", "text": 工具名, "value": 参数}
+- "模块:函数": 导入该函数，以 (session, arguments) 调用，返回 (结果, 是否出错)；协程函数按异步工具处理
+
+与内置工具同名的配置会覆盖内置工具；MCP_DISABLED_TOOLS 中列出的工具不提供给上游。
+"""
+
+import asyncio
+import copy
+import importlib
+import json
+import logging
+from types import MappingProxyType
+
+from xiaozhi_sdk.utils import mcp_tool as sdk_tools
+from xiaozhi_sdk.utils.tool_func import async_search_custom_music
+
+from src.config import MCP_DISABLED_TOOLS, MCP_TOOLS_FILE
+
+logger = logging.getLogger(__name__)
+
+
+def client_tool(name, value_key=None):
+    """
+    创建转发给浏览器端执行的工具函数
+
+    Args:
+        name: 工具名，作为 DataChannel 消息的 text
+        value_key: 作为 value 发送的参数名，None 表示发送全部参数（没有参数时不发送 value）
+
+    Returns:
+        function: handler(session, arguments)
+    """
+
+    def handler(session, data):
+        message = {"type": "tool", "text": name}
+        if value_key is not None:
+            message["value"] = data[value_key]
+        elif data:
+            message["value"] = data
+        session.safe_send(message)
+        return "", False
+
+    return handler
+
+
+def get_device_status(session, data):
+    return (
+        json.dumps(
+            {
+                "audio_speaker": {"volume": 100},
+                # 'screen': {'brightness': 75, 'theme': 'light'},
+                # 'network': {'type': 'wifi', 'ssid': 'wifi名称', 'signal': 'strong'}
+            }
+        ),
+        False,
+    )
+
+
+async def take_photo(session, data):
+    # 同一轮对话内重复拍照直接复用已编码的快照
+    img_byte = session.snapshot_cache.fresh()
+    if img_byte is None:
+        if hasattr(session.pc, "video_consumer"):
+            # 按需解码模式下先唤醒视频接收，等待一帧新画面
+            frame = await session.pc.video_consumer.request_frame()
+        else:
+            frame = getattr(session.server, "video_frame", None)
+        img_byte = await session.snapshot_cache.get(frame)
+    if img_byte is None:
+        return {"message": "摄像头未开启"}, True
+    return await session.server.async_analyze_image(img_byte, data.get("question", "请描述这张图片"))
+
+
+async def search_custom_music(session, data):
+    return await async_search_custom_music(data)
+
+
+async def play_custom_music(session, data):
+    # SDK 在 tools/call 中直接处理播放，不会调用该函数
+    return {"message": "不支持"}, True
+
+
+class BoundTool:
+    """
+    绑定到会话的工具函数
+
+    SDK 处理 tools/list 时会深拷贝整个工具表，绑定对象在深拷贝时返回自身，不复制会话。
+    """
+
+    __slots__ = ("handler", "session")
+
+    def __init__(self, handler, session):
+        self.handler = handler
+        self.session = session
+
+    def __call__(self, data):
+        return self.handler(self.session, data)
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def tool_not_ready(data):
+    return {"message": "会话未就绪"}, True
+
+
+class ToolRegistry:
+    """
+    进程内共享的 MCP 工具表
+
+    tools 保存 (描述, handler, 是否异步)，描述为只读映射；bind() 为每个会话生成 set_mcp_tool 所需的工具列表。
+    """
+
+    def __init__(self):
+        # name -> (descriptor, handler, is_async)，按注册顺序提供给上游
+        self.tools = {}
+
+    def register(self, name, description, input_schema, handler, is_async=False):
+        """
+        注册工具，同名工具会被替换
+
+        Args:
+            name: 工具名
+            description: 工具说明
+            input_schema: 参数 JSON Schema
+            handler: handler(session, arguments)，返回 (结果, 是否出错)
+            is_async: handler 是否为协程函数
+        """
+        descriptor = MappingProxyType(
+            {"name": name, "description": description, "inputSchema": copy.deepcopy(input_schema)}
+        )
+        self.tools[name] = (descriptor, handler, is_async)
+
+    def register_sdk_tool(self, tool, handler, is_async=False):
+        """使用 SDK 中的工具描述注册工具"""
+        self.register(tool["name"], tool["description"], tool["inputSchema"], handler, is_async)
+
+    def unregister(self, name):
+        self.tools.pop(name, None)
+
+    def load_file(self, path):
+        """
+        从 JSON 文件加载额外工具（格式见模块说明）
+
+        Args:
+            path: 配置文件路径
+        """
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+
+        for entry in entries:
+            name = entry["name"]
+            spec = entry.get("handler", "client")
+            if spec == "client":
+                handler = client_tool(name)
+            else:
+                module_name, _, attr = spec.partition(":")
+                handler = getattr(importlib.import_module(module_name), attr)
+            self.register(
+                name,
+                entry.get("description", ""),
+                entry.get("inputSchema", {"type": "object", "properties": {}}),
+                handler,
+                asyncio.iscoroutinefunction(handler),
+            )
+            logger.info("已加载 MCP 工具: %s (%s)", name, spec)
+
+    def bind(self, session):
+        """
+        生成会话使用的工具列表
+
+        Args:
+            session: XiaoZhiServer，为 None 时所有工具返回“会话未就绪”（用于尚未分配的预连接）
+
+        Returns:
+            list: 传给 XiaoZhiWebsocket.set_mcp_tool 的工具列表
+        """
+        if session is None:
+            return [
+                dict(descriptor, tool_func=tool_not_ready, is_async=False) for descriptor, _, _ in self.tools.values()
+            ]
+        return [
+            dict(descriptor, tool_func=BoundTool(handler, session), is_async=is_async)
+            for descriptor, handler, is_async in self.tools.values()
+        ]
+
+
+def build_registry(tools_file=MCP_TOOLS_FILE, disabled=MCP_DISABLED_TOOLS):
+    """
+    构建内置工具与配置的额外工具
+
+    Args:
+        tools_file: 额外工具的 JSON 配置文件，为空时不加载
+        disabled: 不提供给上游的工具名列表
+
+    Returns:
+        ToolRegistry: 工具表
+    """
+    registry = ToolRegistry()
+    registry.register_sdk_tool(sdk_tools.take_photo, take_photo, is_async=True)
+    registry.register_sdk_tool(sdk_tools.get_device_status, get_device_status)
+    registry.register_sdk_tool(sdk_tools.set_volume, client_tool("set_volume", "volume"))
+    registry.register_sdk_tool(sdk_tools.open_tab, client_tool("open_tab", "url"))
+    registry.register_sdk_tool(sdk_tools.stop_music, client_tool("stop_music"))
+    registry.register_sdk_tool(sdk_tools.search_custom_music, search_custom_music, is_async=True)
+    registry.register_sdk_tool(sdk_tools.play_custom_music, play_custom_music, is_async=True)
+
+    if tools_file:
+        registry.load_file(tools_file)
+    for name in disabled:
+        registry.unregister(name)
+    return registry
+
+
+# 全局实例
+tool_registry = build_registry()
@@ -0,0 +1,174 @@
+"""
+空闲会话回收
+Idle Session Reaper
+
+连接状态一直没有进入 failed / closed 的会话会一直占用上游 WebSocket、回声消除状态与视频任务。
+回收任务定期检查每个会话最近的收发活动（麦克风语音、DataChannel 消息、TTS 输出、上游消息）
+与存活时间，超过限制时关闭会话，并记录回收原因与会话占用的内存估计。
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+from src.config import REAPER_INTERVAL, SESSION_IDLE_TIMEOUT, SESSION_MAX_LIFETIME
+
+logger = logging.getLogger(__name__)
+
+
+def describe_session(xiaozhi, now):
+    """
+    会话的活动与内存概况
+
+    Args:
+        xiaozhi: XiaoZhiServer
+        now: 当前时间（perf_counter）
+
+    Returns:
+        dict: 会话信息
+    """
+    memory = xiaozhi.memory_usage()
+    return {
+        "session_id": getattr(xiaozhi.pc, "session_id", None),
+        "mac_address": getattr(xiaozhi.pc, "mac_address", None),
+        "client_ip": getattr(xiaozhi.pc, "client_ip", None),
+        "connection_state": xiaozhi.pc.connectionState,
+        "lifetime": now - xiaozhi.created_at,
+        "inbound_idle": now - xiaozhi.last_inbound,
+        "outbound_idle": now - xiaozhi.last_outbound,
+        "datachannel": xiaozhi.sender.get_statistics(),
+        "memory_bytes": sum(memory.values()),
+        "memory": memory,
+    }
+
+
+class SessionReaper:
+    """
+    空闲会话回收
+
+    会话空闲时间取收、发两个方向中最近一次活动；回收原因为 "idle" 或 "lifetime"。
+    """
+
+    REASONS = ("idle", "lifetime")
+    # 保留的最近回收记录数
+    HISTORY_SIZE = 100
+
+    def __init__(
+        self,
+        get_sessions,
+        close_session,
+        idle_timeout=SESSION_IDLE_TIMEOUT,
+        max_lifetime=SESSION_MAX_LIFETIME,
+        interval=REAPER_INTERVAL,
+    ):
+        """
+        初始化回收任务
+
+        Args:
+            get_sessions: 返回当前所有 XiaoZhiServer 的函数
+            close_session: 协程函数 close_session(xiaozhi, reason)，关闭会话
+            idle_timeout: 空闲时间上限（秒），0 表示不限制
+            max_lifetime: 会话存活时间上限（秒），0 表示不限制
+            interval: 检查间隔（秒）
+        """
+        self.get_sessions = get_sessions
+        self.close_session = close_session
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.interval = interval
+        self.task = None
+
+        # 统计信息
+        self.reaped = dict.fromkeys(self.REASONS, 0)
+        self.history = deque(maxlen=self.HISTORY_SIZE)
+        # 最近一次检查时所有会话的内存估计（字节）
+        self.memory_bytes = 0
+
+    def start(self):
+        """在当前事件循环上启动回收任务"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error("回收空闲会话失败: %s", e)
+
+    def check(self, xiaozhi, now):
+        """
+        判断会话是否需要回收
+
+        Returns:
+            str: 回收原因，不需要回收时返回 None
+        """
+        if self.max_lifetime and now - xiaozhi.created_at > self.max_lifetime:
+            return "lifetime"
+        if self.idle_timeout and now - max(xiaozhi.last_inbound, xiaozhi.last_outbound) > self.idle_timeout:
+            return "idle"
+        return None
+
+    async def sweep(self):
+        """检查一遍所有会话，关闭超过限制的会话"""
+        now = time.perf_counter()
+        memory_bytes = 0
+        expired = []
+        for xiaozhi in list(self.get_sessions()):
+            info = describe_session(xiaozhi, now)
+            memory_bytes += info["memory_bytes"]
+            reason = self.check(xiaozhi, now)
+            if reason is not None:
+                expired.append((xiaozhi, reason, info))
+        self.memory_bytes = memory_bytes
+
+        for xiaozhi, reason, info in expired:
+            logger.info(
+                "回收会话 [%s %s] 原因: %s 存活: %.0fs 空闲: %.0fs 内存: %d 字节",
+                info["mac_address"],
+                info["client_ip"],
+                reason,
+                info["lifetime"],
+                min(info["inbound_idle"], info["outbound_idle"]),
+                info["memory_bytes"],
+            )
+            self.reaped[reason] += 1
+            self.history.append(dict(info, reason=reason, reaped_at=time.time()))
+            await self.close_session(xiaozhi, reason)
+
+    def get_statistics(self):
+        return {
+            "idle_timeout": self.idle_timeout,
+            "max_lifetime": self.max_lifetime,
+            "memory_bytes": self.memory_bytes,
+            "reaped": dict(self.reaped),
+            "recent": list(self.history),
+        }
+
+    def collect_metrics(self):
+        """导出 Prometheus 指标"""
+        return [
+            (
+                "xiaozhi_sessions_reaped",
+                "counter",
+                "Sessions closed by the reaper by reason",
+                [("xiaozhi_sessions_reaped_total", {"reason": key}, value) for key, value in self.reaped.items()],
+            ),
+            (
+                "xiaozhi_session_memory_bytes",
+                "gauge",
+                "Approximate memory held by all sessions at the last reaper sweep",
+                [("xiaozhi_session_memory_bytes", {}, self.memory_bytes)],
+            ),
+        ]
@@ -0,0 +1,160 @@
+"""
+会话恢复
+Session Resume
+
+aiortc 不支持在已有的 RTCPeerConnection 上重启 ICE，网络切换后只能重新协商。为避免每次网络抖动都
+重新建立上游连接，媒体连接失败后会话（XiaoZhiServer 及其上游 WebSocket）保留一段宽限期：客户端用新的
+RTCPeerConnection 重新发送 offer，并带上原来的 sessionId 与 resumeToken，服务端把新连接接到原有会话上。
+宽限期内没有恢复的会话才真正关闭。
+"""
+
+import asyncio
+import hmac
+import logging
+import secrets
+
+from src.config import RESUME_GRACE_PERIOD
+
+logger = logging.getLogger(__name__)
+
+
+class ResumableSessions:
+    """
+    当前进程中的会话表
+
+    包括已连接与等待恢复的会话，会话数用于准入控制；resumeToken 每次恢复后更换。
+    """
+
+    def __init__(self, grace_period=RESUME_GRACE_PERIOD):
+        """
+        初始化会话表
+
+        Args:
+            grace_period: 媒体连接失败后保留会话的时间（秒），0 表示立即关闭
+        """
+        self.grace_period = grace_period
+        # session_id -> XiaoZhiServer
+        self.sessions = {}
+        # session_id -> resumeToken
+        self.tokens = {}
+        # session_id -> 宽限期结束的定时器
+        self.timers = {}
+
+        # 统计信息
+        self.resumed = 0
+        self.expired = 0
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def add(self, session_id, xiaozhi):
+        """
+        登记新会话
+
+        Returns:
+            str: 客户端恢复会话时需要提供的 resumeToken
+        """
+        self.sessions[session_id] = xiaozhi
+        self.tokens[session_id] = secrets.token_urlsafe(24)
+        return self.tokens[session_id]
+
+    def detach(self, session_id, finish):
+        """
+        媒体连接失败，会话进入宽限期
+
+        Args:
+            session_id: 会话 ID
+            finish: 宽限期结束时调用的协程函数，关闭会话
+        """
+        if session_id not in self.sessions:
+            return
+        if not self.grace_period:
+            self.remove(session_id)
+            asyncio.ensure_future(finish())
+            return
+
+        def expire():
+            self.timers.pop(session_id, None)
+            self.remove(session_id)
+            self.expired += 1
+            logger.info("会话宽限期结束，关闭会话 [%s]", session_id)
+            asyncio.ensure_future(finish())
+
+        self.cancel_timer(session_id)
+        self.timers[session_id] = asyncio.get_running_loop().call_later(self.grace_period, expire)
+        logger.info("媒体连接断开，会话保留 %g 秒等待恢复 [%s]", self.grace_period, session_id)
+
+    def resume(self, session_id, token):
+        """
+        校验 resumeToken 并取回会话
+
+        Args:
+            session_id: 客户端提供的会话 ID
+            token: 客户端提供的 resumeToken
+
+        Returns:
+            tuple: (XiaoZhiServer, 新的 resumeToken)，会话不存在或令牌错误时返回 (None, None)
+        """
+        expected = self.tokens.get(session_id)
+        if expected is None or not hmac.compare_digest(expected, token or ""):
+            self.rejected += 1
+            return None, None
+        self.cancel_timer(session_id)
+        self.resumed += 1
+        self.tokens[session_id] = secrets.token_urlsafe(24)
+        return self.sessions[session_id], self.tokens[session_id]
+
+    def lookup(self, session_id, token):
+        """
+        校验 resumeToken 并返回会话（不更换令牌，用于同一连接上的后续请求）
+
+        Returns:
+            XiaoZhiServer: 会话不存在或令牌错误时返回 None
+        """
+        expected = self.tokens.get(session_id)
+        if expected is None or not hmac.compare_digest(expected, token or ""):
+            return None
+        return self.sessions[session_id]
+
+    def remove(self, session_id):
+        """会话结束，不再允许恢复"""
+        self.cancel_timer(session_id)
+        self.tokens.pop(session_id, None)
+        return self.sessions.pop(session_id, None)
+
+    def cancel_timer(self, session_id):
+        timer = self.timers.pop(session_id, None)
+        if timer is not None:
+            timer.cancel()
+
+    def get_statistics(self):
+        return {
+            "sessions": len(self.sessions),
+            "detached": len(self.timers),
+            "grace_period": self.grace_period,
+            "resumed": self.resumed,
+            "expired": self.expired,
+            "rejected": self.rejected,
+        }
+
+    def collect_metrics(self):
+        """导出 Prometheus 指标"""
+        return [
+            (
+                "xiaozhi_sessions_detached",
+                "gauge",
+                "Sessions waiting to be resumed after the media connection failed",
+                [("xiaozhi_sessions_detached", {}, len(self.timers))],
+            ),
+            (
+                "xiaozhi_session_resumes",
+                "counter",
+                "Session resume attempts by result",
+                [
+                    ("xiaozhi_session_resumes_total", {"result": "resumed"}, self.resumed),
+                    ("xiaozhi_session_resumes_total", {"result": "expired"}, self.expired),
+                    ("xiaozhi_session_resumes_total", {"result": "rejected"}, self.rejected),
+                ],
+            ),
+        ]
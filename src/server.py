@@ -1,10 +1,13 @@
-import json
+import asyncio
 import logging
+import time
 
-import cv2
-from xiaozhi_sdk import XiaoZhiWebsocket
-
-from src.config import OTA_URL
+from src.datachannel import DataChannelSender
+from src.mcp_tools import tool_registry
+from src.track.snapshot import SnapshotCache
+from src.upstream import connect_upstream, create_upstream, ota_cache, upstream_pool, upstream_ready_seconds
+from src.utils.log import session_extra
+from src.utils.profiler import profiler
 
 logger = logging.getLogger(__name__)
 
@@ -13,99 +16,131 @@ class XiaoZhiServer(object):
     def __init__(self, pc):
         self.pc = pc
         self.channel = pc.createDataChannel("chat")
+        self.sender = DataChannelSender(self.channel, batch=getattr(pc, "batch_messages", False))
         self.server = None
+        self.snapshot_cache = SnapshotCache()
+        # 建立上游连接的任务，收到 offer 时即开始（prewarm）
+        self.start_task = None
+        self.created_at = time.perf_counter()
+        # 最近一次收到客户端语音 / DataChannel 消息、向客户端输出语音 / 转发上游消息的时间（perf_counter）
+        self.last_inbound = self.created_at
+        self.last_outbound = self.created_at
+
+    def attach(self, pc):
+        """
+        恢复会话时切换到客户端新建的 RTCPeerConnection，上游连接与会话状态保持不变
+
+        Args:
+            pc: 新的 RTCPeerConnection
+        """
+        self.pc = pc
+        self.channel = pc.createDataChannel("chat")
+        self.sender.batch = getattr(pc, "batch_messages", False)
+        self.sender.set_channel(self.channel)
+        if self.server:
+            # 丢弃断开期间收到的语音
+            self.server.output_audio_queue.clear()
 
     def safe_send(self, data):
-        """安全发送消息到数据通道，检查通道状态"""
-        # 检查数据通道状态是否为 "open"
-        if self.channel.readyState == "open":
-            self.channel.send(data)
-        else:
+        """
+        发送消息到数据通道，通道拥塞或尚未打开时排队（见 DataChannelSender）
+
+        Args:
+            data: dict 消息（发送时才编码），或已经编码好的字符串
+        """
+        if not self.sender.send(data):
             logger.warning(
-                "数据通道未打开，无法发送消息 [%s %s] 状态: %s",
+                "数据通道已关闭，无法发送消息 [%s %s] 状态: %s",
                 self.pc.mac_address,
                 self.pc.client_ip,
                 self.channel.readyState,
+                extra=session_extra(self.pc, "send_failed"),
             )
 
     async def message_handler_callback(self, message):
-        logger.info("Received message: %s %s %s", self.pc.mac_address, self.pc.client_ip, message)
+        trace = profiler.sample("xiaozhi.message", lane="message {}".format(self.pc.session_id), type=message["type"])
+        logger.info(
+            "Received message: %s %s",
+            self.pc.mac_address,
+            self.pc.client_ip,
+            extra=session_extra(self.pc, message["type"], message),
+        )
+        self.last_outbound = time.perf_counter()
         if message["type"] == "websocket" and message["state"] == "close":
             await self.server.close()
             self.server = None
+            if trace:
+                trace.mark("websocket_close")
 
-        self.safe_send(json.dumps(message, ensure_ascii=False))
+        self.safe_send(message)
+        if trace:
+            trace.mark("datachannel_send")
         if message["type"] == "llm" and hasattr(self.pc, "video_track"):
             self.pc.video_track.set_emoji(message["text"])
+        if trace:
+            trace.finish()
+
+    def memory_usage(self):
+        """
+        会话占用内存的估计（上游待播放语音、快照、音频处理状态、最近的视频帧）
+
+        Returns:
+            dict: 各组成部分的字节数
+        """
+        queue = self.server.output_audio_queue if self.server else ()
+        usage = {
+            "output_queue": sum(samples.nbytes for samples in queue),
+            "snapshot": len(self.snapshot_cache.jpeg or b""),
+        }
+        audio_track = getattr(self.pc, "audio_track", None)
+        if audio_track is not None:
+            usage.update(audio_track.memory_usage())
+        video_consumer = getattr(self.pc, "video_consumer", None)
+        if video_consumer is not None and video_consumer.latest_frame is not None:
+            usage["video_frame"] = sum(plane.buffer_size for plane in video_consumer.latest_frame.planes)
+        return usage
+
+    def prewarm(self):
+        """收到 offer 后立即开始建立上游连接，与 ICE / DTLS 握手并行"""
+        if self.start_task is None:
+            self.start_task = asyncio.ensure_future(self._connect())
+            self.start_task.add_done_callback(self._on_connect_done)
+        return self.start_task
 
     async def start(self):
-        self.server = XiaoZhiWebsocket(
-            self.message_handler_callback,
-            ota_url=OTA_URL,
-            audio_sample_rate=48000,
-            audio_channels=2,
-            audio_frame_duration=20,
+        """确保上游连接已建立：等待预热中的连接，尚未开始或已断开时重新连接"""
+        if self.start_task is not None and self.start_task.done() and self.server is None:
+            self.start_task = None
+        await asyncio.shield(self.prewarm())
+
+    async def _connect(self):
+        mac_address = self.pc.mac_address
+        server = upstream_pool.acquire(mac_address)
+        if server is not None:
+            source = "pool"
+            server.message_handler_callback = self.message_handler_callback
+            await server.set_mcp_tool(tool_registry.bind(self))
+            self.server = server
+        else:
+            source = "cache" if ota_cache.cached(mac_address.lower()) else "ota"
+            self.server = create_upstream(self.message_handler_callback)
+            await self.server.set_mcp_tool(tool_registry.bind(self))
+            if not await connect_upstream(self.server, mac_address):
+                return
+        elapsed = time.perf_counter() - self.created_at
+        upstream_ready_seconds.labels(source=source).observe(elapsed)
+        logger.info(
+            "上游连接就绪 [%s %s] 来源: %s 耗时: %.0fms", mac_address, self.pc.client_ip, source, elapsed * 1000
         )
-        await self.server.set_mcp_tool(self.mcp_tool_func())
-        await self.server.init_connection(self.pc.mac_address)
-
-    def mcp_tool_func(self):
-        def tool_set_volume(data):
-            self.safe_send(json.dumps({"type": "tool", "text": "set_volume", "value": data["volume"]}))
-            return "", False
-
-        def tool_open_tab(data):
-            self.safe_send(json.dumps({"type": "tool", "text": "open_tab", "value": data["url"]}))
-            return "", False
-
-        def tool_stop_music(data):
-            self.safe_send(json.dumps({"type": "tool", "text": "stop_music"}))
-            return "", False
-
-        def tool_get_device_status(data):
-            return (
-                json.dumps(
-                    {
-                        "audio_speaker": {"volume": 100},
-                        # 'screen': {'brightness': 75, 'theme': 'light'},
-                        # 'network': {'type': 'wifi', 'ssid': 'wifi名称', 'signal': 'strong'}
-                    }
-                ),
-                False,
-            )
 
-        async def tool_take_photo(data):
-            img_obj = self.server.video_frame.to_ndarray(format="bgr24")
-            # 直接使用 OpenCV 编码图片
-            _, img_byte = cv2.imencode(".jpg", img_obj)
-            img_byte = img_byte.tobytes()
-            return await self.server.async_analyze_image(img_byte, data.get("question", "请描述这张图片"))
-
-        from xiaozhi_sdk.utils.mcp_tool import (
-            get_device_status,
-            open_tab,
-            play_custom_music,
-            search_custom_music,
-            set_volume,
-            stop_music,
-            take_photo,
-        )
+    def _on_connect_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("建立上游连接失败 [%s %s]: %s", self.pc.mac_address, self.pc.client_ip, task.exception())
 
-        take_photo["tool_func"] = tool_take_photo
-        take_photo["is_async"] = True
-
-        get_device_status["tool_func"] = tool_get_device_status
-        set_volume["tool_func"] = tool_set_volume
-        open_tab["tool_func"] = tool_open_tab
-        stop_music["tool_func"] = tool_stop_music
-
-        return [
-            take_photo,
-            get_device_status,
-            set_volume,
-            take_photo,
-            open_tab,
-            stop_music,
-            search_custom_music,
-            play_custom_music,
-        ]
+    async def close(self):
+        """关闭上游连接，取消尚未完成的预热"""
+        if self.start_task is not None and not self.start_task.done():
+            self.start_task.cancel()
+        if self.server:
+            await self.server.close()
+            self.server = None
@@ -1,13 +1,46 @@
-from fractions import Fraction
+import asyncio
+import logging
+import math
+import time
+import weakref
+from collections import Counter
 
 import av
 import numpy as np
 from aiortc import AudioStreamTrack
+from aiortc.mediastreams import MediaStreamError
 
+from src.audio.aec_scheduler import aec_scheduler
 from src.audio.echo_manager import EchoCancellationManager
+from src.audio.frame_pool import AudioFramePool
+from src.audio.playout import AudioPlayout
+from src.audio.vad import VoiceActivityGate
+from src.config.echo_config import EchoConfig
+from src.utils.executor import media_executor
+from src.utils.metrics import metrics_registry
+from src.utils.profiler import profiler
+
+logger = logging.getLogger(__name__)
 
 resampler = av.AudioResampler(format="s16", layout="mono", rate=48000)
 
+# 音频处理各阶段耗时
+audio_stage_seconds = metrics_registry.histogram(
+    "xiaozhi_audio_stage_seconds", "Time spent per 20ms audio frame in each pipeline stage", labelnames=("stage",)
+)
+echo_stage = audio_stage_seconds.labels(stage="echo")
+vad_stage = audio_stage_seconds.labels(stage="vad")
+send_audio_stage = audio_stage_seconds.labels(stage="send_audio")
+frame_build_stage = audio_stage_seconds.labels(stage="frame_build")
+# 处理失败被丢弃的麦克风帧，按异常类型区分
+microphone_errors = metrics_registry.counter(
+    "xiaozhi_microphone_errors", "Microphone frames dropped because processing raised", labelnames=("error",)
+)
+
+# 存活的音频轨道，以及已结束会话的累计计数（与存活会话相加得到单调递增的计数器）
+active_tracks = weakref.WeakSet()
+retired_counters = Counter()
+
 
 class AudioFaceSwapper(AudioStreamTrack):
     kind = "audio"
@@ -18,55 +51,131 @@ class AudioFaceSwapper(AudioStreamTrack):
         self.sample_rate = 48000
         self.xiaozhi = xiaozhi
 
-        # 初始化回声消除管理器
-        self.echo_manager = EchoCancellationManager(enable_echo_cancellation=True, enable_debug=True)
+        # 初始化回声消除管理器，fdaf 引擎可与其他会话共享批量调度器，运算在 media_executor 中执行
+        scheduler = aec_scheduler if EchoConfig.BATCH_ENABLED and EchoConfig.ENGINE == "fdaf" else None
+        self.echo_manager = EchoCancellationManager(
+            enable_echo_cancellation=True, enable_debug=True, scheduler=scheduler, executor=media_executor
+        )
+        # 复用输出音频帧，静音与 TTS 帧都不再每周期新建，pts 由帧池按输出样本数累加
+        self.frame_pool = AudioFramePool(samples=960, sample_rate=self.sample_rate)
+        # 输出语音按自己的 20ms 时钟播放，麦克风帧在独立任务中处理
+        self.playout = AudioPlayout()
+        # 用户不说话时不向服务端发送麦克风帧
+        self.vad_gate = VoiceActivityGate()
+        # 分析器时间线上的泳道名称
+        self.lane = "audio {}".format(getattr(getattr(xiaozhi, "pc", None), "session_id", id(self)))
+        self.microphone_task = asyncio.ensure_future(self.consume_microphone())
 
-    def empty_frame(self):
-        samples = np.zeros(960, dtype=np.float32)
-        samples = (samples * 32767).astype(np.int16)
-        new_frame = av.AudioFrame.from_ndarray(samples.reshape(1, -1), format="s16", layout="mono")
-        new_frame.sample_rate = self.sample_rate
-        new_frame.pts = 0
-        return new_frame
+        active_tracks.add(self)
+        # 轨道被回收时把计数并入 retired_counters，只持有统计对象而不是轨道本身
+        weakref.finalize(self, retire_counters, SessionCounters(self.echo_manager, self.vad_gate, self.playout))
 
-    async def recv(self):
-        # 接收原始音频帧
-        original_frame = await self.track.recv()
-
-        if not self.xiaozhi.server:
-            return self.empty_frame()
+    def empty_frame(self):
+        return self.frame_pool.silence()
 
-        pcm_data = np.frombuffer(original_frame.planes[0], dtype=np.int16)
+    async def consume_microphone(self):
+        """持续接收麦克风音频，回声消除后发送到服务端；单帧处理失败时丢弃该帧，只在轨道结束或任务取消时退出"""
+        # 连续失败的帧数，只记录每轮连续失败的第一条错误日志
+        failures = 0
+        while True:
+            trace = profiler.sample("audio.microphone", lane=self.lane + " mic")
+            try:
+                # 接收原始音频帧
+                original_frame = await self.track.recv()
+            except MediaStreamError:
+                return
 
-        # 使用回声消除管理器处理麦克风音频
-        cleaned_pcm_data = self.echo_manager.process_microphone_audio(pcm_data)
+            if not self.xiaozhi.server:
+                continue
+            if trace:
+                trace.mark("recv_wait")
 
-        # 发送处理后的音频到服务端
-        await self.xiaozhi.server.send_audio(cleaned_pcm_data.tobytes())
+            pcm_data = np.frombuffer(original_frame.planes[0], dtype=np.int16)
 
-        if not self.xiaozhi.server:
-            return self.empty_frame()
+            try:
+                # 使用回声消除管理器处理麦克风音频
+                start = time.perf_counter()
+                cleaned_pcm_data = await self.echo_manager.process_microphone_audio_async(pcm_data)
+                echo_done = time.perf_counter()
+                if trace:
+                    trace.mark("echo")
+                frames = self.vad_gate.process(cleaned_pcm_data)
+                vad_done = time.perf_counter()
+                if trace:
+                    trace.mark("vad", sent=len(frames))
+                echo_stage.observe(echo_done - start)
+                vad_stage.observe(vad_done - echo_done)
 
-        # 处理服务端返回的音频
-        if self.xiaozhi.server and self.xiaozhi.server.output_audio_queue:
-            samples = self.xiaozhi.server.output_audio_queue.popleft()
+                if frames:
+                    # 门限打开（检测到说话）视为会话活跃；VAD_MODE=off 时所有麦克风帧都计入
+                    self.xiaozhi.last_inbound = vad_done
+                # 发送处理后的语音帧到服务端
+                for frame in frames:
+                    if self.xiaozhi.server:
+                        await self.xiaozhi.server.send_audio(frame)
+                if frames:
+                    send_audio_stage.observe(time.perf_counter() - vad_done)
+                if trace:
+                    trace.mark("send_audio")
+                    trace.finish()
+                failures = 0
+            except Exception as e:
+                # 上游重连过程中发送失败、回声消除或 VAD 异常都只影响当前帧
+                microphone_errors.labels(error=type(e).__name__).inc()
+                if failures == 0:
+                    logger.error("麦克风音频处理失败，丢弃该帧: %s", e)
+                else:
+                    logger.debug("麦克风音频处理失败，丢弃该帧: %s", e)
+                failures += 1
 
+    async def recv(self):
+        # 按播放时钟取出服务端返回的音频
+        trace = profiler.sample("audio.recv", lane=self.lane + " out")
+        await self.playout.wait_tick()
+        if trace:
+            trace.mark("tick_wait")
+        queue = self.xiaozhi.server.output_audio_queue if self.xiaozhi.server else None
+        start = time.perf_counter()
+        samples = self.playout.take(queue)
+        if samples is None:
+            frame = self.empty_frame()
+        else:
             # 更新回声消除管理器的参考音频
             self.echo_manager.update_reference_audio(samples)
+            self.xiaozhi.last_outbound = start
+
+            # 填充预分配的音频帧返回给客户端
+            frame = self.frame_pool.frame(samples)
+        frame_build_stage.observe(time.perf_counter() - start)
+        if trace:
+            trace.mark("frame_build", queue_depth=len(queue) if queue else 0)
+            trace.finish(tts=samples is not None)
+        return frame
+
+    def stop(self):
+        super().stop()
+        self.microphone_task.cancel()
 
-            # 创建音频帧返回给客户端
-            new_frame = av.AudioFrame.from_ndarray(
-                samples.reshape(1, -1),
-                format="s16",
-                layout="mono",
-            )
-            new_frame.sample_rate = self.sample_rate
-            new_frame.pts = original_frame.pts
-            new_frame.time_base = Fraction(1, self.sample_rate)
+    def memory_usage(self):
+        """
+        音频处理状态占用的内存估计
 
-            return new_frame
+        Returns:
+            dict: 各组成部分的字节数
+        """
+        return {
+            "echo": self.echo_manager.memory_usage(),
+            "vad_pre_roll": sum(len(frame) for frame in self.vad_gate.pre_roll),
+            "frame_pool": self.frame_pool.memory_usage(),
+        }
 
-        return self.empty_frame()
+    def get_playout_stats(self):
+        """获取输出语音播放统计信息"""
+        return self.playout.get_statistics()
+
+    def get_vad_stats(self):
+        """获取语音活动检测统计信息"""
+        return self.vad_gate.get_statistics()
 
     def get_echo_cancellation_stats(self):
         """获取回声消除统计信息"""
@@ -83,3 +192,93 @@ class AudioFaceSwapper(AudioStreamTrack):
     def reset_echo_cancellation(self):
         """重置回声消除状态"""
         self.echo_manager.reset()
+
+
+class SessionCounters:
+    """读取单个会话中单调递增的音频计数"""
+
+    def __init__(self, echo_manager, vad_gate, playout):
+        self.echo_manager = echo_manager
+        self.vad_gate = vad_gate
+        self.playout = playout
+
+    def read(self):
+        """
+        Returns:
+            dict: 计数名 -> 数值
+        """
+        manager = self.echo_manager
+        return {
+            "aec_frames": manager.frame_count,
+            "aec_over_suppression": manager.over_suppression_count,
+            "aec_divergence_resets": getattr(manager.echo_canceller, "divergence_resets", 0),
+            "vad_sent": self.vad_gate.sent_frames,
+            "vad_suppressed": self.vad_gate.suppressed_frames,
+            "vad_segments": self.vad_gate.speech_segments,
+            "playout_underruns": self.playout.underruns,
+            "playout_overruns": self.playout.overruns,
+            "playout_dropped": self.playout.dropped_frames,
+        }
+
+
+def retire_counters(session_counters):
+    """会话结束时把计数并入 retired_counters"""
+    retired_counters.update(session_counters.read())
+
+
+# 计数名 -> (指标名, 说明, 标签)
+AUDIO_COUNTERS = {
+    "aec_frames": ("xiaozhi_aec_frames", "Microphone frames processed by echo cancellation", {}),
+    "aec_over_suppression": (
+        "xiaozhi_aec_over_suppression",
+        "Frames where AEC output fell back to over-suppression",
+        {},
+    ),
+    "aec_divergence_resets": ("xiaozhi_aec_divergence_resets", "Adaptive filter resets after divergence", {}),
+    "vad_sent": ("xiaozhi_vad_frames", "Microphone frames by VAD decision", {"decision": "sent"}),
+    "vad_suppressed": ("xiaozhi_vad_frames", "Microphone frames by VAD decision", {"decision": "suppressed"}),
+    "vad_segments": ("xiaozhi_vad_speech_segments", "Speech segments detected by VAD", {}),
+    "playout_underruns": ("xiaozhi_playout_underruns", "TTS playout buffer underruns", {}),
+    "playout_overruns": ("xiaozhi_playout_overruns", "TTS playout buffer overruns", {}),
+    "playout_dropped": ("xiaozhi_playout_dropped_frames", "TTS frames dropped on overrun", {}),
+}
+
+
+def collect_audio_metrics():
+    """采集所有会话的音频计数、输出队列深度与回声消除效果"""
+    totals = Counter(retired_counters)
+    depths = []
+    erle = []
+    for track in list(active_tracks):
+        totals.update(SessionCounters(track.echo_manager, track.vad_gate, track.playout).read())
+        server = track.xiaozhi.server
+        depths.append(len(server.output_audio_queue) if server else 0)
+        canceller = track.echo_manager.echo_canceller
+        if getattr(canceller, "error_energy", 0) > 0 and canceller.near_energy > 0:
+            erle.append(10 * math.log10(canceller.near_energy / canceller.error_energy))
+
+    counters = {}
+    for key, (name, documentation, labels) in AUDIO_COUNTERS.items():
+        family = counters.setdefault(name, (name, "counter", documentation, []))
+        family[3].append((name + "_total", labels, totals[key]))
+
+    return list(counters.values()) + [
+        (
+            "xiaozhi_output_queue_frames",
+            "gauge",
+            "TTS frames waiting in output queues",
+            [
+                ("xiaozhi_output_queue_frames", {"stat": "total"}, sum(depths)),
+                ("xiaozhi_output_queue_frames", {"stat": "max"}, max(depths, default=0)),
+            ],
+        ),
+        (
+            "xiaozhi_aec_erle_db",
+            "gauge",
+            "Mean echo return loss enhancement across active sessions",
+            [("xiaozhi_aec_erle_db", {}, sum(erle) / len(erle) if erle else 0.0)],
+        ),
+    ]
+
+
+metrics_registry.register_collector(collect_audio_metrics)
@@ -0,0 +1,133 @@
+"""
+拍照快照缓存
+Snapshot Cache
+"""
+
+import asyncio
+import logging
+import time
+
+import cv2
+
+from src.config import SNAPSHOT_JPEG_QUALITY, SNAPSHOT_MAX_AGE, SNAPSHOT_MAX_SIZE
+from src.utils.executor import media_executor
+
+logger = logging.getLogger(__name__)
+
+
+def encode_frame_jpeg(frame, max_size=SNAPSHOT_MAX_SIZE, quality=SNAPSHOT_JPEG_QUALITY):
+    """
+    将视频帧缩放并编码为 JPEG（CPU 密集，在 media_executor 中执行）
+
+    缩放和 YUV -> BGR 转换由 libswscale 一次完成，不会先生成全分辨率的 BGR 图像。
+
+    Args:
+        frame: av.VideoFrame
+        max_size: 长边上限（像素），0 表示保持原始分辨率
+        quality: JPEG 质量 (1-100)
+
+    Returns:
+        bytes: JPEG 数据
+    """
+    width, height = frame.width, frame.height
+    scale = max_size / max(width, height) if max_size else 1.0
+    if scale < 1.0:
+        # libswscale 要求偶数尺寸
+        width = max(2, int(width * scale) & ~1)
+        height = max(2, int(height * scale) & ~1)
+    img_obj = frame.to_ndarray(width=width, height=height, format="bgr24")
+    _, img_byte = cv2.imencode(".jpg", img_obj, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return img_byte.tobytes()
+
+
+class SnapshotCache:
+    """
+    单个会话的拍照快照缓存
+
+    保存最近一帧缩放后已编码好的 JPEG。快照在 max_age 秒内直接复用，
+    只有新帧到达且快照已过期时才重新编码；并发的拍照请求共享同一次编码。
+    """
+
+    def __init__(
+        self,
+        max_size=SNAPSHOT_MAX_SIZE,
+        quality=SNAPSHOT_JPEG_QUALITY,
+        max_age=SNAPSHOT_MAX_AGE,
+        executor=media_executor,
+    ):
+        """
+        初始化快照缓存
+
+        Args:
+            max_size: 长边上限（像素）
+            quality: JPEG 质量 (1-100)
+            max_age: 快照直接复用的最长时间（秒）
+            executor: 执行编码的 MediaExecutor
+        """
+        self.max_size = max_size
+        self.quality = quality
+        self.max_age = max_age
+        self.executor = executor
+
+        self.frame = None
+        self.jpeg = None
+        self.encoded_at = 0.0
+        self.pending = None
+
+        # 统计信息
+        self.hits = 0
+        self.encodes = 0
+
+    def fresh(self):
+        """
+        获取未过期的快照
+
+        Returns:
+            bytes: JPEG 数据，没有快照或已过期时返回 None
+        """
+        if self.jpeg is not None and time.monotonic() - self.encoded_at < self.max_age:
+            self.hits += 1
+            return self.jpeg
+        return None
+
+    async def get(self, frame):
+        """
+        获取 frame 对应的快照，必要时重新编码
+
+        Args:
+            frame: 最新的 av.VideoFrame，为 None 时返回已缓存的快照
+
+        Returns:
+            bytes: JPEG 数据，没有可用画面时返回 None
+        """
+        if frame is None or frame is self.frame:
+            self.hits += self.jpeg is not None
+            return self.jpeg
+        jpeg = self.fresh()
+        if jpeg is not None:
+            return jpeg
+
+        if self.pending is None:
+            self.pending = asyncio.ensure_future(self._encode(frame))
+        # 请求方取消时不影响共享的编码任务
+        return await asyncio.shield(self.pending)
+
+    async def _encode(self, frame):
+        try:
+            jpeg = await self.executor.run(encode_frame_jpeg, frame, self.max_size, self.quality)
+        finally:
+            self.pending = None
+        self.frame = frame
+        self.jpeg = jpeg
+        self.encoded_at = time.monotonic()
+        self.encodes += 1
+        logger.debug("快照编码完成 %dx%d -> %d 字节", frame.width, frame.height, len(jpeg))
+        return jpeg
+
+    def get_statistics(self):
+        """获取快照缓存统计信息"""
+        return {
+            "hits": self.hits,
+            "encodes": self.encodes,
+            "bytes": len(self.jpeg) if self.jpeg is not None else 0,
+        }
@@ -1,9 +1,21 @@
+import asyncio
+import logging
 import os
+import time
+import types
 
+import aiortc
 import cv2
 from aiortc import VideoStreamTrack
+from aiortc.jitterbuffer import JitterBuffer
+from aiortc.rtcrtpreceiver import NackGenerator, RTCRtpReceiver
 from av import VideoFrame
 
+from src.config import VIDEO_ACTIVE_WINDOW, VIDEO_DECODE_MODE, VIDEO_FRAME_TIMEOUT, VIDEO_REFRESH_INTERVAL
+from src.utils.profiler import profiler
+
+logger = logging.getLogger(__name__)
+
 
 class VideoFaceSwapper(VideoStreamTrack):
     kind = "video"
@@ -66,3 +78,220 @@ class VideoFaceSwapper(VideoStreamTrack):
         # new_frame.time_base = frame.time_base
         #
         # return new_frame
+
+
+class VideoFrameConsumer:
+    """
+    按需解码的视频消费者
+
+    视频帧只在 take_photo 工具调用时使用。lazy 模式下收到首帧后关闭 RTCRtpReceiver，
+    RTP 包在进入抖动缓冲与解码线程之前就被丢弃；拍照时重新打开接收并发送 PLI 请求关键帧，
+    在 active_window 秒内全速解码，之后再次关闭。最近解码的一帧始终保留，作为超时时的兜底。
+    """
+
+    MODES = ("lazy", "full")
+    # lazy 模式用到的 RTCRtpReceiver 私有属性（在 aiortc 1.13 - 1.15 上验证）
+    RECEIVER_INTERNALS = (
+        "_RTCRtpReceiver__nack_generator",
+        "_RTCRtpReceiver__jitter_buffer",
+        "_enabled",
+        "_send_rtcp_pli",
+    )
+    # 启动检查的结果，不满足时所有会话都逐帧解码
+    lazy_supported = True
+
+    @classmethod
+    def check_receiver_internals(cls):
+        """
+        启动时检查当前 aiortc 是否还有 lazy 模式依赖的私有属性；缺少时记录警告并退化为 full 模式
+        （私有属性改名后赋值不会报错，抖动缓冲却不会再被重置）
+
+        Returns:
+            bool: 是否可以使用 lazy 模式
+        """
+        try:
+            receiver = RTCRtpReceiver("video", types.SimpleNamespace(state="new"))
+            missing = [name for name in cls.RECEIVER_INTERNALS if not hasattr(receiver, name)]
+        except Exception as e:
+            missing = ["RTCRtpReceiver({})".format(e)]
+        cls.lazy_supported = not missing
+        if missing:
+            logger.warning(
+                "aiortc %s 的 RTCRtpReceiver 缺少 %s，视频改为逐帧解码", aiortc.__version__, ", ".join(missing)
+            )
+        return cls.lazy_supported
+
+    def __init__(
+        self,
+        xiaozhi,
+        track,
+        receiver=None,
+        mode=VIDEO_DECODE_MODE,
+        active_window=VIDEO_ACTIVE_WINDOW,
+        frame_timeout=VIDEO_FRAME_TIMEOUT,
+        refresh_interval=VIDEO_REFRESH_INTERVAL,
+    ):
+        """
+        初始化视频消费者
+
+        Args:
+            xiaozhi: XiaoZhiServer 实例
+            track: 远端视频轨道
+            receiver: 视频轨道对应的 RTCRtpReceiver，为 None 或启动检查未通过时退化为 full 模式
+            mode: "lazy" 按需解码, "full" 解码每一帧
+            active_window: 拍照请求后全速解码的时长（秒）
+            frame_timeout: 拍照时等待新帧的最长时间（秒）
+            refresh_interval: 定期刷新最近一帧的间隔（秒），0 表示不刷新
+        """
+        if mode not in self.MODES:
+            raise ValueError("不支持的视频解码模式: {}".format(mode))
+
+        self.xiaozhi = xiaozhi
+        self.track = track
+        self.receiver = receiver
+        self.lazy = mode == "lazy" and receiver is not None and self.lazy_supported
+        self.active_window = active_window
+        self.frame_timeout = frame_timeout
+        self.refresh_interval = refresh_interval
+
+        self.latest_frame = None
+        self.frame_event = asyncio.Event()
+        self.media_ssrc = None
+        self.receiving = True
+        # 拍照窗口截止时间；刷新截止时间在收到一帧后清零，首帧到达前一直接收
+        self.active_until = 0.0
+        self.refresh_until = float("inf")
+        self.idle_handle = None
+        self.tasks = set()
+
+        # 统计信息
+        self.decoded_frames = 0
+        self.activations = 0
+
+    async def run(self):
+        """持续接收视频帧，直到轨道结束或任务被取消"""
+        refresh_task = None
+        if self.lazy and self.refresh_interval > 0:
+            refresh_task = asyncio.create_task(self._refresh_loop())
+        lane = "video {}".format(getattr(getattr(self.xiaozhi, "pc", None), "session_id", id(self)))
+        try:
+            while True:
+                trace = profiler.sample("video.frame", lane=lane)
+                frame = await self.track.recv()
+                if trace:
+                    trace.mark("recv_wait")
+                self._on_frame(frame)
+                if trace:
+                    trace.mark("store")
+                    trace.finish(receiving=self.receiving)
+        finally:
+            if refresh_task:
+                refresh_task.cancel()
+            if self.idle_handle:
+                self.idle_handle.cancel()
+
+    def _on_frame(self, frame):
+        """保存最新帧，窗口结束后关闭接收"""
+        self.latest_frame = frame
+        self.decoded_frames += 1
+        if self.xiaozhi and self.xiaozhi.server:
+            self.xiaozhi.server.video_frame = frame
+        self.frame_event.set()
+
+        if not self.lazy:
+            return
+        if self.media_ssrc is None:
+            # 只有接收中的 SSRC 才会出现在同步源列表里，关闭前先记下来用于发送 PLI
+            sources = self.receiver.getSynchronizationSources()
+            if sources:
+                self.media_ssrc = sources[0].source
+        self.refresh_until = 0.0
+        self._check_idle()
+
+    async def request_frame(self, timeout=None):
+        """
+        获取一帧新的视频画面
+
+        Args:
+            timeout: 等待新帧的最长时间（秒），默认使用 frame_timeout
+
+        Returns:
+            VideoFrame: 新解码的帧；超时返回最近一帧，从未收到过视频时返回 None
+        """
+        if not self.lazy:
+            return self.latest_frame
+
+        self.frame_event.clear()
+        self.activate(self.active_window)
+        try:
+            await asyncio.wait_for(self.frame_event.wait(), self.frame_timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            logger.debug("等待新视频帧超时，使用最近一帧")
+        return self.latest_frame
+
+    def activate(self, duration):
+        """
+        打开接收并请求关键帧，在 duration 秒内全速解码
+
+        Args:
+            duration: 全速解码时长（秒）
+        """
+        if not self.lazy:
+            return
+        self.active_until = max(self.active_until, time.monotonic() + duration)
+        self._resume()
+        self._schedule_idle_check()
+
+    async def _refresh_loop(self):
+        """定期解码一帧，保持最近一帧不过期"""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            if not self.receiving:
+                self.refresh_until = time.monotonic() + self.frame_timeout
+                self._resume()
+                self._schedule_idle_check()
+
+    def _resume(self):
+        """重新打开接收并发送 PLI"""
+        if self.receiving:
+            return
+        self.activations += 1
+        self._set_receiving(True)
+        if self.media_ssrc is not None:
+            task = asyncio.create_task(self.receiver._send_rtcp_pli(self.media_ssrc))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    def _schedule_idle_check(self):
+        """在窗口截止时检查是否可以关闭接收（对端没有发送视频时不会有帧触发检查）"""
+        if self.idle_handle:
+            self.idle_handle.cancel()
+        delay = max(self.active_until, self.refresh_until) - time.monotonic()
+        if delay != float("inf"):
+            self.idle_handle = asyncio.get_running_loop().call_later(max(0.0, delay), self._check_idle)
+
+    def _check_idle(self):
+        if self.receiving and time.monotonic() >= max(self.active_until, self.refresh_until):
+            self._set_receiving(False)
+
+    def _set_receiving(self, enabled):
+        """
+        打开或关闭 RTCRtpReceiver
+
+        关闭期间 RTP 包在进入抖动缓冲前被丢弃，解码线程空闲。重新打开时序列号会出现大段跳变，
+        先重置 NACK 生成器与抖动缓冲，避免为丢弃的包请求重传或把半帧送进解码器。
+        """
+        if enabled:
+            self.receiver._RTCRtpReceiver__nack_generator = NackGenerator()
+            self.receiver._RTCRtpReceiver__jitter_buffer = JitterBuffer(capacity=128, is_video=True)
+        self.receiver._enabled = enabled
+        self.receiving = enabled
+
+    def get_statistics(self):
+        """获取视频解码统计信息"""
+        return {
+            "mode": "lazy" if self.lazy else "full",
+            "receiving": self.receiving,
+            "decoded_frames": self.decoded_frames,
+            "activations": self.activations,
+        }
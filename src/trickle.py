@@ -0,0 +1,114 @@
+"""
+Trickle ICE
+Trickle ICE
+
+aiortc 的 setLocalDescription 要等本地候选收集完成（包括 STUN 往返）才返回，非 trickle 模式下 /api/offer
+的应答必须等收集结束；浏览器端同样要等自己的候选收集完成才发送 offer。offer 中带 "trickle": true 时：
+
+- 服务端立即返回不含候选的应答，候选收集在后台进行；
+- 服务端候选通过 GET /api/candidates 长轮询获取（aiortc 一次性给出全部候选，收集完成后一次返回）；
+- 浏览器候选通过 POST /api/candidates 陆续发送，"complete": true 表示收集结束。
+
+两个方向的请求都需要携带 sessionId 与 resumeToken（GET 请求放在 X-Resume-Token 头中）。
+"""
+
+import asyncio
+import logging
+
+from aiortc.sdp import SessionDescription, candidate_from_sdp, candidate_to_sdp
+
+from src.config.ice_config import ice_config
+
+logger = logging.getLogger(__name__)
+
+
+def start_gathering(pc, answer, on_error):
+    """
+    在后台设置本地描述（收集候选并开始连接检查）
+
+    Args:
+        pc: 已设置远端 offer 的 RTCPeerConnection
+        answer: createAnswer() 生成的应答
+        on_error: 协程函数，设置失败时调用（关闭连接）
+    """
+
+    async def gather():
+        try:
+            await pc.setLocalDescription(answer)
+        except Exception as e:
+            logger.warning("收集 ICE 候选失败 [%s %s]: %s", pc.mac_address, pc.client_ip, e)
+            await on_error()
+
+    pc.gather_task = asyncio.ensure_future(gather())
+
+
+def local_candidates(pc):
+    """
+    服务端已收集的候选（包括 ICE_PUBLIC_IP 公布的地址）
+
+    Returns:
+        list: RTCIceCandidateInit 格式的候选，收集尚未完成时为空
+    """
+    if pc.localDescription is None:
+        return []
+    description = SessionDescription.parse(ice_config.advertise_public_ip(pc.localDescription.sdp))
+    return [
+        {"candidate": "candidate:" + candidate_to_sdp(candidate), "sdpMid": media.rtp.muxId, "sdpMLineIndex": index}
+        for index, media in enumerate(description.media)
+        for candidate in media.ice_candidates
+    ]
+
+
+async def wait_local_candidates(pc, timeout):
+    """
+    等待服务端候选收集完成（长轮询）
+
+    Args:
+        pc: RTCPeerConnection
+        timeout: 最长等待时间（秒）
+
+    Returns:
+        dict: {"candidates": [...], "complete": 收集是否已完成}
+    """
+    gather_task = getattr(pc, "gather_task", None)
+    if gather_task is not None and not gather_task.done():
+        try:
+            await asyncio.wait_for(asyncio.shield(gather_task), timeout)
+        except asyncio.TimeoutError:
+            return {"candidates": [], "complete": False}
+    return {"candidates": local_candidates(pc), "complete": True}
+
+
+async def add_remote_candidates(pc, candidates, complete):
+    """
+    添加浏览器发来的候选
+
+    Args:
+        pc: RTCPeerConnection
+        candidates: RTCIceCandidateInit 格式的候选列表
+        complete: 浏览器候选收集是否已结束
+
+    Returns:
+        int: 成功添加的候选数
+    """
+    added = 0
+    for item in candidates:
+        text = item.get("candidate") or ""
+        if not text:
+            # 空字符串是浏览器的 end-of-candidates 标记
+            complete = True
+            continue
+        try:
+            candidate = candidate_from_sdp(text.split(":", 1)[1] if text.startswith("candidate:") else text)
+        except (ValueError, IndexError) as e:
+            logger.debug("忽略无法解析的 ICE 候选 [%s]: %s", text, e)
+            continue
+        candidate.sdpMid = item.get("sdpMid")
+        candidate.sdpMLineIndex = item.get("sdpMLineIndex")
+        if candidate.sdpMid is None and candidate.sdpMLineIndex is None:
+            candidate.sdpMLineIndex = 0
+        await pc.addIceCandidate(candidate)
+        added += 1
+    if complete:
+        await pc.addIceCandidate(None)
+    return added
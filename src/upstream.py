@@ -0,0 +1,326 @@
+"""
+小智上游连接预热
+Upstream XiaoZhi Connection Prewarming
+
+- OTA 激活信息按 MAC 缓存，同一设备再次连接时直接使用缓存的 WebSocket 地址与令牌；
+- 收到 offer 后立即开始建立上游连接，与 ICE / DTLS 握手并行（见 XiaoZhiServer.prewarm）；
+- 可选地为默认 MAC 保持少量已完成握手的空闲连接，新会话直接取用。
+"""
+
+import asyncio
+import logging
+import re
+import time
+import uuid
+from collections import deque
+
+from websockets.protocol import State
+from xiaozhi_sdk import XiaoZhiWebsocket
+from xiaozhi_sdk.ota import OtaDevice
+
+from src.config import DEFAULT_MAC_ADDR, OTA_URL, UPSTREAM_OTA_TTL, UPSTREAM_POOL_MAX_AGE, UPSTREAM_POOL_SIZE
+from src.utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+MAC_PATTERN = re.compile(r"^([0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2}$")
+
+# 从收到 offer 到上游连接可用的耗时，按连接来源区分
+upstream_ready_seconds = metrics_registry.histogram(
+    "xiaozhi_upstream_ready_seconds",
+    "Time from offer to a ready upstream websocket by source",
+    labelnames=("source",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0),
+)
+
+
+def create_upstream(message_handler_callback):
+    """创建与会话音频参数一致的 XiaoZhiWebsocket（尚未连接）"""
+    return XiaoZhiWebsocket(
+        message_handler_callback,
+        ota_url=OTA_URL,
+        audio_sample_rate=48000,
+        audio_channels=2,
+        audio_frame_duration=20,
+    )
+
+
+class OtaCache:
+    """
+    OTA 激活信息缓存
+
+    只缓存已激活设备的结果（未激活设备每次都需要新的激活挑战）；同一 MAC 的并发请求只发起一次 OTA。
+    """
+
+    def __init__(self, ota_url=OTA_URL, ttl=UPSTREAM_OTA_TTL):
+        """
+        初始化缓存
+
+        Args:
+            ota_url: OTA 接口地址
+            ttl: 缓存时间（秒），0 表示不缓存
+        """
+        self.ota_url = ota_url
+        self.ttl = ttl
+        # mac -> (过期时间, ota_info)
+        self.entries = {}
+        # mac -> 进行中的 OTA 请求
+        self.pending = {}
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+
+    def cached(self, mac_addr):
+        """是否有未过期的缓存"""
+        entry = self.entries.get(mac_addr)
+        return entry is not None and entry[0] > time.monotonic()
+
+    async def get(self, mac_addr, client_id):
+        """
+        获取设备的 OTA 信息，已激活设备在缓存时间内直接返回缓存
+
+        Args:
+            mac_addr: 设备 MAC（小写）
+            client_id: 客户端 ID
+
+        Returns:
+            dict: OTA 信息，未激活设备包含 activation（激活挑战）
+        """
+        if self.cached(mac_addr):
+            self.hits += 1
+            return self.entries[mac_addr][1]
+
+        self.misses += 1
+        future = self.pending.get(mac_addr)
+        if future is None:
+            future = asyncio.ensure_future(OtaDevice(mac_addr, client_id, self.ota_url).activate_device())
+            self.pending[mac_addr] = future
+            future.add_done_callback(lambda _: self.pending.pop(mac_addr, None))
+        ota_info = await asyncio.shield(future)
+
+        if self.ttl and not ota_info.get("activation") and ota_info.get("websocket", {}).get("url"):
+            self.entries[mac_addr] = (time.monotonic() + self.ttl, ota_info)
+        return ota_info
+
+    def invalidate(self, mac_addr):
+        self.entries.pop(mac_addr, None)
+
+
+async def connect_upstream(server, mac_addr, cache=None):
+    """
+    建立上游连接，流程与 XiaoZhiWebsocket.init_connection 相同，但每次只请求一次 OTA：
+    已激活设备的 OTA 信息使用缓存，未激活设备直接用本次 OTA 返回的激活挑战等待激活
+
+    Args:
+        server: 未连接的 XiaoZhiWebsocket
+        mac_addr: 设备 MAC
+        cache: OtaCache，默认使用全局缓存
+
+    Returns:
+        bool: 是否连接成功
+    """
+    cache = ota_cache if cache is None else cache
+    if not MAC_PATTERN.match(mac_addr):
+        raise ValueError("无效的MAC地址格式: {}。正确格式应为 XX:XX:XX:XX:XX:XX".format(mac_addr))
+
+    mac_addr = mac_addr.lower()
+    client_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, mac_addr))
+    ota_info = await cache.get(mac_addr, client_id)
+
+    server.mac_addr = mac_addr
+    server.client_id = client_id
+    server.ota = OtaDevice(mac_addr, client_id, server.ota_url)
+    server.websocket_token = ota_info["websocket"]["token"]
+    server.url = server.url or ota_info.get("websocket", {}).get("url")
+    if not await server.is_activate(ota_info):
+        # 未激活设备：连接后在后台轮询激活结果
+        server.ota_task = asyncio.create_task(server._activate_ota_device("", ota_info))
+        logger.info("设备未激活，等待激活 [%s]", mac_addr)
+
+    if not server.url:
+        logger.warning("OTA 未返回 websocket 地址 [%s]", mac_addr)
+        return False
+    if not await server.connect_websocket(server.websocket_token):
+        # 缓存的地址或令牌可能已失效
+        cache.invalidate(mac_addr)
+        return False
+    if server.wait_device_activated:
+        await server.send_text("hi")
+    return True
+
+
+class UpstreamPool:
+    """
+    默认 MAC 的上游预连接池
+
+    只用于未指定 MAC 的会话：这些会话本来就共用同一个设备身份，预先握手不会改变上游看到的设备。
+    预连接在分配前已经响应了上游的 tools/list，因此需要提供与会话相同的工具定义（tools_factory），
+    分配给会话时再替换为会话自己的工具函数与消息回调。
+    """
+
+    # 建立预连接失败后的重试间隔（秒）
+    RETRY_INTERVAL = 5.0
+
+    def __init__(self, size=UPSTREAM_POOL_SIZE, max_age=UPSTREAM_POOL_MAX_AGE, mac_addr=DEFAULT_MAC_ADDR):
+        """
+        初始化预连接池
+
+        Args:
+            size: 保持的空闲连接数，0 表示不预连接
+            max_age: 空闲连接的最长保留时间（秒）
+            mac_addr: 预连接使用的 MAC
+        """
+        self.size = size
+        self.max_age = max_age
+        self.mac_addr = mac_addr
+        self.tools_factory = None
+        # (XiaoZhiWebsocket, 建立时间)
+        self.ready = deque()
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+        # 统计信息
+        self.opened = 0
+        self.acquired = 0
+        self.expired = 0
+        self.failures = 0
+
+    def start(self, tools_factory):
+        """
+        在当前事件循环上开始维护预连接
+
+        Args:
+            tools_factory: 返回预连接使用的 MCP 工具列表的函数
+        """
+        self.tools_factory = tools_factory
+        if self.size and (self.task is None or self.task.done()):
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.task = None
+        while self.ready:
+            server, _ = self.ready.popleft()
+            await server.close()
+
+    async def _run(self):
+        while True:
+            # 关闭过期的空闲连接
+            now = time.monotonic()
+            while self.ready and now - self.ready[0][1] > self.max_age:
+                server, _ = self.ready.popleft()
+                self.expired += 1
+                await server.close()
+
+            if len(self.ready) < self.size:
+                try:
+                    server = await self._open()
+                except Exception as e:
+                    logger.warning("建立上游预连接失败: %s", e)
+                    server = None
+                if server is None:
+                    self.failures += 1
+                    await asyncio.sleep(self.RETRY_INTERVAL)
+                else:
+                    self.opened += 1
+                    self.ready.append((server, time.monotonic()))
+                continue
+
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), 1.0)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _open(self):
+        holder = []
+
+        async def idle_callback(message):
+            # 空闲期间上游断开，从池中移除
+            if message["type"] == "websocket" and message["state"] == "close":
+                for entry in list(self.ready):
+                    if entry[0] is holder[0]:
+                        self.ready.remove(entry)
+
+        server = create_upstream(idle_callback)
+        holder.append(server)
+        await server.set_mcp_tool(self.tools_factory())
+        if not await connect_upstream(server, self.mac_addr):
+            await server.close()
+            return None
+        return server
+
+    def acquire(self, mac_addr):
+        """
+        取出一个可用的预连接
+
+        Args:
+            mac_addr: 会话的 MAC，与预连接的 MAC 不同时不分配
+
+        Returns:
+            XiaoZhiWebsocket: 已连接的上游，没有可用连接时返回 None
+        """
+        if mac_addr.lower() != self.mac_addr.lower():
+            return None
+        now = time.monotonic()
+        while self.ready:
+            server, opened_at = self.ready.popleft()
+            self.wakeup.set()
+            if now - opened_at > self.max_age or server.websocket is None or server.websocket.state != State.OPEN:
+                self.expired += 1
+                asyncio.ensure_future(server.close())
+                continue
+            self.acquired += 1
+            # 丢弃空闲期间收到的音频
+            server.output_audio_queue.clear()
+            return server
+        return None
+
+    def get_statistics(self):
+        return {
+            "size": self.size,
+            "ready": len(self.ready),
+            "opened": self.opened,
+            "acquired": self.acquired,
+            "expired": self.expired,
+            "failures": self.failures,
+        }
+
+
+def collect_upstream_metrics():
+    """导出 OTA 缓存与预连接池的计数"""
+    return [
+        (
+            "xiaozhi_upstream_ota_cache",
+            "counter",
+            "OTA lookups served from cache (hit) or fetched (miss)",
+            [
+                ("xiaozhi_upstream_ota_cache_total", {"result": "hit"}, ota_cache.hits),
+                ("xiaozhi_upstream_ota_cache_total", {"result": "miss"}, ota_cache.misses),
+            ],
+        ),
+        (
+            "xiaozhi_upstream_pool_ready",
+            "gauge",
+            "Idle prewarmed upstream connections",
+            [("xiaozhi_upstream_pool_ready", {}, len(upstream_pool.ready))],
+        ),
+        (
+            "xiaozhi_upstream_pool_acquired",
+            "counter",
+            "Sessions served from the prewarmed pool",
+            [("xiaozhi_upstream_pool_acquired_total", {}, upstream_pool.acquired)],
+        ),
+    ]
+
+
+# 全局实例
+ota_cache = OtaCache()
+upstream_pool = UpstreamPool()
+metrics_registry.register_collector(collect_upstream_metrics)
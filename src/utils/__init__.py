@@ -0,0 +1,4 @@
+"""
+通用工具模块
+Utilities Module
+"""
@@ -0,0 +1,90 @@
+"""
+媒体计算执行器
+Media Executor - 把 CPU 密集的音视频处理移出 asyncio 事件循环
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.config import MEDIA_EXECUTOR_MODE, MEDIA_EXECUTOR_WORKERS
+from src.utils.profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+
+class MediaExecutor:
+    """
+    媒体计算执行器
+
+    - "thread": 在线程池中执行，NumPy / OpenCV 运算时会释放 GIL，不再阻塞事件循环
+    - "inline": 直接在事件循环中执行（与原有行为一致，便于对比与调试）
+    """
+
+    MODES = ("thread", "inline")
+
+    def __init__(self, mode=MEDIA_EXECUTOR_MODE, workers=MEDIA_EXECUTOR_WORKERS):
+        """
+        初始化执行器
+
+        Args:
+            mode: 执行模式 ("thread" / "inline")
+            workers: 线程数，为 0 时使用 CPU 核数
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"未知的执行模式: {mode}，可选: {', '.join(self.MODES)}")
+
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = None
+
+    def _get_executor(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="media")
+        return self.executor
+
+    async def run(self, func, *args, **kwargs):
+        """
+        执行 CPU 密集任务
+
+        Args:
+            func: 要执行的同步函数
+            *args, **kwargs: 函数参数
+
+        Returns:
+            函数返回值
+        """
+        if self.mode == "inline":
+            return func(*args, **kwargs)
+
+        trace = profiler.sample("executor." + getattr(func, "__name__", "task"))
+        if trace is not None:
+            func = functools.partial(_traced, trace, func)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), functools.partial(func, *args, **kwargs))
+
+    def shutdown(self):
+        """关闭线程池"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+def _traced(trace, func, *args, **kwargs):
+    """在工作线程中执行并记录排队等待与执行耗时"""
+    now = time.perf_counter()
+    queue_wait_us = round((now - trace.start) * 1e6, 1)
+    trace.lane = threading.current_thread().name
+    trace.start = trace.last = now
+    try:
+        return func(*args, **kwargs)
+    finally:
+        trace.finish(queue_wait_us=queue_wait_us)
+
+
+# 全局实例
+media_executor = MediaExecutor()
@@ -0,0 +1,64 @@
+"""
+JSON 编解码
+JSON Codec
+
+offer / answer、DataChannel 消息等热路径统一使用这里的编解码函数。安装了 orjson 时使用 orjson，
+否则回退到标准库 json；两者输出一致：紧凑格式、非 ASCII 字符不转义。JSON_CODEC 可以强制指定实现。
+
+dumps 返回 str（DataChannel 文本消息），dumps_bytes 返回 bytes（HTTP 响应体），loads 接受 str 或 bytes。
+实现在导入时选择一次。
+"""
+
+import json
+import logging
+
+from src.config import JSON_CODEC
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("orjson", "json")
+
+
+def select_backend(backend):
+    """
+    选择编解码实现
+
+    Args:
+        backend: "orjson"、"json" 或 "auto"（有 orjson 时使用 orjson）
+
+    Returns:
+        str: 实际使用的实现
+    """
+    if backend == "auto":
+        return "orjson" if orjson is not None else "json"
+    if backend not in BACKENDS:
+        raise ValueError("未知的 JSON 编解码实现: {}".format(backend))
+    if backend == "orjson" and orjson is None:
+        logger.warning("未安装 orjson，使用标准库 json")
+        return "json"
+    return backend
+
+
+def _orjson_dumps(obj):
+    return orjson.dumps(obj).decode()
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def _json_dumps_bytes(obj):
+    return _json_dumps(obj).encode()
+
+
+BACKEND = select_backend(JSON_CODEC)
+use_orjson = BACKEND == "orjson"
+
+dumps = _orjson_dumps if use_orjson else _json_dumps
+dumps_bytes = orjson.dumps if use_orjson else _json_dumps_bytes
+loads = orjson.loads if use_orjson else json.loads
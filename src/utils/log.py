@@ -0,0 +1,244 @@
+"""
+异步结构化日志
+Asynchronous Structured Logging
+
+- 事件循环线程中只做过滤与入队，格式化与写 stdout 在后台线程中完成（QueueHandler / QueueListener），
+  队列满时直接丢弃，不会阻塞事件循环；
+- 消息负载通过 extra={"payload": ...} 传入，只在后台线程写出时才序列化（调用方记录后不能再修改负载）；
+- 带 session 字段的记录按会话与消息类型限速，高频类型按比例抽样；
+- LOG_FORMAT=json 时每行输出一个 JSON 对象，会话字段与负载作为独立的键。
+"""
+
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from src.config import LOG_FORMAT, LOG_QUEUE_SIZE, LOG_SAMPLE, LOG_SESSION_BURST, LOG_SESSION_RATE
+from src.utils.metrics import metrics_registry
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# 会话日志的结构化字段
+SESSION_FIELDS = ("session", "mac", "ip", "msg_type")
+
+
+def session_extra(pc, msg_type, payload=None):
+    """
+    会话日志的 extra 字段
+
+    Args:
+        pc: 带有 session_id / mac_address / client_ip 的 RTCPeerConnection
+        msg_type: 消息类型，用于限速与抽样
+        payload: 消息负载，写出时才序列化
+
+    Returns:
+        dict: 传给 logger 的 extra
+    """
+    return {
+        "session": getattr(pc, "session_id", None),
+        "mac": getattr(pc, "mac_address", None),
+        "ip": getattr(pc, "client_ip", None),
+        "msg_type": msg_type,
+        "payload": payload,
+    }
+
+
+def format_payload(payload):
+    if isinstance(payload, (bytes, bytearray)):
+        return "<{} bytes>".format(len(payload))
+    if isinstance(payload, str):
+        return payload
+    return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """与原有格式一致的文本日志，有负载时追加在消息之后"""
+
+    def format(self, record):
+        text = super().format(record)
+        payload = getattr(record, "payload", None)
+        if payload is not None:
+            text = "{} {}".format(text, format_payload(payload))
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录输出一行 JSON"""
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in SESSION_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        payload = getattr(record, "payload", None)
+        if payload is not None:
+            data["payload"] = payload if isinstance(payload, (dict, list)) else format_payload(payload)
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SessionRateLimiter(logging.Filter):
+    """
+    会话日志限速
+
+    每个 (会话, 消息类型) 一个令牌桶，ERROR 及以上级别与不带 session 字段的记录不受限制；
+    sample 中的消息类型只保留每 N 条中的第一条。
+    """
+
+    # 清理长时间未使用的令牌桶的间隔（秒）
+    PURGE_INTERVAL = 60.0
+
+    def __init__(self, rate=LOG_SESSION_RATE, burst=LOG_SESSION_BURST, sample=LOG_SAMPLE):
+        """
+        初始化限速
+
+        Args:
+            rate: 每个会话每种消息类型每秒允许的记录数，0 表示不限速
+            burst: 令牌桶容量
+            sample: {消息类型: N}，每 N 条只保留 1 条
+        """
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.sample = dict(sample)
+        # (session, msg_type) -> [令牌数, 上次更新时间, 已见记录数]
+        self.buckets = {}
+        self.purged_at = time.monotonic()
+
+        # 统计信息
+        self.dropped = {"rate_limited": 0, "sampled": 0}
+
+    def filter(self, record):
+        session = getattr(record, "session", None)
+        if session is None or record.levelno >= logging.ERROR:
+            return True
+
+        now = time.monotonic()
+        msg_type = getattr(record, "msg_type", None)
+        bucket = self.buckets.get((session, msg_type))
+        if bucket is None:
+            bucket = self.buckets[(session, msg_type)] = [float(self.burst), now, 0]
+        bucket[2] += 1
+        if now - self.purged_at > self.PURGE_INTERVAL:
+            self._purge(now)
+
+        every = self.sample.get(msg_type)
+        if every and (bucket[2] - 1) % every:
+            self.dropped["sampled"] += 1
+            return False
+
+        if self.rate:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1.0:
+                self.dropped["rate_limited"] += 1
+                return False
+            bucket[0] -= 1.0
+        return True
+
+    def _purge(self, now):
+        self.purged_at = now
+        for key, bucket in list(self.buckets.items()):
+            if now - bucket[1] > self.PURGE_INTERVAL:
+                del self.buckets[key]
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """只入队不格式化的 QueueHandler，队列满时丢弃记录"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 标准 QueueHandler 会在调用线程中格式化消息，这里留给后台线程
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """
+    根 logger 的异步输出管道
+
+    fork 出的工作进程中后台线程不存在，fork 后自动为子进程重建队列与后台线程。
+    """
+
+    def __init__(self, log_format=LOG_FORMAT, queue_size=LOG_QUEUE_SIZE, stream=None):
+        """
+        初始化日志管道（尚未安装）
+
+        Args:
+            log_format: "text" 或 "json"
+            queue_size: 待写出记录数上限
+            stream: 输出流，默认 sys.stdout
+        """
+        self.queue_size = queue_size
+        self.output = logging.StreamHandler(stream or sys.stdout)
+        formatter = JsonFormatter if log_format == "json" else TextFormatter
+        self.output.setFormatter(formatter(TEXT_FORMAT, DATE_FORMAT))
+        self.rate_limiter = SessionRateLimiter()
+        self.handler = None
+        self.listener = None
+
+    def install(self, level=logging.INFO):
+        """替换根 logger 的处理器并启动后台线程"""
+        self.handler = NonBlockingQueueHandler(queue.Queue(self.queue_size))
+        self.handler.addFilter(self.rate_limiter)
+        root = logging.getLogger()
+        root.handlers[:] = [self.handler]
+        root.setLevel(level)
+        self._start_listener()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_listener(self):
+        self.listener = QueueListener(self.handler.queue, self.output)
+        self.listener.start()
+
+    def _after_fork(self):
+        self.handler.queue = queue.Queue(self.queue_size)
+        self._start_listener()
+
+    def flush(self, timeout=1.0):
+        """等待队列中的记录写出（进程退出前调用）"""
+        deadline = time.monotonic() + timeout
+        while self.handler is not None and not self.handler.queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def collect_metrics(self):
+        """导出 Prometheus 指标"""
+        dropped = dict(self.rate_limiter.dropped, queue_full=self.handler.dropped if self.handler else 0)
+        return [
+            (
+                "xiaozhi_log_records_dropped",
+                "counter",
+                "Log records dropped by rate limiting, sampling or a full queue",
+                [("xiaozhi_log_records_dropped_total", {"reason": key}, value) for key, value in dropped.items()],
+            ),
+            (
+                "xiaozhi_log_queue_depth",
+                "gauge",
+                "Log records waiting to be written",
+                [("xiaozhi_log_queue_depth", {}, self.handler.queue.qsize() if self.handler else 0)],
+            ),
+        ]
+
+
+# 全局实例
+log_pipeline = LogPipeline()
+metrics_registry.register_collector(log_pipeline.collect_metrics)
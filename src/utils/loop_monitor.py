@@ -0,0 +1,155 @@
+"""
+事件循环延迟监控
+Event Loop Lag Monitor
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+import numpy as np
+
+from src.config import LOOP_LAG_INTERVAL, LOOP_LAG_REPORT_INTERVAL, LOOP_LAG_WARN_THRESHOLD
+from src.utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """
+    事件循环延迟监控
+
+    周期性地 sleep(interval)，实际唤醒时间与预期时间之差即为事件循环被阻塞的时长。
+    同一事件循环上任何一个会话的慢帧都会体现在这里，并直接影响所有会话的 RTP 发送节奏。
+    """
+
+    def __init__(
+        self,
+        interval=LOOP_LAG_INTERVAL,
+        warn_threshold=LOOP_LAG_WARN_THRESHOLD,
+        report_interval=LOOP_LAG_REPORT_INTERVAL,
+        window=1000,
+    ):
+        """
+        初始化监控
+
+        Args:
+            interval: 采样间隔（秒）
+            warn_threshold: 单次延迟超过该值（秒）时计数
+            report_interval: 日志汇总间隔（秒），为 0 时不输出日志
+            window: 用于计算分位数的最近采样数
+        """
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.report_interval = report_interval
+        self.samples = deque(maxlen=window)
+        self.task = None
+
+        # 统计信息
+        self.sample_count = 0
+        self.slow_count = 0
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+
+    def start(self):
+        """在当前事件循环上启动监控"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """停止监控"""
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.task = None
+
+    async def _run(self):
+        last_report = time.monotonic()
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, time.monotonic() - expected))
+
+            if self.report_interval and time.monotonic() - last_report >= self.report_interval:
+                last_report = time.monotonic()
+                stats = self.get_statistics()
+                logger.info(
+                    "事件循环延迟: p50=%.1fms p99=%.1fms max=%.1fms 慢采样=%d/%d",
+                    stats["p50_ms"],
+                    stats["p99_ms"],
+                    stats["max_ms"],
+                    stats["slow_count"],
+                    stats["sample_count"],
+                )
+
+    def record(self, lag):
+        """记录一次延迟采样（秒）"""
+        self.samples.append(lag)
+        self.sample_count += 1
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        if lag > self.warn_threshold:
+            self.slow_count += 1
+
+    def get_statistics(self):
+        """
+        获取延迟统计
+
+        Returns:
+            dict: 最近窗口的分位数与累计计数（毫秒）
+        """
+        if self.samples:
+            p50, p99 = np.percentile(np.fromiter(self.samples, dtype=np.float64), [50, 99])
+        else:
+            p50 = p99 = 0.0
+
+        return {
+            "last_ms": self.last_lag * 1000,
+            "p50_ms": float(p50) * 1000,
+            "p99_ms": float(p99) * 1000,
+            "max_ms": self.max_lag * 1000,
+            "sample_count": self.sample_count,
+            "slow_count": self.slow_count,
+        }
+
+    def collect_metrics(self):
+        """导出 Prometheus 指标"""
+        stats = self.get_statistics()
+        return [
+            (
+                "xiaozhi_event_loop_lag_seconds",
+                "gauge",
+                "Event loop scheduling lag quantiles over the recent sample window",
+                [
+                    ("xiaozhi_event_loop_lag_seconds", {"quantile": "0.5"}, stats["p50_ms"] / 1000),
+                    ("xiaozhi_event_loop_lag_seconds", {"quantile": "0.99"}, stats["p99_ms"] / 1000),
+                ],
+            ),
+            (
+                "xiaozhi_event_loop_lag_max_seconds",
+                "gauge",
+                "Largest event loop lag since start",
+                [("xiaozhi_event_loop_lag_max_seconds", {}, self.max_lag)],
+            ),
+            (
+                "xiaozhi_event_loop_lag_samples",
+                "counter",
+                "Event loop lag samples taken",
+                [("xiaozhi_event_loop_lag_samples_total", {}, stats["sample_count"])],
+            ),
+            (
+                "xiaozhi_event_loop_slow",
+                "counter",
+                "Event loop lag samples above the warning threshold",
+                [("xiaozhi_event_loop_slow_total", {}, stats["slow_count"])],
+            ),
+        ]
+
+
+# 全局实例
+loop_monitor = LoopLagMonitor()
+metrics_registry.register_collector(loop_monitor.collect_metrics)
@@ -0,0 +1,266 @@
+"""
+Prometheus 指标
+Prometheus Metrics - 不依赖 prometheus_client 的最小实现，输出文本格式 0.0.4
+"""
+
+import abc
+import bisect
+import math
+import threading
+
+# 默认耗时分桶（秒），覆盖 20ms 音频周期内的各处理阶段
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25)
+
+
+def format_value(value):
+    """按 Prometheus 文本格式输出数值"""
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if value != value:
+        return "NaN"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    items = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        items.append('{}="{}"'.format(key, value))
+    return "{" + ",".join(items) + "}"
+
+
+class Metric(abc.ABC):
+    """指标基类，按标签值保存子序列；子类实现 _new_child 创建子序列"""
+
+    type = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.labelnames:
+            self.children[()] = self._new_child()
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """创建一个子序列"""
+
+    def labels(self, *values, **kwargs):
+        """
+        获取指定标签值的子序列
+
+        Returns:
+            子序列对象（与无标签指标的接口相同）
+        """
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(key, self._new_child())
+        return child
+
+    def samples(self):
+        """
+        Returns:
+            list: [(样本名, 标签 dict, 数值)]
+        """
+        result = []
+        for key, child in list(self.children.items()):
+            labels = dict(zip(self.labelnames, key))
+            result.extend(child.samples(self.name, labels))
+        return result
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name, labels):
+        return [(name + "_total", labels, self.value)]
+
+
+class Counter(Metric):
+    """单调递增计数器，样本名自动加 _total 后缀"""
+
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.children[()].inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def samples(self, name, labels):
+        return [(name, labels, self.value)]
+
+
+class Gauge(Metric):
+    """可增可减的瞬时值"""
+
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self.children[()].set(value)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        # 在音频热路径上调用：只做一次二分查找与两次加法
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name, labels):
+        result = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            cumulative += count
+            result.append((name + "_bucket", dict(labels, le=format_value(bound)), cumulative))
+        result.append((name + "_sum", labels, self.sum))
+        result.append((name + "_count", labels, cumulative))
+        return result
+
+
+class Histogram(Metric):
+    """分桶直方图"""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.bucket_bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bucket_bounds)
+
+    def observe(self, value):
+        self.children[()].observe(value)
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+
+    除了直接注册的指标，还可以注册采集函数，在抓取时才计算会话数、队列深度等瞬时值，
+    避免在每帧处理时更新 gauge。
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.const_labels = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError("指标已注册: {}".format(metric.name))
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector):
+        """
+        注册采集函数
+
+        Args:
+            collector: 无参函数，返回 [(指标名, 类型, 说明, [(样本名, 标签 dict, 数值)])]
+        """
+        self.collectors.append(collector)
+
+    def collect(self):
+        """
+        采集所有指标
+
+        Returns:
+            list: [{"name", "type", "help", "samples": [[样本名, 标签 dict, 数值]]}]，
+                  可直接 JSON 序列化，所有样本都带上 const_labels
+        """
+        families = [
+            (metric.name, metric.type, metric.documentation, metric.samples()) for metric in self.metrics.values()
+        ]
+        for collector in self.collectors:
+            families.extend(collector())
+
+        result = []
+        for name, metric_type, documentation, samples in families:
+            result.append(
+                {
+                    "name": name,
+                    "type": metric_type,
+                    "help": documentation,
+                    "samples": [
+                        [sample, dict(self.const_labels, **labels), value] for sample, labels, value in samples
+                    ],
+                }
+            )
+        return result
+
+
+def render(families_list):
+    """
+    把一个或多个 collect() 的结果合并输出为 Prometheus 文本格式
+
+    Args:
+        families_list: collect() 结果的列表（多进程模式下每个工作进程一份）
+
+    Returns:
+        str: 文本格式的指标
+    """
+    merged = {}
+    for families in families_list:
+        for family in families:
+            entry = merged.setdefault(family["name"], {"type": family["type"], "help": family["help"], "samples": []})
+            entry["samples"].extend(family["samples"])
+
+    lines = []
+    for name, family in merged.items():
+        lines.append("# HELP {} {}".format(name, family["help"].replace("\\", "\\\\").replace("\n", "\\n")))
+        lines.append("# TYPE {} {}".format(name, family["type"]))
+        for sample, labels, value in family["samples"]:
+            lines.append("{}{} {}".format(sample, format_labels(labels), format_value(value)))
+    return "\n".join(lines) + "\n"
+
+
+# 全局实例
+metrics_registry = MetricsRegistry()
@@ -0,0 +1,253 @@
+"""
+热路径采样分析器
+Hot-Path Sampling Profiler
+
+按比例抽样音视频帧，记录每个处理阶段的耗时、排队等待与内存块数变化，
+导出 Chrome trace (chrome://tracing / Perfetto) 或 speedscope 格式。关闭时热路径上只有一次属性判断。
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+from src.config import PROFILER_MAX_EVENTS, PROFILER_SAMPLE_RATE
+
+
+class FrameTrace:
+    """
+    一帧的采样记录
+
+    mark(stage) 记录从上一次 mark（或开始）到现在的阶段，finish() 记录整帧。
+    alloc_blocks 为 sys.getallocatedblocks() 的差值；阶段内有 await 时包含同期其他协程的分配，只作参考。
+    """
+
+    __slots__ = ("profiler", "name", "lane", "start", "last", "blocks", "args")
+
+    def __init__(self, profiler, name, lane, args):
+        self.profiler = profiler
+        self.name = name
+        self.lane = lane
+        self.args = args
+        self.start = self.last = time.perf_counter()
+        self.blocks = sys.getallocatedblocks()
+
+    def mark(self, stage, **args):
+        """记录一个阶段"""
+        now = time.perf_counter()
+        blocks = sys.getallocatedblocks()
+        args["alloc_blocks"] = blocks - self.blocks
+        self.profiler.record(stage, self.name, self.lane, self.last, now, args)
+        self.last = now
+        self.blocks = blocks
+
+    def finish(self, **args):
+        """记录整帧"""
+        self.profiler.record(self.name, "frame", self.lane, self.start, time.perf_counter(), dict(self.args, **args))
+
+
+class Profiler:
+    """
+    热路径采样分析器
+
+    事件保存在定长环形队列中，超出 max_events 时丢弃最旧的事件；可以在任意线程中记录。
+    """
+
+    def __init__(self, sample_rate=PROFILER_SAMPLE_RATE, max_events=PROFILER_MAX_EVENTS):
+        """
+        初始化分析器
+
+        Args:
+            sample_rate: 抽样比例 (0-1]
+            max_events: 最多保留的事件数
+        """
+        self.enabled = False
+        self.sample_rate = sample_rate
+        self.events = deque(maxlen=max_events)
+        self.lanes = {}
+        self.lock = threading.Lock()
+        self.started_at = None
+
+        # 统计信息
+        self.sampled = 0
+
+    def configure(self, enabled=None, sample_rate=None, max_events=None, clear=False):
+        """
+        运行时调整分析器
+
+        Args:
+            enabled: 是否开启
+            sample_rate: 抽样比例 (0-1]
+            max_events: 最多保留的事件数
+            clear: 是否清空已记录的事件
+        """
+        if sample_rate is not None:
+            if not 0 < sample_rate <= 1:
+                raise ValueError("sample_rate 必须在 (0, 1] 之间")
+            self.sample_rate = sample_rate
+        if max_events is not None:
+            self.events = deque(self.events, maxlen=max_events)
+        if clear:
+            self.events.clear()
+            self.sampled = 0
+        if enabled is not None:
+            if enabled and not self.enabled:
+                self.started_at = time.time()
+            self.enabled = enabled
+
+    def sample(self, name, lane="main", **args):
+        """
+        按抽样比例开始记录一帧
+
+        Args:
+            name: 帧名称，如 "audio.microphone"
+            lane: 时间线上的泳道（如会话 ID），同一泳道的事件应当不重叠
+            **args: 附加到整帧事件上的参数
+
+        Returns:
+            FrameTrace: 被抽中时返回记录对象，否则返回 None
+        """
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        self.sampled += 1
+        return FrameTrace(self, name, lane, args)
+
+    def record(self, name, category, lane, start, end, args=None):
+        """
+        记录一个已完成的区间
+
+        Args:
+            name: 区间名称
+            category: 分类
+            lane: 泳道
+            start: 开始时间 (time.perf_counter)
+            end: 结束时间 (time.perf_counter)
+            args: 附加参数
+        """
+        tid = self.lanes.get(lane)
+        if tid is None:
+            with self.lock:
+                tid = self.lanes.setdefault(lane, len(self.lanes) + 1)
+        self.events.append((name, category, tid, start, end, args))
+
+    def _snapshot(self):
+        events = list(self.events)
+        lanes = {tid: lane for lane, tid in list(self.lanes.items())}
+        return events, lanes
+
+    def chrome_trace(self, pid=None):
+        """
+        导出 Chrome trace 事件列表
+
+        Args:
+            pid: 进程编号，多进程模式下用工作进程编号区分
+
+        Returns:
+            list: traceEvents
+        """
+        pid = os.getpid() if pid is None else pid
+        events, lanes = self._snapshot()
+        trace = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": str(lane)}}
+            for tid, lane in lanes.items()
+        ]
+        for name, category, tid, start, end, args in events:
+            trace.append(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "pid": pid,
+                    "tid": tid,
+                    # perf_counter 在 Linux 上是系统级单调时钟，多个工作进程的时间线可以直接对齐
+                    "ts": round(start * 1e6, 1),
+                    "dur": round((end - start) * 1e6, 1),
+                    "args": args or {},
+                }
+            )
+        return trace
+
+    def get_statistics(self):
+        """获取分析器状态"""
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "sampled_frames": self.sampled,
+            "events": len(self.events),
+            "max_events": self.events.maxlen,
+            "started_at": self.started_at,
+        }
+
+
+def to_speedscope(trace_events, name="xiaozhi-webrtc"):
+    """
+    把 Chrome trace 事件转换为 speedscope 格式
+
+    每个 (pid, tid) 泳道生成一个 evented profile；同一泳道内的事件按开始时间排序，
+    外层（更长）的事件先打开、后关闭。
+
+    Args:
+        trace_events: chrome_trace() 返回的事件（可以合并多个进程）
+        name: 文件名称
+
+    Returns:
+        dict: speedscope JSON
+    """
+    frames = []
+    frame_index = {}
+    lane_names = {}
+    lanes = {}
+    for event in trace_events:
+        key = (event["pid"], event["tid"])
+        if event["ph"] == "M":
+            lane_names[key] = event["args"]["name"]
+            continue
+        if event["name"] not in frame_index:
+            frame_index[event["name"]] = len(frames)
+            frames.append({"name": event["name"]})
+        lanes.setdefault(key, []).append(event)
+
+    profiles = []
+    for key, events in sorted(lanes.items()):
+        events.sort(key=lambda event: (event["ts"], -event["dur"]))
+        opened = []
+        output = []
+        for event in events:
+            end = event["ts"] + event["dur"]
+            # 先关闭在本事件开始前已经结束的区间
+            while opened and opened[-1][0] <= event["ts"]:
+                closed_at, frame = opened.pop()
+                output.append({"type": "C", "frame": frame, "at": closed_at})
+            # 部分重叠的事件截断到外层区间内，保证嵌套合法
+            if opened:
+                end = min(end, opened[-1][0])
+            frame = frame_index[event["name"]]
+            output.append({"type": "O", "frame": frame, "at": event["ts"]})
+            opened.append((end, frame))
+        while opened:
+            closed_at, frame = opened.pop()
+            output.append({"type": "C", "frame": frame, "at": closed_at})
+
+        profiles.append(
+            {
+                "type": "evented",
+                "name": "{} {}".format(key[0], lane_names.get(key, key[1])),
+                "unit": "microseconds",
+                "startValue": output[0]["at"],
+                "endValue": max(item["at"] for item in output),
+                "events": output,
+            }
+        )
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "shared": {"frames": frames},
+        "profiles": profiles,
+    }
+
+
+# 全局实例
+profiler = Profiler()
@@ -0,0 +1,118 @@
+"""
+回声消除参考音频的并发测试
+Echo Cancellation Reference Concurrency Tests
+
+参考音频在事件循环中写入，回声消除在 executor 线程中执行；处理进行中写入的参考音频必须完整保留到下一帧。
+"""
+
+import threading
+
+import numpy as np
+
+from src.audio.echo_canceller import EchoCanceller
+from src.audio.fdaf_canceller import FrequencyDomainEchoCanceller, process_batch
+
+
+def test_fdaf_reference_written_during_batch_is_kept_for_next_frame():
+    canceller = FrequencyDomainEchoCanceller()
+    block_size = canceller.block_size
+    first = np.full(block_size, 1000, dtype=np.int16)
+    second = np.full(block_size // 2, 2000, dtype=np.int16)
+    canceller.add_reference_audio(first)
+
+    # 让批运算停在 bank.process 中，模拟 executor 正在处理这一帧
+    entered, release = threading.Event(), threading.Event()
+    seen_far = []
+    process = canceller.bank.process
+
+    def blocking_process(slots, near, far):
+        seen_far.append(far.copy())
+        entered.set()
+        release.wait(5)
+        return process(slots, near, far)
+
+    canceller.bank.process = blocking_process
+    near = np.zeros(block_size, dtype=np.int16)
+    worker = threading.Thread(target=process_batch, args=([canceller], [near]))
+    worker.start()
+    assert entered.wait(5)
+
+    # 批运算进行中写入下一帧的参考音频
+    canceller.add_reference_audio(second)
+    release.set()
+    worker.join(5)
+    assert not worker.is_alive()
+
+    np.testing.assert_array_equal(seen_far[0][0], first.astype(np.float32))
+    assert canceller.pending_samples == len(second)
+    np.testing.assert_array_equal(canceller.pending_reference[: len(second)], second.astype(np.float32))
+
+
+def test_fdaf_interleaved_reference_writes_are_not_lost():
+    canceller = FrequencyDomainEchoCanceller()
+    block_size = canceller.block_size
+    frames = 200
+    seen_far = []
+    process = canceller.bank.process
+
+    def recording_process(slots, near, far):
+        seen_far.append(far[0].copy())
+        return process(slots, near, far)
+
+    canceller.bank.process = recording_process
+
+    # 每帧参考音频为常数 1..frames，与处理线程交替执行
+    written = threading.Semaphore(0)
+
+    def writer():
+        for value in range(1, frames + 1):
+            canceller.add_reference_audio(np.full(block_size, value, dtype=np.int16))
+            written.release()
+
+    near = np.zeros(block_size, dtype=np.int16)
+    thread = threading.Thread(target=writer)
+    thread.start()
+    for _ in range(frames):
+        written.acquire()
+        process_batch([canceller], [near])
+    thread.join(5)
+    if canceller.pending_samples:
+        process_batch([canceller], [near])
+
+    # 处理线程领先时远端块为静音；其余远端块只包含同一帧或相邻两帧的样本（没有被清零的空洞），
+    # 最新的一帧一定被处理过
+    for far in seen_far:
+        values = np.unique(far)
+        if values.tolist() == [0]:
+            continue
+        assert 0 not in values
+        assert values.max() - values.min() <= 1
+    assert max(far.max() for far in seen_far) == frames
+
+
+def test_lms_reference_snapshot_is_consistent_under_concurrent_writes():
+    canceller = EchoCanceller()
+    length = canceller.adaptive_filter_length
+    frame = 960
+    stop = threading.Event()
+
+    def writer():
+        value = 0
+        while not stop.is_set():
+            value += 1
+            canceller.add_reference_audio(np.full(frame, value, dtype=np.int16))
+
+    canceller.add_reference_audio(np.zeros(frame, dtype=np.int16))
+    canceller.add_reference_audio(np.zeros(frame, dtype=np.int16))
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(2000):
+            reference = canceller._get_reference_signal()
+            # 快照由按写入顺序排列的相邻两帧组成，没有写了一半的帧
+            assert len(reference) == length
+            assert np.all(np.diff(reference) >= 0)
+            assert np.unique(reference).size <= 2
+    finally:
+        stop.set()
+        thread.join(5)
@@ -0,0 +1,29 @@
+"""
+Prometheus 指标测试
+Prometheus Metrics Tests
+
+Metric 是抽象基类，没有实现 _new_child 的子类在构造时就失败，而不是在第一次使用标签时才失败。
+"""
+
+import pytest
+
+from src.utils.metrics import Counter, Gauge, Histogram, Metric
+
+
+class IncompleteMetric(Metric):
+    type = "counter"
+
+
+def test_metric_subclass_without_new_child_cannot_be_created():
+    with pytest.raises(TypeError):
+        Metric("xiaozhi_test", "test")
+    with pytest.raises(TypeError):
+        IncompleteMetric("xiaozhi_test", "test", labelnames=("error",))
+
+
+def test_builtin_metrics_create_children():
+    counter = Counter("xiaozhi_test_total", "test", labelnames=("error",))
+    counter.labels(error="ValueError").inc()
+    Gauge("xiaozhi_test_gauge", "test").set(1)
+    Histogram("xiaozhi_test_seconds", "test").observe(0.001)
+    assert counter.labels(error="ValueError").value == 1
@@ -0,0 +1,64 @@
+"""
+麦克风转发测试
+Microphone Forwarding Tests
+
+单帧处理失败时只丢弃该帧，后续麦克风帧继续发送到服务端。
+"""
+
+import asyncio
+import types
+
+import av
+import numpy as np
+from aiortc.mediastreams import MediaStreamError
+
+from src.track.audio import AudioFaceSwapper, microphone_errors
+
+
+class FakeTrack:
+    """依次返回给定的音频帧，之后结束"""
+
+    kind = "audio"
+
+    def __init__(self, count):
+        self.count = count
+
+    async def recv(self):
+        if self.count == 0:
+            raise MediaStreamError
+        self.count -= 1
+        frame = av.AudioFrame.from_ndarray(np.full((1, 960), 100, dtype=np.int16), format="s16", layout="mono")
+        frame.sample_rate = 48000
+        return frame
+
+
+class FlakyServer:
+    """第一次发送时模拟上游连接断开"""
+
+    def __init__(self):
+        self.sent = 0
+        self.calls = 0
+        self.output_audio_queue = []
+
+    async def send_audio(self, frame):
+        self.calls += 1
+        if self.calls == 1:
+            raise ConnectionError("upstream closed")
+        self.sent += 1
+
+
+def test_microphone_keeps_forwarding_after_a_failed_frame():
+    async def run():
+        server = FlakyServer()
+        xiaozhi = types.SimpleNamespace(server=server, last_inbound=0.0)
+        track = AudioFaceSwapper(xiaozhi, FakeTrack(5))
+        track.vad_gate.process = lambda pcm: [pcm]
+        await asyncio.wait_for(track.microphone_task, 5)
+        return server
+
+    before = microphone_errors.labels(error="ConnectionError").value
+    server = asyncio.run(run())
+
+    assert server.calls == 5
+    assert server.sent == 4
+    assert microphone_errors.labels(error="ConnectionError").value == before + 1
@@ -0,0 +1,86 @@
+"""
+上游连接冒烟测试
+Upstream Connection Smoke Tests
+
+connect_upstream 复制了 XiaoZhiWebsocket.init_connection 的流程并使用 SDK 的内部属性，
+这里对本地小智服务端模拟（benchmarks.mock_xiaozhi）走一遍完整连接，SDK 升级后行为变化时尽早失败。
+"""
+
+import asyncio
+import socket
+
+from benchmarks.mock_xiaozhi import MockXiaoZhiBackend
+from src.upstream import OtaCache, connect_upstream, create_upstream
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def noop(message):
+    pass
+
+
+async def connect(backend, cache, mac_addr):
+    server = create_upstream(noop)
+    server.ota_url = backend.ota_url
+    connected = await connect_upstream(server, mac_addr, cache)
+    return server, connected
+
+
+def test_connect_upstream_uses_ota_once_then_cache():
+    async def run():
+        backend = MockXiaoZhiBackend(port=free_port())
+        await backend.start()
+        cache = OtaCache(backend.ota_url, ttl=300)
+        servers = []
+        try:
+            for _ in range(2):
+                server, connected = await connect(backend, cache, "AA:BB:CC:00:00:01")
+                servers.append(server)
+                assert connected
+                assert server.websocket is not None
+                assert server.ota_task is None
+            return backend.get_statistics(), cache.hits
+        finally:
+            for server in servers:
+                await server.close()
+            await backend.stop()
+
+    stats, hits = asyncio.run(run())
+    assert stats["ota_requests"] == 1
+    assert stats["connections"] == 2
+    assert hits == 1
+
+
+def test_connect_upstream_starts_activation_from_the_same_ota_response():
+    async def run():
+        backend = MockXiaoZhiBackend(port=free_port(), activation=True)
+        await backend.start()
+        cache = OtaCache(backend.ota_url, ttl=300)
+        server = None
+        try:
+            server, connected = await connect(backend, cache, "AA:BB:CC:00:00:02")
+            assert connected
+            assert server.ota_task is not None
+            assert server.wait_device_activated
+            # 未激活设备的 OTA 结果不缓存
+            assert not cache.cached("aa:bb:cc:00:00:02")
+            # 等待激活期间发送的 "hi" 到达模拟服务端，回复发完后再关闭
+            for _ in range(50):
+                if backend.wake_words:
+                    break
+                await asyncio.sleep(0.05)
+            await asyncio.sleep(0.5)
+            return backend.get_statistics()
+        finally:
+            if server is not None:
+                await server.close()
+            await backend.stop()
+
+    stats = asyncio.run(run())
+    assert stats["ota_requests"] == 1
+    assert stats["connections"] == 1
+    assert stats["wake_words"] == 1
@@ -0,0 +1,30 @@
+"""
+按需解码视频测试
+Lazy Video Decoding Tests
+
+lazy 模式依赖 aiortc RTCRtpReceiver 的私有属性，缺少时退化为逐帧解码。
+"""
+
+import logging
+
+from src.track.video import VideoFrameConsumer
+
+
+def test_installed_aiortc_supports_lazy_decoding():
+    assert VideoFrameConsumer.check_receiver_internals()
+    assert VideoFrameConsumer(None, None, receiver=object(), mode="lazy").lazy
+
+
+def test_missing_receiver_internals_fall_back_to_full_decoding(monkeypatch, caplog):
+    monkeypatch.setattr(
+        VideoFrameConsumer, "RECEIVER_INTERNALS", VideoFrameConsumer.RECEIVER_INTERNALS + ("_RTCRtpReceiver__renamed",)
+    )
+    monkeypatch.setattr(VideoFrameConsumer, "lazy_supported", True)
+
+    with caplog.at_level(logging.WARNING, logger="src.track.video"):
+        assert not VideoFrameConsumer.check_receiver_internals()
+    assert "_RTCRtpReceiver__renamed" in caplog.text
+
+    consumer = VideoFrameConsumer(None, None, receiver=object(), mode="lazy")
+    assert not consumer.lazy
+    assert consumer.get_statistics()["mode"] == "full"